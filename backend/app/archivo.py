@@ -0,0 +1,116 @@
+# app/archivo.py
+"""
+Archivado de tareas completadas antiguas en tareas_archivo.
+
+Una tarea completada que no cambia en ARCHIVO_DIAS días se mueve, con su mismo
+id, de tareas a tareas_archivo. El recorrido es por keyset sobre el id, en
+lotes de ARCHIVO_LOTE tareas, cada uno en su propia transacción corta: las
+escrituras de los usuarios esperan como mucho un lote. Los triggers de
+tareas (app/ddl.py) retiran las tareas movidas de tareas_stats, del índice de
+búsqueda y del índice de prefijos.
+
+Archivar no es eliminar: la tarea sigue accesible por id y no deja lápida en
+tareas_cambios. Las filas se copian a tareas_archivo antes de borrarlas de
+tareas, y el trigger del registro de cambios omite la lápida de una tarea
+que sigue en el archivo.
+"""
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
+from sqlalchemy import delete, func, insert, select, text
+from sqlalchemy.orm import Session
+from app import models
+from app.config import settings
+from app.shards import shard_router
+
+logger = logging.getLogger(__name__)
+
+COLUMNAS = [columna.name for columna in models.TareaArchivada.__table__.columns if columna.name != "archivada_en"]
+
+def ids_monotonos(db: Session) -> bool:
+    """
+    Indica si la base de datos nunca reutiliza ids de tareas.
+
+    Un id archivado no puede volver a asignarse a una tarea nueva. En SQLite
+    eso requiere AUTOINCREMENT en tareas (las bases de datos anteriores se
+    migran con `migrate_db.py ids`); las secuencias de PostgreSQL no
+    reutilizan valores.
+    """
+    if db.get_bind().dialect.name != "sqlite":
+        return True
+    sql = db.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'tareas'")).scalar()
+    return sql is not None and "AUTOINCREMENT" in sql.upper()
+
+def archivar_lote(db: Session, corte: datetime, despues_de_id: int, lote: int) -> Tuple[Optional[int], int]:
+    """
+    Archiva hasta `lote` tareas completadas sin cambios desde `corte` con id
+    mayor que `despues_de_id`.
+
+    Retorna el último id recorrido (None si no quedan tareas por recorrer) y
+    cuántas tareas movió.
+
+    El INSERT ... SELECT en tareas_archivo y el DELETE de tareas repiten las
+    condiciones: una tarea que se reabre o se edita después de elegir los ids
+    sigue en tareas, y su copia se retira del archivo.
+    """
+    tareas = models.Tarea.__table__
+    archivo = models.TareaArchivada.__table__
+    archivable = (
+        tareas.c.completado == True,  # noqa: E712
+        func.coalesce(tareas.c.updated_at, tareas.c.created_at) < corte
+    )
+    ids = db.execute(
+        select(tareas.c.id)
+        .where(tareas.c.id > despues_de_id, *archivable)
+        .order_by(tareas.c.id)
+        .limit(lote)
+    ).scalars().all()
+    if not ids:
+        return None, 0
+    copiadas = db.execute(
+        insert(archivo).from_select(
+            COLUMNAS,
+            select(*(tareas.c[nombre] for nombre in COLUMNAS)).where(tareas.c.id.in_(ids), *archivable)
+        ).returning(archivo.c.id)
+    ).scalars().all()
+    movidas = set(db.execute(
+        delete(tareas).where(tareas.c.id.in_(copiadas), *archivable).returning(tareas.c.id)
+    ).scalars().all()) if copiadas else set()
+    sobrantes = set(copiadas) - movidas
+    if sobrantes:
+        db.execute(delete(archivo).where(archivo.c.id.in_(sobrantes)))
+    db.commit()
+    return ids[-1], len(movidas)
+
+def archivar_tareas(
+    db: Session,
+    dias: Optional[int] = None,
+    lote: Optional[int] = None,
+    ahora: Optional[datetime] = None
+) -> int:
+    """
+    Archiva todas las tareas completadas sin cambios en `dias` días
+    (ARCHIVO_DIAS por defecto) y retorna cuántas movió.
+    """
+    if not ids_monotonos(db):
+        logger.warning(
+            "No se archivan tareas: la tabla tareas puede reutilizar ids; "
+            "ejecuta 'python migrate_db.py ids'"
+        )
+        return 0
+    dias = settings.ARCHIVO_DIAS if dias is None else dias
+    lote = lote or settings.ARCHIVO_LOTE
+    corte = (ahora or datetime.now(timezone.utc)) - timedelta(days=dias)
+    # Las fechas se guardan en UTC sin zona horaria
+    corte = corte.astimezone(timezone.utc).replace(tzinfo=None)
+    movidas, ultimo_id = 0, 0
+    while ultimo_id is not None:
+        ultimo_id, cantidad = archivar_lote(db, corte, ultimo_id, lote)
+        movidas += cantidad
+    if movidas:
+        logger.info("Tareas archivadas: %d", movidas)
+    return movidas
+
+def archivar_todo(dias: Optional[int] = None, lote: Optional[int] = None) -> int:
+    """Archiva las tareas de la base de datos principal y de cada shard"""
+    return shard_router.en_cada_base(lambda db: archivar_tareas(db, dias, lote))
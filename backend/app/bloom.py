@@ -0,0 +1,116 @@
+# app/bloom.py
+"""
+Filtro de Bloom de emails y nombres de usuario registrados.
+
+Responde "seguro que no existe" sin consultar la base de datos, que es el caso
+habitual mientras alguien escribe en el formulario de registro. Un "puede
+existir" se confirma con la consulta indexada por lower() de app/queries.py.
+
+El filtro se reconstruye al arrancar y cada registro de este proceso lo
+actualiza. Los registros hechos por otros procesos no se ven hasta la
+siguiente reconstrucción periódica (BLOOM_RECONSTRUIR_SECONDS), así que la
+disponibilidad es orientativa: POST /register sigue siendo quien la garantiza.
+"""
+import hashlib
+import logging
+import math
+import threading
+from typing import Iterable, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from app import models
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+class FiltroBloom:
+    """Filtro de Bloom sobre un bytearray con k posiciones por valor (doble hash)"""
+
+    def __init__(self, capacidad: int, tasa_falsos_positivos: float):
+        capacidad = max(capacidad, 1)
+        self.num_bits = max(8, int(-capacidad * math.log(tasa_falsos_positivos) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacidad * math.log(2)))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+        self.elementos = 0
+
+    def _posiciones(self, valor: str):
+        digest = hashlib.blake2b(valor.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def agregar(self, valor: str) -> None:
+        for posicion in self._posiciones(valor):
+            self._bits[posicion >> 3] |= 1 << (posicion & 7)
+        self.elementos += 1
+
+    def __contains__(self, valor: str) -> bool:
+        return all(self._bits[posicion >> 3] & (1 << (posicion & 7)) for posicion in self._posiciones(valor))
+
+def _clave(campo: str, valor: str) -> str:
+    # Emails y usernames comparten el filtro; el prefijo evita que un username
+    # coincida con un email y la minúscula sigue a los índices únicos por lower()
+    return f"{campo}:{valor.lower()}"
+
+class UsuariosRegistrados:
+    """Filtro de Bloom de los usuarios existentes, reemplazable en caliente"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._filtro: Optional[FiltroBloom] = None
+        # Registros recibidos mientras se reconstruye, para no perderlos al
+        # reemplazar el filtro por uno construido con una lectura anterior
+        self._durante_reconstruccion: Optional[List[Tuple[str, str]]] = None
+
+    @property
+    def listo(self) -> bool:
+        """Indica si el filtro ya se construyó; sin filtro se consulta la base de datos"""
+        return self._filtro is not None
+
+    def reconstruir(self, db: Session) -> None:
+        """Construye un filtro nuevo con todos los usuarios y lo activa"""
+        with self._lock:
+            self._durante_reconstruccion = []
+        try:
+            total = db.query(models.Usuario.id).count()
+            filtro = FiltroBloom(
+                max(settings.BLOOM_CAPACIDAD, 2 * total),
+                settings.BLOOM_TASA_FALSOS_POSITIVOS
+            )
+            filas: Iterable[Tuple[str, str]] = db.query(
+                models.Usuario.email, models.Usuario.username
+            ).yield_per(5000)
+            for email, username in filas:
+                filtro.agregar(_clave("email", email))
+                filtro.agregar(_clave("username", username))
+            with self._lock:
+                for email, username in self._durante_reconstruccion or []:
+                    filtro.agregar(_clave("email", email))
+                    filtro.agregar(_clave("username", username))
+                self._filtro = filtro
+        finally:
+            # Si la lectura falla se conserva el filtro anterior y los
+            # registros dejan de acumularse
+            with self._lock:
+                self._durante_reconstruccion = None
+        logger.info("Filtro de usuarios registrados construido con %d usuarios", total)
+
+    def agregar(self, email: str, username: str) -> None:
+        """Añade un usuario recién registrado"""
+        with self._lock:
+            if self._durante_reconstruccion is not None:
+                self._durante_reconstruccion.append((email, username))
+            if self._filtro is not None:
+                self._filtro.agregar(_clave("email", email))
+                self._filtro.agregar(_clave("username", username))
+
+    def puede_existir(self, campo: str, valor: str) -> bool:
+        """False solo si el valor seguro que no está registrado"""
+        filtro = self._filtro
+        return filtro is None or _clave(campo, valor) in filtro
+
+    def reset(self) -> None:
+        with self._lock:
+            self._filtro = None
+
+usuarios_registrados = UsuariosRegistrados()
@@ -1,6 +1,6 @@
 # app/config.py
 from pydantic_settings import BaseSettings
-from typing import Optional, ClassVar, Dict, Set
+from typing import Optional, ClassVar, Dict, List, Set
 import secrets
 
 class Settings(BaseSettings):
@@ -11,7 +11,84 @@ class Settings(BaseSettings):
     # Configuración de la base de datos
     DATABASE_URL: str = "sqlite:///./tareas.db"
     TEST_DATABASE_URL: str = "sqlite:///./test.db"
-    
+
+    # Perfil de producción para SQLite (WAL, pragmas y pool escritor/lectores)
+    SQLITE_PRODUCTION_MODE: bool = False
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_MMAP_SIZE: int = 268435456  # 256 MiB
+    SQLITE_CACHE_SIZE_KB: int = 65536  # 64 MiB por conexión
+    SQLITE_READER_POOL_SIZE: int = 4
+    SQLITE_POOL_TIMEOUT_SECONDS: int = 30
+
+    # Réplicas de lectura (URLs separadas por comas en formato JSON) y ventana
+    # read-your-writes durante la cual un usuario que escribió lee de la principal
+    DATABASE_REPLICA_URLS: List[str] = []
+    READ_YOUR_WRITES_SECONDS: float = 5.0
+
+    # Shards de tareas: nombre -> URL SQLite en formato JSON, p. ej.
+    # {"a": "sqlite:///./tareas_a.db", "b": "sqlite:///./tareas_b.db"}. Vacío
+    # deja todas las tareas en DATABASE_URL, que siempre guarda los usuarios
+    TAREAS_SHARDS: Dict[str, str] = {}
+    SHARDS_NODOS_VIRTUALES: int = 64
+    # Tiempo que cada proceso recuerda el shard de un usuario
+    SHARDS_CACHE_SECONDS: float = 60.0
+    # Ids de tareas reservados en el directorio por cada escritura
+    SHARDS_BLOQUE_IDS: int = 1000
+
+    # Archivado de tareas completadas sin cambios en ARCHIVO_DIAS días, por
+    # lotes de ARCHIVO_LOTE cada ARCHIVO_INTERVALO_SECONDS (0 = desactivado)
+    ARCHIVO_DIAS: int = 90
+    ARCHIVO_LOTE: int = 500
+    ARCHIVO_INTERVALO_SECONDS: float = 3600.0
+
+    # Sincronización incremental: días que se conservan las lápidas de tareas
+    # eliminadas y cada cuánto se compactan (0 = nunca)
+    CAMBIOS_RETENCION_DIAS: int = 30
+    CAMBIOS_COMPACTAR_SECONDS: float = 3600.0
+
+    # Recordatorios de vencimiento: ventana de vencimientos que se carga en
+    # memoria, cada cuánto se revisa, con cuánta antelación se avisa y URL
+    # opcional a la que se envían (sin URL se escriben en el log)
+    RECORDATORIOS_ENABLED: bool = False
+    RECORDATORIOS_VENTANA_SECONDS: float = 3600.0
+    RECORDATORIOS_TICK_SECONDS: float = 1.0
+    RECORDATORIOS_ANTELACION_SECONDS: float = 0.0
+    RECORDATORIOS_WEBHOOK_URL: Optional[str] = None
+
+    # Cola de escritura con commit agrupado (un único hilo escritor)
+    WRITE_QUEUE_ENABLED: bool = False
+    WRITE_QUEUE_MAX_BATCH: int = 64
+    WRITE_QUEUE_MAX_DELAY_MS: int = 5
+
+    # Máximo de tareas por solicitud en POST /tareas/bulk
+    TAREAS_BULK_MAX: int = 500
+
+    # Máximo de ids por solicitud en GET /tareas/batch
+    TAREAS_BATCH_MAX: int = 100
+
+    # Filas leídas y codificadas por trozo en GET /tareas/export
+    EXPORTACION_LOTE: int = 1000
+
+    # POST /tareas/import: tareas por transacción, errores listados en la
+    # respuesta y longitud máxima de una línea
+    IMPORTACION_LOTE: int = 1000
+    IMPORTACION_MAX_ERRORES: int = 1000
+    IMPORTACION_MAX_LINEA: int = 65536
+
+    # Antigüedad máxima del total de tareas en el modo de conteo aproximado
+    TAREAS_CONTEO_APROXIMADO_TTL_SECONDS: float = 30.0
+
+    # Autocompletado de títulos: longitud máxima de los prefijos indexados y
+    # tareas por transacción al indexar en segundo plano las importadas
+    SUGERENCIAS_MAX_PREFIJO: int = 20
+    SUGERENCIAS_LOTE: int = 100
+
+    # Filtro de Bloom para GET /register/availability: usuarios previstos, tasa
+    # de falsos positivos y cada cuánto se reconstruye (0 = solo al arrancar)
+    BLOOM_CAPACIDAD: int = 100000
+    BLOOM_TASA_FALSOS_POSITIVOS: float = 0.01
+    BLOOM_RECONSTRUIR_SECONDS: float = 300.0
+
     # Configuración de seguridad
     SECRET_KEY: str = "your-secret-key-here"  # Cambiar en producción
     REFRESH_SECRET_KEY: str = secrets.token_urlsafe(32)
@@ -1,20 +1,31 @@
 # app/crud.py
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, aliased
 from sqlalchemy.exc import SQLAlchemyError, NoResultFound, IntegrityError
-from sqlalchemy import func, and_, or_, desc
+from sqlalchemy import and_, delete, desc, exists, func, insert, select, update
 from fastapi import HTTPException, status
 from datetime import datetime, timedelta, timezone
 from app import models, schemas
 from app.security import get_password_hash
 from app.config import settings
-from typing import List, Optional, Tuple
+from app.write_queue import run_write
+from app.bloom import usuarios_registrados
+from app import recordatorios
+from app.shards import shard_router
+from app import queries
+from typing import Any, Dict, List, Optional, Tuple
+from pydantic import ValidationError
+import base64
+import json
+import re
+import threading
+import unicodedata
+import time
 
 # Operaciones CRUD para usuarios
 def get_usuario(db: Session, usuario_id: int) -> Optional[models.Usuario]:
     """Obtiene un usuario por su ID"""
     try:
-        result = db.query(models.Usuario).filter(models.Usuario.id == usuario_id).first()
-        return result
+        return db.execute(queries.USUARIO_POR_ID, {"usuario_id": usuario_id}).scalars().first()
     except SQLAlchemyError as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -24,31 +35,45 @@ def get_usuario(db: Session, usuario_id: int) -> Optional[models.Usuario]:
 def get_usuario_by_email(db: Session, email: str) -> Optional[models.Usuario]:
     """Obtiene un usuario por su email"""
     try:
-        result = db.query(models.Usuario).filter(models.Usuario.email == email).first()
-        return result
+        return db.execute(queries.USUARIO_POR_EMAIL, {"email": email}).scalars().first()
     except SQLAlchemyError as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error de base de datos al obtener usuario: {str(e)}"
         )
 
+EMAIL_REGISTRADO = "El email ya está registrado"
+USERNAME_REGISTRADO = "El nombre de usuario ya está en uso"
+
+def _error_unicidad(error: IntegrityError) -> HTTPException:
+    """Traduce la violación de un índice único de usuarios a su mensaje"""
+    mensaje = str(error.orig).lower()
+    if "email" in mensaje:
+        detail = EMAIL_REGISTRADO
+    elif "username" in mensaje:
+        detail = USERNAME_REGISTRADO
+    else:
+        detail = "Error de integridad en la base de datos"
+    return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=detail)
+
 def create_usuario(db: Session, usuario: schemas.UsuarioCrear) -> models.Usuario:
-    """Crea un nuevo usuario"""
+    """
+    Crea un nuevo usuario.
+    
+    Email y username se comprueban con una sola consulta (sin distinguir
+    mayúsculas) antes de calcular el hash de la contraseña, de modo que un
+    registro duplicado no paga bcrypt. Si otro registro simultáneo gana la
+    carrera, el índice único correspondiente rechaza el INSERT.
+    """
     try:
-        # Verificar si el email ya existe
-        if get_usuario_by_email(db, usuario.email):
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="El email ya está registrado"
-            )
-        
-        # Verificar si el username ya existe
-        existing_user = db.query(models.Usuario).filter(models.Usuario.username == usuario.username).first()
-        if existing_user:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="El nombre de usuario ya está en uso"
-            )
+        coincidencias = db.execute(
+            queries.USUARIO_EXISTENTE,
+            {"email": usuario.email, "username": usuario.username}
+        ).all()
+        if any(fila.email for fila in coincidencias):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=EMAIL_REGISTRADO)
+        if any(fila.username for fila in coincidencias):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=USERNAME_REGISTRADO)
         
         hashed_password = get_password_hash(usuario.password)
         db_usuario = models.Usuario(
@@ -58,14 +83,11 @@ def create_usuario(db: Session, usuario: schemas.UsuarioCrear) -> models.Usuario
         )
         db.add(db_usuario)
         db.commit()
-        db.refresh(db_usuario)
+        usuarios_registrados.agregar(usuario.email, usuario.username)
         return db_usuario
-    except IntegrityError:
+    except IntegrityError as e:
         db.rollback()
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Error de integridad en la base de datos"
-        )
+        raise _error_unicidad(e)
     except SQLAlchemyError as e:
         db.rollback()
         raise HTTPException(
@@ -73,13 +95,47 @@ def create_usuario(db: Session, usuario: schemas.UsuarioCrear) -> models.Usuario
             detail=f"Error al crear usuario: {str(e)}"
         )
 
+def comprobar_disponibilidad(
+    db: Session,
+    email: Optional[str] = None,
+    username: Optional[str] = None
+) -> schemas.Disponibilidad:
+    """
+    Indica si el email y el username están libres, sin distinguir mayúsculas.
+    
+    El filtro de Bloom descarta sin consultar la base de datos los valores que
+    seguro no están registrados; los posibles registrados se confirman con
+    una sola consulta sobre los índices por lower().
+    """
+    consultar_email = email is not None and usuarios_registrados.puede_existir("email", email)
+    consultar_username = username is not None and usuarios_registrados.puede_existir("username", username)
+    disponibilidad = schemas.Disponibilidad(
+        email=None if email is None else True,
+        username=None if username is None else True
+    )
+    if not (consultar_email or consultar_username):
+        return disponibilidad
+    
+    coincidencias = db.execute(queries.USUARIO_EXISTENTE, {
+        "email": email if consultar_email else None,
+        "username": username if consultar_username else None,
+    }).all()
+    if consultar_email:
+        disponibilidad.email = not any(fila.email for fila in coincidencias)
+    if consultar_username:
+        disponibilidad.username = not any(fila.username for fila in coincidencias)
+    return disponibilidad
+
+def _update_last_login(db: Session, usuario_id: int) -> Optional[models.Usuario]:
+    usuario = db.get(models.Usuario, usuario_id)
+    if usuario is not None:
+        setattr(usuario, "last_login", datetime.now(timezone.utc))
+    return usuario
+
 def update_last_login(db: Session, usuario: models.Usuario) -> models.Usuario:
     """Actualiza la fecha del último login de un usuario"""
     try:
-        setattr(usuario, "last_login", datetime.now(timezone.utc))
-        db.commit()
-        db.refresh(usuario)
-        return usuario
+        return run_write(db, _update_last_login, usuario.id)
     except SQLAlchemyError as e:
         db.rollback()
         raise HTTPException(
@@ -88,6 +144,16 @@ def update_last_login(db: Session, usuario: models.Usuario) -> models.Usuario:
         )
 
 # Operaciones CRUD para refresh tokens
+def _create_refresh_token(db: Session, usuario_id: int, token: str) -> models.RefreshToken:
+    db_token = models.RefreshToken(
+        token=token,
+        usuario_id=usuario_id,
+        expires_at=datetime.now(timezone.utc) + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
+    )
+    db.add(db_token)
+    db.flush()
+    return db_token
+
 def create_refresh_token(
     db: Session,
     usuario_id: int,
@@ -95,15 +161,7 @@ def create_refresh_token(
 ) -> models.RefreshToken:
     """Crea un nuevo refresh token"""
     try:
-        db_token = models.RefreshToken(
-            token=token,
-            usuario_id=usuario_id,
-            expires_at=datetime.now(timezone.utc) + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
-        )
-        db.add(db_token)
-        db.commit()
-        db.refresh(db_token)
-        return db_token
+        return run_write(db, _create_refresh_token, usuario_id, token)
     except SQLAlchemyError as e:
         db.rollback()
         raise HTTPException(
@@ -114,13 +172,10 @@ def create_refresh_token(
 def get_refresh_token(db: Session, token: str) -> Optional[models.RefreshToken]:
     """Obtiene un refresh token por su valor"""
     try:
-        return db.query(models.RefreshToken).filter(
-            and_(
-                models.RefreshToken.token == token,
-                models.RefreshToken.is_revoked == False,
-                models.RefreshToken.expires_at > datetime.now(timezone.utc)
-            )
-        ).first()
+        return db.execute(
+            queries.REFRESH_TOKEN_VIGENTE,
+            {"token": token, "ahora": datetime.now(timezone.utc)}
+        ).scalars().first()
     except SQLAlchemyError as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -130,7 +185,7 @@ def get_refresh_token(db: Session, token: str) -> Optional[models.RefreshToken]:
 def revoke_refresh_token(db: Session, token: str) -> bool:
     """Revoca un refresh token"""
     try:
-        db_token = db.query(models.RefreshToken).filter(models.RefreshToken.token == token).first()
+        db_token = db.execute(queries.REFRESH_TOKEN_POR_VALOR, {"token": token}).scalars().first()
         if db_token:
             setattr(db_token, "is_revoked", True)
             db.commit()
@@ -161,12 +216,279 @@ def revoke_all_user_tokens(db: Session, usuario_id: int) -> None:
         )
 
 # Operaciones CRUD para tareas
-def get_tarea(db: Session, tarea_id: int, usuario_id: int) -> Optional[models.Tarea]:
-    """Obtiene una tarea por su ID y usuario"""
-    return db.query(models.Tarea).filter(
-        models.Tarea.id == tarea_id,
-        models.Tarea.usuario_id == usuario_id
-    ).first()
+
+# Columnas por las que se puede ordenar el listado (ver app/queries.py)
+ORDENAR_POR_PERMITIDOS = queries.ORDENAR_POR_PERMITIDOS
+
+def encode_cursor(ordenar_por: str, orden: str, valor: Any, tarea_id: int) -> str:
+    """Codifica la posición (valor de orden, id) de la última tarea de una página"""
+    payload = json.dumps(
+        {"o": ordenar_por, "d": orden, "v": valor, "i": tarea_id},
+        default=str,
+        separators=(",", ":")
+    )
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, ordenar_por: str, orden: str) -> Tuple[Any, int]:
+    """Decodifica un cursor y verifica que corresponda al ordenamiento solicitado"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        valor, tarea_id = data["v"], int(data["i"])
+        cursor_orden = (data["o"], data["d"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Cursor de paginación no válido"
+        )
+    if cursor_orden != (ordenar_por, orden):
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="El cursor no corresponde al ordenamiento solicitado"
+        )
+    return valor, tarea_id
+
+# Campos de tarea que se pueden pedir con el parámetro fields
+CAMPOS_TAREA = (
+    "id", "titulo", "descripcion", "completado", "prioridad", "fecha_vencimiento",
+    "usuario_id", "created_at", "updated_at"
+)
+
+def parse_campos(fields: Optional[str]) -> Optional[List[str]]:
+    """
+    Convierte el parámetro fields (nombres separados por comas) en la lista de
+    campos a cargar. El id se incluye siempre. Retorna None si no se pidió.
+    """
+    if not fields:
+        return None
+    campos = list(dict.fromkeys(campo.strip() for campo in fields.split(",") if campo.strip()))
+    invalidos = [campo for campo in campos if campo not in CAMPOS_TAREA]
+    if invalidos:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Campos no válidos: {', '.join(invalidos)}. "
+                   f"Valores permitidos: {', '.join(CAMPOS_TAREA)}"
+        )
+    return ["id"] + [campo for campo in campos if campo != "id"]
+
+def get_tarea(
+    db: Session,
+    tarea_id: int,
+    usuario_id: int,
+    campos: Optional[List[str]] = None
+) -> Optional[models.Tarea]:
+    """
+    Obtiene una tarea por su ID y usuario, opcionalmente solo con algunos
+    campos. Si no está entre las activas se busca entre las archivadas.
+    """
+    clave = tuple(campos) if campos else None
+    parametros = {"tarea_id": tarea_id, "usuario_id": usuario_id}
+    tarea = db.execute(queries.tarea_de_usuario(clave), parametros).scalars().first()
+    if tarea is None:
+        tarea = db.execute(queries.tarea_de_usuario(clave, archivadas=True), parametros).scalars().first()
+    return tarea
+
+def parse_ids(ids: str) -> List[int]:
+    """
+    Convierte el parámetro ids (enteros separados por comas) en la lista de
+    ids sin repetir, en el orden en que aparecen.
+    """
+    try:
+        valores = [int(valor) for valor in ids.split(",") if valor.strip()]
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="ids debe ser una lista de enteros separados por comas"
+        )
+    valores = list(dict.fromkeys(valores))
+    if not valores:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Indica al menos un id"
+        )
+    if len(valores) > settings.TAREAS_BATCH_MAX:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Se permiten como máximo {settings.TAREAS_BATCH_MAX} ids por solicitud"
+        )
+    return valores
+
+def get_tareas_por_ids(
+    db: Session,
+    usuario_id: int,
+    ids: List[int],
+    campos: Optional[List[str]] = None
+) -> Tuple[List[models.Tarea], List[int]]:
+    """
+    Obtiene con una sola consulta las tareas del usuario con los ids dados.
+    Los ids que no están entre las activas se buscan, con una segunda
+    consulta, entre las archivadas.
+
+    Retorna las tareas encontradas y los ids que no existen o pertenecen a
+    otro usuario, ambos en el orden de `ids`.
+    """
+    clave = tuple(campos) if campos else None
+    try:
+        encontradas = {
+            tarea.id: tarea
+            for tarea in db.execute(
+                queries.tareas_de_usuario_por_ids(clave), {"ids": ids, "usuario_id": usuario_id}
+            ).scalars()
+        }
+        faltantes = [tarea_id for tarea_id in ids if tarea_id not in encontradas]
+        if faltantes:
+            encontradas.update(
+                (tarea.id, tarea)
+                for tarea in db.execute(
+                    queries.tareas_de_usuario_por_ids(clave, archivadas=True),
+                    {"ids": faltantes, "usuario_id": usuario_id}
+                ).scalars()
+            )
+    except SQLAlchemyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al obtener tareas: {str(e)}"
+        )
+    return (
+        [encontradas[tarea_id] for tarea_id in ids if tarea_id in encontradas],
+        [tarea_id for tarea_id in ids if tarea_id not in encontradas]
+    )
+
+MODOS_BUSQUEDA = ("texto", "subcadena")
+
+def _validar_modo_busqueda(modo_busqueda: str) -> None:
+    if modo_busqueda not in MODOS_BUSQUEDA:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Modo de búsqueda '{modo_busqueda}' no válido. "
+                   f"Valores permitidos: {', '.join(MODOS_BUSQUEDA)}"
+        )
+
+def _forma_y_parametros(
+    db: Session,
+    usuario_id: int,
+    completado: Optional[bool],
+    prioridad: Optional[int],
+    buscar: Optional[str],
+    modo_busqueda: str,
+    incluir_archivadas: bool = False,
+    vencidas: bool = False
+) -> Tuple[queries.FormaListado, dict]:
+    """
+    Forma de la consulta y valores de sus parámetros para los filtros dados.
+    
+    La búsqueda por texto completo es por palabras y se hace por subcadena
+    si el texto no contiene palabras, el motor no tiene índice de texto o se
+    incluyen las tareas archivadas, que no están indexadas.
+    """
+    _validar_modo_busqueda(modo_busqueda)
+    dialecto = db.get_bind().dialect.name
+    parametros = {"usuario_id": usuario_id}
+    busqueda = None
+    if buscar:
+        palabras = re.findall(r"\w+", buscar.lower())
+        if (
+            modo_busqueda == "texto" and palabras and not incluir_archivadas
+            and dialecto in queries.DIALECTOS_BUSQUEDA_TEXTO
+        ):
+            busqueda = "texto"
+            parametros["busqueda"] = queries.valor_busqueda(dialecto, usuario_id, palabras)
+        else:
+            busqueda = "subcadena"
+            parametros["patron"] = f"%{buscar}%"
+    if completado is not None:
+        parametros["completado"] = completado
+    if prioridad is not None:
+        parametros["prioridad"] = prioridad
+    if vencidas:
+        parametros["ahora"] = datetime.now(timezone.utc)
+    forma = queries.FormaListado(
+        dialecto=dialecto,
+        busqueda=busqueda,
+        completado=completado is not None,
+        prioridad=prioridad is not None,
+        archivadas=incluir_archivadas,
+        vencidas=vencidas
+    )
+    return forma, parametros
+
+class _ConteoCache:
+    """
+    Totales de tareas recientes por usuario y filtros.
+    
+    Sirve el modo de total aproximado: el valor puede tener hasta
+    TAREAS_CONTEO_APROXIMADO_TTL_SECONDS de antigüedad.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: Dict[tuple, Tuple[float, int]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple) -> Optional[int]:
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry[0] > self.ttl_seconds:
+            return None
+        return entry[1]
+
+    def set(self, key: tuple, total: int) -> None:
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._entries.clear()
+            self._entries[key] = (time.monotonic(), total)
+
+_conteos_aproximados = _ConteoCache(settings.TAREAS_CONTEO_APROXIMADO_TTL_SECONDS)
+
+def _get_stats_row(db: Session, usuario_id: int) -> Optional[models.TareaStats]:
+    return db.execute(queries.STATS_DE_USUARIO, {"usuario_id": usuario_id}).scalars().first()
+
+def _total_desde_contadores(
+    db: Session,
+    usuario_id: int,
+    completado: Optional[bool],
+    prioridad: Optional[int],
+    buscar: Optional[str]
+) -> Optional[int]:
+    """
+    Resuelve el total con los contadores de tareas_stats.
+    
+    Retorna None si los filtros no se pueden responder con los contadores
+    (búsqueda de texto o estado y prioridad combinados).
+    """
+    if buscar or (completado is not None and prioridad is not None):
+        return None
+    if prioridad is not None and prioridad not in (1, 2, 3):
+        return 0
+    stats = _get_stats_row(db, usuario_id)
+    if stats is None:
+        return 0
+    if completado is True:
+        return stats.completadas
+    if completado is False:
+        return stats.total - stats.completadas
+    if prioridad is not None:
+        return getattr(stats, f"prioridad_{prioridad}")
+    return stats.total
+
+def get_tareas_stats(db: Session, usuario_id: int) -> schemas.TareaStats:
+    """Obtiene los contadores de tareas del usuario con una lectura por clave primaria"""
+    try:
+        stats = _get_stats_row(db, usuario_id)
+    except SQLAlchemyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al obtener estadísticas de tareas: {str(e)}"
+        )
+    if stats is None:
+        return schemas.TareaStats(total=0, completadas=0, pendientes=0, por_prioridad={1: 0, 2: 0, 3: 0})
+    return schemas.TareaStats(
+        total=stats.total,
+        completadas=stats.completadas,
+        pendientes=stats.total - stats.completadas,
+        por_prioridad={1: stats.prioridad_1, 2: stats.prioridad_2, 3: stats.prioridad_3}
+    )
 
 def get_tareas(
     db: Session,
@@ -176,49 +498,98 @@ def get_tareas(
     completado: Optional[bool] = None,
     prioridad: Optional[int] = None,
     buscar: Optional[str] = None,
-    ordenar_por: str = "created_at",
-    orden: str = "desc"
-) -> Tuple[List[models.Tarea], int]:
+    ordenar_por: Optional[str] = None,
+    orden: str = "desc",
+    cursor: Optional[str] = None,
+    include_total: bool = True,
+    aproximado: bool = False,
+    modo_busqueda: str = "texto",
+    campos: Optional[List[str]] = None,
+    incluir_archivadas: bool = False,
+    vencidas: bool = False
+) -> Tuple[List[models.Tarea], Optional[int], Optional[str]]:
     """
     Obtiene una lista de tareas con filtros y ordenamiento.
-    Retorna una tupla con la lista de tareas y el total de tareas.
+    
+    Con `cursor` la página empieza después de la tarea que lo generó
+    (paginación por keyset sobre la tupla (ordenar_por, id)) y `skip` se ignora,
+    por lo que el coste no depende de la profundidad de la página.
+    
+    El total exacto se obtiene en la misma consulta que la página con
+    COUNT(*) OVER(). Con `include_total=False` no se cuenta y el total es None;
+    con `aproximado=True` se usa un total reciente en lugar de contar.
+    
+    `buscar` usa el índice de texto completo (modo "texto"), y entonces el
+    orden por defecto es por relevancia; el modo "subcadena" conserva la
+    búsqueda con ILIKE sobre título y descripción.
+    
+    Con `campos` solo se cargan esas columnas (ver parse_campos).
+    
+    Con `incluir_archivadas` el listado es la unión de tareas y tareas_archivo
+    (ver app/archivo.py); la búsqueda es entonces por subcadena.
+    
+    Con `vencidas` solo se incluyen las tareas pendientes cuya fecha de
+    vencimiento ya pasó.
+    
+    Retorna una tupla con la lista de tareas, el total de tareas y el cursor de
+    la página siguiente (None si no hay más tareas).
     """
     try:
-        query = db.query(models.Tarea).filter(models.Tarea.usuario_id == usuario_id)
+        forma, parametros = _forma_y_parametros(
+            db, usuario_id, completado, prioridad, buscar, modo_busqueda, incluir_archivadas, vencidas
+        )
         
-        # Aplicar filtros
-        if completado is not None:
-            query = query.filter(models.Tarea.completado == completado)
-        if prioridad is not None:
-            query = query.filter(models.Tarea.prioridad == prioridad)
-        if buscar:
-            query = query.filter(
-                or_(
-                    models.Tarea.titulo.ilike(f"%{buscar}%"),
-                    models.Tarea.descripcion.ilike(f"%{buscar}%")
-                )
+        # Ordenamiento: por defecto por relevancia al buscar por texto
+        if ordenar_por is None:
+            ordenar_por = "relevancia" if forma.busqueda == "texto" else "created_at"
+        if ordenar_por not in ORDENAR_POR_PERMITIDOS and not (
+            ordenar_por == "relevancia" and forma.busqueda == "texto"
+        ):
+            permitidos = list(ORDENAR_POR_PERMITIDOS) + ["relevancia (con buscar)"]
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"Campo de ordenamiento '{ordenar_por}' no válido. "
+                       f"Valores permitidos: {', '.join(permitidos)}"
             )
+        orden = "desc" if orden.lower() == "desc" else "asc"
         
-        # Obtener total antes de aplicar paginación
-        total = query.count()
+        # Con cursor las filas anteriores quedan fuera de la consulta y el
+        # total, si se pide exacto, se cuenta aparte
+        contar_en_ventana = include_total and not aproximado and not cursor
+        if cursor:
+            parametros["cursor_clave"], parametros["cursor_id"] = decode_cursor(cursor, ordenar_por, orden)
+        elif skip:
+            parametros["offset"] = skip
+        # Se pide una fila extra para saber si existe una página siguiente
+        parametros["limite"] = limit + 1
         
-        # Aplicar ordenamiento
-        order_column = getattr(models.Tarea, ordenar_por, None)
-        if not order_column:
-            raise HTTPException(
-                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-                detail=f"Campo de ordenamiento '{ordenar_por}' no válido"
+        forma = forma._replace(
+            ordenar_por=ordenar_por,
+            orden=orden,
+            cursor=bool(cursor),
+            offset=not cursor and bool(skip),
+            total=contar_en_ventana,
+            campos=tuple(campos) if campos else None
+        )
+        rows = db.execute(queries.listado_tareas(forma), parametros).all()
+        
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(ordenar_por, orden, rows[-1][1], rows[-1][0].id)
+        
+        total = None
+        if contar_en_ventana and rows:
+            total = rows[0][2]
+        elif include_total:
+            # Página vacía (offset fuera de rango), cursor o total aproximado
+            total = get_tareas_count(
+                db, usuario_id, completado, prioridad, buscar,
+                aproximado=aproximado, modo_busqueda=modo_busqueda,
+                incluir_archivadas=incluir_archivadas, vencidas=vencidas
             )
-            
-        if orden.lower() == "desc":
-            query = query.order_by(desc(order_column))
-        else:
-            query = query.order_by(order_column)
-            
-        # Aplicar paginación
-        query = query.offset(skip).limit(limit)
         
-        return query.all(), total
+        return [row[0] for row in rows], total, next_cursor
     except SQLAlchemyError as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -230,62 +601,539 @@ def get_tareas_count(
     usuario_id: int,
     completado: Optional[bool] = None,
     prioridad: Optional[int] = None,
-    buscar: Optional[str] = None
+    buscar: Optional[str] = None,
+    aproximado: bool = False,
+    modo_busqueda: str = "texto",
+    incluir_archivadas: bool = False,
+    vencidas: bool = False
 ) -> int:
     """
     Obtiene el total de tareas que coinciden con los filtros.
+    
+    Con `aproximado=True` el total se toma de tareas_stats si los filtros lo
+    permiten, o de un total calculado recientemente, en lugar de contar de nuevo.
+    Los contadores no incluyen las tareas archivadas.
     """
+    _validar_modo_busqueda(modo_busqueda)
+    key = (usuario_id, completado, prioridad, buscar, modo_busqueda, incluir_archivadas, vencidas)
+    if aproximado:
+        total = None
+        if not incluir_archivadas and not vencidas:
+            total = _total_desde_contadores(db, usuario_id, completado, prioridad, buscar)
+        if total is not None:
+            return total
+        total = _conteos_aproximados.get(key)
+        if total is not None:
+            return total
     try:
-        query = db.query(func.count(models.Tarea.id)).filter(models.Tarea.usuario_id == usuario_id)
-        
-        # Aplicar filtros
-        if completado is not None:
-            query = query.filter(models.Tarea.completado == completado)
-        if prioridad is not None:
-            query = query.filter(models.Tarea.prioridad == prioridad)
-        if buscar:
-            query = query.filter(
-                or_(
-                    models.Tarea.titulo.ilike(f"%{buscar}%"),
-                    models.Tarea.descripcion.ilike(f"%{buscar}%")
-                )
-            )
-            
-        return query.scalar()
+        forma, parametros = _forma_y_parametros(
+            db, usuario_id, completado, prioridad, buscar, modo_busqueda, incluir_archivadas, vencidas
+        )
+        total = db.execute(queries.conteo_tareas(forma), parametros).scalar()
     except SQLAlchemyError as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error al obtener total de tareas: {str(e)}"
         )
+    _conteos_aproximados.set(key, total)
+    return total
 
-def create_tarea(db: Session, tarea: schemas.TareaCreate, usuario_id: int) -> models.Tarea:
-    """Crea una nueva tarea"""
+def get_tareas_proximas(
+    db: Session,
+    usuario_id: int,
+    dentro_de: timedelta,
+    limit: int = 50,
+    ahora: Optional[datetime] = None
+) -> List[models.Tarea]:
+    """
+    Obtiene las tareas pendientes que vencen entre ahora y `dentro_de`, de la
+    más próxima a la más lejana.
+    """
+    ahora = ahora or datetime.now(timezone.utc)
+    try:
+        return db.execute(
+            queries.TAREAS_PROXIMAS,
+            {"usuario_id": usuario_id, "desde": ahora, "hasta": ahora + dentro_de, "limite": limit}
+        ).scalars().all()
+    except SQLAlchemyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al obtener tareas próximas: {str(e)}"
+        )
+
+def normalizar_texto(texto: str) -> str:
+    """Pasa el texto a minúsculas, sin acentos y con espacios simples"""
+    descompuesto = unicodedata.normalize("NFKD", texto.lower())
+    sin_acentos = "".join(c for c in descompuesto if not unicodedata.combining(c))
+    return " ".join(sin_acentos.split())
+
+def prefijos_titulo(titulo: str) -> set:
+    """
+    Prefijos indexados de un título: para cada palabra, los prefijos del texto
+    que empieza en ella, hasta SUGERENCIAS_MAX_PREFIJO caracteres.
+    """
+    texto = normalizar_texto(titulo)
+    maximo = settings.SUGERENCIAS_MAX_PREFIJO
+    prefijos = set()
+    for match in re.finditer(r"\S+", texto):
+        resto = texto[match.start():match.start() + maximo].rstrip()
+        prefijos.update(resto[:n] for n in range(1, len(resto) + 1))
+    return prefijos
+
+def _indexar_prefijos(db: Session, tarea: models.Tarea) -> None:
+    """Reemplaza los prefijos del título de la tarea en el índice de sugerencias"""
+    db.query(models.TareaPrefijo).filter(
+        models.TareaPrefijo.tarea_id == tarea.id
+    ).delete(synchronize_session=False)
+    db.bulk_insert_mappings(models.TareaPrefijo, [
+        {"usuario_id": tarea.usuario_id, "prefijo": prefijo, "tarea_id": tarea.id, "prioridad": tarea.prioridad}
+        for prefijo in prefijos_titulo(tarea.titulo)
+    ])
+
+def get_sugerencias(db: Session, usuario_id: int, q: str, limit: int = 10) -> List[schemas.TareaSugerencia]:
+    """
+    Sugerencias de tareas cuyo título contiene una palabra que empieza por `q`.
+    
+    Se leen del índice de prefijos en orden de prioridad y recencia, por lo
+    que el coste depende de `limit` y no del número de tareas del usuario.
+    """
+    prefijo = normalizar_texto(q)
+    if not prefijo:
+        return []
+    maximo = settings.SUGERENCIAS_MAX_PREFIJO
+    try:
+        rows = db.query(models.Tarea.id, models.Tarea.titulo, models.Tarea.prioridad).join(
+            models.TareaPrefijo, models.TareaPrefijo.tarea_id == models.Tarea.id
+        ).filter(
+            models.TareaPrefijo.usuario_id == usuario_id,
+            models.TareaPrefijo.prefijo == prefijo[:maximo].rstrip()
+        ).order_by(
+            desc(models.TareaPrefijo.prioridad), desc(models.TareaPrefijo.tarea_id)
+        )
+        if len(prefijo) > maximo:
+            # El índice solo guarda los primeros caracteres. El texto que
+            # empieza en cada palabra siguiente también está indexado, ya
+            # normalizado: la consulta exige esos prefijos y cada lote se
+            # comprueba con el título completo
+            for match in re.finditer(r"\S+", prefijo):
+                if match.start() == 0:
+                    continue
+                otro = aliased(models.TareaPrefijo)
+                rows = rows.filter(exists().where(
+                    otro.usuario_id == usuario_id,
+                    otro.prefijo == prefijo[match.start():match.start() + maximo].rstrip(),
+                    otro.tarea_id == models.Tarea.id
+                ))
+            encontradas, desde = [], 0
+            while len(encontradas) < limit:
+                lote = rows.offset(desde).limit(limit).all()
+                encontradas += [row for row in lote if f" {prefijo}" in f" {normalizar_texto(row.titulo)}"]
+                if len(lote) < limit:
+                    break
+                desde += limit
+            rows = encontradas[:limit]
+        else:
+            rows = rows.limit(limit).all()
+    except SQLAlchemyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al obtener sugerencias: {str(e)}"
+        )
+    return [schemas.TareaSugerencia(id=row.id, titulo=row.titulo, prioridad=row.prioridad) for row in rows]
+
+def _create_tarea(db: Session, tarea: schemas.TareaCreate, usuario_id: int) -> models.Tarea:
     db_tarea = models.Tarea(
         titulo=tarea.titulo,
         descripcion=tarea.descripcion,
         completado=tarea.completado,
         prioridad=tarea.prioridad,
-        usuario_id=usuario_id
+        fecha_vencimiento=tarea.fecha_vencimiento,
+        usuario_id=usuario_id,
+        # Sin valor explícito, eager_defaults leería updated_at con un SELECT
+        # aparte tras el INSERT, ya que solo tiene valor generado en los UPDATE
+        updated_at=None
     )
     db.add(db_tarea)
-    db.commit()
-    db.refresh(db_tarea)
+    db.flush()
+    # Una tarea nueva no tiene prefijos que reemplazar
+    _insertar_prefijos(db, [db_tarea])
+    recordatorios.anotar(db, db_tarea)
     return db_tarea
 
-def update_tarea(db: Session, tarea: models.Tarea, tarea_update: schemas.TareaUpdate) -> models.Tarea:
-    """Actualiza una tarea existente"""
+def create_tarea(db: Session, tarea: schemas.TareaCreate, usuario_id: int) -> models.Tarea:
+    """Crea una nueva tarea"""
+    return run_write(db, _create_tarea, tarea, usuario_id)
+
+def _insertar_prefijos(db: Session, tareas: List[Any]) -> None:
+    # Decenas de prefijos por tarea: un executemany de Core, sin el coste por
+    # fila de bulk_insert_mappings
+    prefijos = [
+        {"usuario_id": tarea.usuario_id, "prefijo": prefijo, "tarea_id": tarea.id, "prioridad": tarea.prioridad}
+        for tarea in tareas
+        for prefijo in prefijos_titulo(tarea.titulo)
+    ]
+    if prefijos:
+        db.connection().execute(insert(models.TareaPrefijo.__table__), prefijos)
+
+def _indexar_prefijos_rango(db: Session, usuario_id: int, desde: int, hasta: int) -> None:
+    rango = (desde, hasta)
+    tareas = db.execute(
+        select(models.Tarea.id, models.Tarea.usuario_id, models.Tarea.titulo, models.Tarea.prioridad)
+        .where(models.Tarea.usuario_id == usuario_id, models.Tarea.id.between(*rango))
+    ).all()
+    db.execute(delete(models.TareaPrefijo).where(
+        models.TareaPrefijo.usuario_id == usuario_id, models.TareaPrefijo.tarea_id.between(*rango)
+    ))
+    _insertar_prefijos(db, tareas)
+
+def indexar_prefijos(db: Session, usuario_id: int, desde: int, hasta: int) -> None:
+    """
+    Reemplaza en el índice de sugerencias los prefijos de las tareas del
+    usuario con id entre `desde` y `hasta`, con sus títulos actuales
+    """
+    run_write(db, _indexar_prefijos_rango, usuario_id, desde, hasta)
+
+def _create_tareas(
+    db: Session,
+    tareas: List[schemas.TareaCreate],
+    usuario_id: int,
+    indexar: bool = True
+) -> List[models.Tarea]:
+    filas = [
+        dict(tarea.model_dump(), usuario_id=usuario_id, updated_at=None)
+        for tarea in tareas
+    ]
+    if shard_router.habilitado:
+        # El INSERT en lote no pasa por before_insert: los ids del asignador
+        # de shards se reservan aquí, en orden creciente
+        for fila in filas:
+            fila["id"] = shard_router.asignador.siguiente()
+    # Un INSERT de varias filas con RETURNING (insertmanyvalues). SQLite no
+    # garantiza el orden de las filas devueltas, pero los ids se asignan en el
+    # orden de VALUES, así que ordenarlas por id las empareja con la solicitud
+    db_tareas = sorted(
+        db.execute(insert(models.Tarea).returning(models.Tarea), filas).scalars().all(),
+        key=lambda tarea: tarea.id
+    )
+    if indexar:
+        _insertar_prefijos(db, db_tareas)
+    for tarea in db_tareas:
+        recordatorios.anotar(db, tarea)
+    return db_tareas
+
+def create_tareas(
+    db: Session,
+    tareas: List[schemas.TareaCreate],
+    usuario_id: int,
+    indexar: bool = True
+) -> List[models.Tarea]:
+    """
+    Crea las tareas en una transacción y las retorna en el mismo orden.
+
+    Con `indexar=False` no se insertan sus prefijos en el índice de
+    sugerencias, que deben añadirse después con indexar_prefijos.
+    """
+    return run_write(db, _create_tareas, tareas, usuario_id, indexar)
+
+def create_tareas_bulk(db: Session, items: List[Any], usuario_id: int) -> schemas.TareaBulkResponse:
+    """
+    Crea en una sola transacción las tareas válidas de `items`.
+
+    Cada elemento se valida por separado: los inválidos se informan con sus
+    errores en la posición que ocupaban y no impiden crear el resto.
+    """
+    resultados: List[schemas.TareaBulkResultado] = []
+    validas: List[Tuple[int, schemas.TareaCreate]] = []
+    for indice, item in enumerate(items):
+        try:
+            validas.append((indice, schemas.TareaCreate.model_validate(item)))
+        except ValidationError as e:
+            resultados.append(schemas.TareaBulkResultado(
+                indice=indice,
+                errores=[{"loc": err["loc"], "msg": err["msg"], "type": err["type"]} for err in e.errors()]
+            ))
+    creadas = []
+    if validas:
+        creadas = create_tareas(db, [tarea for _, tarea in validas], usuario_id)
+    resultados.extend(
+        schemas.TareaBulkResultado(indice=indice, tarea=schemas.Tarea.model_validate(tarea))
+        for (indice, _), tarea in zip(validas, creadas)
+    )
+    resultados.sort(key=lambda resultado: resultado.indice)
+    return schemas.TareaBulkResponse(
+        creadas=len(creadas),
+        rechazadas=len(items) - len(creadas),
+        resultados=resultados
+    )
+
+def _tarea_no_encontrada() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail="Tarea no encontrada"
+    )
+
+def _restaurar_archivada(db: Session, tarea_id: int, usuario_id: int) -> bool:
+    """Devuelve una tarea archivada del usuario a tareas; False si no la hay"""
+    parametros = {"tarea_id": tarea_id, "usuario_id": usuario_id}
+    if db.execute(queries.RESTAURAR_ARCHIVADA, parametros).rowcount == 0:
+        return False
+    db.execute(queries.BORRAR_ARCHIVADA, parametros)
+    return True
+
+def _update_tarea(db: Session, tarea_id: int, usuario_id: int, update_data: dict) -> models.Tarea:
+    if not update_data:
+        tarea = get_tarea(db, tarea_id, usuario_id)
+        if tarea is None:
+            raise _tarea_no_encontrada()
+        return tarea
+    
+    # Un único UPDATE comprueba la propiedad, aplica los cambios (y updated_at
+    # con onupdate=func.now()) y devuelve la fila actualizada. Se carga con
+    # populate_existing para que la instancia de la sesión, si ya estaba
+    # cargada, refleje los valores devueltos
+    stmt = (
+        update(models.Tarea)
+        .where(models.Tarea.id == tarea_id, models.Tarea.usuario_id == usuario_id)
+        .values(**update_data)
+        .returning(models.Tarea)
+    )
+    consulta = select(models.Tarea).from_statement(stmt).execution_options(populate_existing=True)
+    tarea = db.execute(consulta).scalars().first()
+    restaurada = False
+    if tarea is None:
+        # Editar una tarea archivada la devuelve a tareas
+        restaurada = _restaurar_archivada(db, tarea_id, usuario_id)
+        if not restaurada:
+            raise _tarea_no_encontrada()
+        tarea = db.execute(consulta).scalars().first()
+    if restaurada or "titulo" in update_data:
+        _indexar_prefijos(db, tarea)
+    recordatorios.anotar(db, tarea)
+    return tarea
+
+def update_tarea(
+    db: Session,
+    tarea_id: int,
+    usuario_id: int,
+    tarea_update: schemas.TareaUpdate
+) -> models.Tarea:
+    """
+    Actualiza una tarea del usuario; 404 si no existe o pertenece a otro
+    usuario. Una tarea archivada vuelve a tareas con los cambios aplicados.
+    """
     # Actualizar solo los campos proporcionados
     update_data = tarea_update.model_dump(exclude_unset=True)
-    for key, value in update_data.items():
-        setattr(tarea, key, value)
-    
-    # SQLAlchemy actualizará automáticamente updated_at con onupdate=func.now()
+    return run_write(db, _update_tarea, tarea_id, usuario_id, update_data)
+
+def _delete_tarea(db: Session, tarea_id: int, usuario_id: int) -> None:
+    # Los triggers de app/ddl.py limpian contadores, búsqueda y prefijos
+    result = db.execute(
+        delete(models.Tarea)
+        .where(models.Tarea.id == tarea_id, models.Tarea.usuario_id == usuario_id)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
+        archivadas = db.execute(
+            queries.BORRAR_ARCHIVADA, {"tarea_id": tarea_id, "usuario_id": usuario_id}
+        ).rowcount
+        if archivadas == 0:
+            raise _tarea_no_encontrada()
+    recordatorios.anotar_eliminada(db, tarea_id)
+
+def delete_tarea(db: Session, tarea_id: int, usuario_id: int) -> None:
+    """
+    Elimina una tarea del usuario, activa o archivada; 404 si no existe o
+    pertenece a otro usuario
+    """
+    run_write(db, _delete_tarea, tarea_id, usuario_id)
+
+# Actualización y borrado por filtros
+
+def _forma_masiva(
+    db: Session,
+    usuario_id: int,
+    completado: Optional[bool],
+    prioridad: Optional[int],
+    buscar: Optional[str],
+    modo_busqueda: str,
+    vencidas: bool,
+    todas: bool
+) -> Tuple[queries.FormaListado, dict]:
+    """
+    Forma y parámetros (con el prefijo filtro_ de queries.actualizacion_masiva
+    y queries.borrado_masivo) de los filtros; exige al menos uno o todas=True.
+    """
+    if completado is None and prioridad is None and not buscar and not vencidas and not todas:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Indica al menos un filtro (completado, prioridad, buscar, vencidas) "
+                   "o todas=true para afectar a todas las tareas"
+        )
+    forma, parametros = _forma_y_parametros(
+        db, usuario_id, completado, prioridad, buscar, modo_busqueda, vencidas=vencidas
+    )
+    return forma, {f"filtro_{nombre}": valor for nombre, valor in parametros.items()}
+
+def _update_tareas(db: Session, forma: queries.FormaListado, parametros: dict, cambios: dict) -> int:
+    # Los triggers de app/ddl.py mantienen contadores, búsqueda, prefijos y
+    # registro de cambios; RETURNING solo hace falta para los recordatorios
+    devolver = recordatorios.programador.activo
+    stmt = queries.actualizacion_masiva(forma, tuple(sorted(cambios)), devolver)
+    valores = {f"nuevo_{campo}": valor for campo, valor in cambios.items()}
+    result = db.execute(stmt, {**parametros, **valores}, execution_options={"synchronize_session": False})
+    if not devolver:
+        return result.rowcount
+    filas = result.all()
+    for fila in filas:
+        recordatorios.anotar(db, fila)
+    return len(filas)
+
+def update_tareas(
+    db: Session,
+    usuario_id: int,
+    cambios: schemas.TareaCambioMasivo,
+    completado: Optional[bool] = None,
+    prioridad: Optional[int] = None,
+    buscar: Optional[str] = None,
+    modo_busqueda: str = "texto",
+    vencidas: bool = False,
+    todas: bool = False
+) -> int:
+    """
+    Aplica los cambios a todas las tareas del usuario que cumplen los filtros
+    de get_tareas, con una sola sentencia UPDATE, y retorna cuántas cambió.
+
+    Las tareas archivadas no se modifican.
+    """
+    update_data = cambios.model_dump(exclude_unset=True)
+    if not update_data:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Indica al menos un campo a cambiar"
+        )
+    forma, parametros = _forma_masiva(
+        db, usuario_id, completado, prioridad, buscar, modo_busqueda, vencidas, todas
+    )
+    return run_write(db, _update_tareas, forma, parametros, update_data)
+
+def _delete_tareas(db: Session, forma: queries.FormaListado, parametros: dict) -> int:
+    devolver = recordatorios.programador.activo
+    result = db.execute(
+        queries.borrado_masivo(forma, devolver), parametros,
+        execution_options={"synchronize_session": False}
+    )
+    if not devolver:
+        return result.rowcount
+    tarea_ids = result.scalars().all()
+    for tarea_id in tarea_ids:
+        recordatorios.anotar_eliminada(db, tarea_id)
+    return len(tarea_ids)
+
+def delete_tareas(
+    db: Session,
+    usuario_id: int,
+    completado: Optional[bool] = None,
+    prioridad: Optional[int] = None,
+    buscar: Optional[str] = None,
+    modo_busqueda: str = "texto",
+    vencidas: bool = False,
+    todas: bool = False
+) -> int:
+    """
+    Elimina con una sola sentencia DELETE las tareas del usuario que cumplen
+    los filtros de get_tareas y retorna cuántas eliminó.
+
+    Las tareas archivadas no se eliminan.
+    """
+    forma, parametros = _forma_masiva(
+        db, usuario_id, completado, prioridad, buscar, modo_busqueda, vencidas, todas
+    )
+    return run_write(db, _delete_tareas, forma, parametros)
+
+# Sincronización incremental
+
+def encode_cursor_cambios(origen: str, seq: int) -> str:
+    """Codifica la base de datos de origen y el último seq entregado"""
+    payload = json.dumps({"o": origen, "s": seq}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor_cambios(cursor: str) -> Tuple[str, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return str(data["o"]), int(data["s"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Cursor de sincronización no válido"
+        )
+
+def get_cambios(
+    db: Session,
+    usuario_id: int,
+    since: Optional[str] = None,
+    limit: int = 100,
+    origen: str = "principal"
+) -> schemas.TareaCambios:
+    """
+    Obtiene las tareas creadas, modificadas o eliminadas después del cursor.
     
-    db.commit()
-    db.refresh(tarea)
-    return tarea
+    Lee tareas_cambios por (usuario_id, seq), así que el coste depende del
+    número de cambios y no del número de tareas. Sin cursor se entregan todas
+    las tareas vivas, también las archivadas (y las lápidas recientes). El cursor deja de valer, y
+    la respuesta indica `reset`, si sus lápidas ya se compactaron o si las
+    tareas del usuario se movieron a otro shard (`origen`), cuyo seq es otro.
+    """
+    desde, reset = 0, False
+    try:
+        if since:
+            cursor_origen, desde = decode_cursor_cambios(since)
+            horizonte = db.execute(queries.HORIZONTE_DE_USUARIO, {"usuario_id": usuario_id}).scalar()
+            if cursor_origen != origen or (horizonte is not None and desde < horizonte):
+                desde, reset = 0, True
+        filas = db.execute(
+            queries.CAMBIOS_DESDE,
+            {"usuario_id": usuario_id, "desde": desde, "limite": limit + 1}
+        ).all()
+    except SQLAlchemyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al obtener cambios de tareas: {str(e)}"
+        )
+    has_more = len(filas) > limit
+    filas = filas[:limit]
+    items, eliminadas = [], []
+    for seq, tarea_id, eliminada, tarea, archivada in filas:
+        # Una tarea archivada después de su último cambio se entrega desde el archivo
+        tarea = tarea or archivada
+        if eliminada or tarea is None:
+            eliminadas.append(tarea_id)
+        else:
+            items.append(tarea)
+    ultimo = filas[-1].seq if filas else desde
+    return schemas.TareaCambios(
+        items=items,
+        eliminadas=eliminadas,
+        next_cursor=encode_cursor_cambios(origen, ultimo),
+        has_more=has_more,
+        reset=reset
+    )
 
-def delete_tarea(db: Session, tarea: models.Tarea) -> None:
-    """Elimina una tarea"""
-    db.delete(tarea)
-    db.commit()
\ No newline at end of file
+def compactar_cambios(db: Session, dias: Optional[int] = None) -> int:
+    """
+    Elimina las lápidas con más de `dias` días (CAMBIOS_RETENCION_DIAS por
+    defecto) y guarda el mayor seq eliminado de cada usuario como horizonte.
+    Retorna cuántas lápidas eliminó.
+    """
+    dias = settings.CAMBIOS_RETENCION_DIAS if dias is None else dias
+    corte = (datetime.now(timezone.utc) - timedelta(days=dias)).replace(tzinfo=None)
+    cambio = models.TareaCambio
+    antiguas = and_(cambio.eliminada == True, cambio.cambiado_en < corte)  # noqa: E712
+    horizontes = db.execute(
+        select(cambio.usuario_id, func.max(cambio.seq)).where(antiguas).group_by(cambio.usuario_id)
+    ).all()
+    for usuario_id, seq in horizontes:
+        db.merge(models.TareaCambiosHorizonte(usuario_id=usuario_id, seq=seq))
+    eliminadas = db.execute(delete(cambio).where(antiguas)).rowcount
+    db.commit()
+    return eliminadas
@@ -1,9 +1,125 @@
 # app/database.py
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker, declarative_base
+from app.config import settings
+from typing import Tuple
 
-DATABASE_URL = "sqlite:///./tareas.db"
+DATABASE_URL = settings.DATABASE_URL
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def is_sqlite(url: str) -> bool:
+    """Indica si la URL apunta a una base de datos SQLite"""
+    return url.startswith("sqlite")
+
+def apply_sqlite_pragmas(engine: Engine, read_only: bool = False) -> None:
+    """
+    Registra un evento de conexión que aplica el perfil de producción de SQLite.
+
+    - WAL permite que los lectores no se bloqueen detrás de las escrituras
+    - synchronous=NORMAL es seguro con WAL y evita un fsync por commit
+    - busy_timeout espera al bloqueo en lugar de fallar con "database is locked"
+    - mmap_size, cache_size y temp_store reducen lecturas de disco
+    """
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+            cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+            cursor.execute(f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE)}")
+            # Un valor negativo indica el tamaño en KiB en lugar de en páginas
+            cursor.execute(f"PRAGMA cache_size=-{int(settings.SQLITE_CACHE_SIZE_KB)}")
+            cursor.execute("PRAGMA temp_store=MEMORY")
+            if read_only:
+                cursor.execute("PRAGMA query_only=ON")
+        finally:
+            cursor.close()
+
+def apply_sqlite_transactions(engine: Engine) -> None:
+    """
+    Hace que SQLAlchemy controle el inicio de las transacciones de SQLite.
+
+    pysqlite no emite BEGIN antes de un SAVEPOINT: el SAVEPOINT más externo
+    pasa a ser la transacción y su RELEASE confirma los cambios por separado.
+    Con isolation_level=None el driver deja de abrir transacciones por su
+    cuenta y el BEGIN se emite al comenzar cada transacción, de modo que los
+    SAVEPOINT quedan anidados dentro de ella y solo el COMMIT final confirma.
+    """
+    @event.listens_for(engine, "connect")
+    def _disable_pysqlite_begin(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def _emit_begin(conn):
+        conn.exec_driver_sql("BEGIN")
+
+def create_write_queue_engine(url: str) -> Engine:
+    """
+    Crea el engine de la cola de escritura para el perfil por defecto de SQLite.
+
+    Solo la cola necesita apply_sqlite_transactions, para agrupar sus
+    SAVEPOINT en una transacción. Las sesiones de las solicitudes siguen con
+    el comportamiento de pysqlite, que no abre transacción para las lecturas:
+    con el journal por defecto (sin WAL) un BEGIN explícito en una sesión de
+    lectura mantendría el bloqueo compartido hasta cerrarla e impediría
+    confirmar a la sesión de escritura de la misma solicitud.
+    """
+    queue_engine = create_engine(
+        url,
+        connect_args={"check_same_thread": False},
+        pool_size=1,
+        max_overflow=0,
+    )
+    apply_sqlite_transactions(queue_engine)
+    return queue_engine
+
+def create_sqlite_engines(url: str) -> Tuple[Engine, Engine]:
+    """
+    Crea el par de engines escritor/lectores para SQLite en modo producción.
+
+    SQLite solo admite un escritor a la vez: el engine escritor tiene una única
+    conexión, de modo que las escrituras concurrentes esperan en el pool en vez
+    de competir por el bloqueo del archivo. Los lectores usan un pool separado
+    de SQLITE_READER_POOL_SIZE conexiones en modo solo lectura.
+    """
+    connect_args = {"check_same_thread": False}
+    writer = create_engine(
+        url,
+        connect_args=connect_args,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=settings.SQLITE_POOL_TIMEOUT_SECONDS,
+    )
+    apply_sqlite_pragmas(writer)
+    apply_sqlite_transactions(writer)
+    reader = create_engine(
+        url,
+        connect_args=connect_args,
+        pool_size=settings.SQLITE_READER_POOL_SIZE,
+        max_overflow=0,
+        pool_timeout=settings.SQLITE_POOL_TIMEOUT_SECONDS,
+    )
+    apply_sqlite_pragmas(reader, read_only=True)
+    return writer, reader
+
+if is_sqlite(DATABASE_URL) and settings.SQLITE_PRODUCTION_MODE:
+    engine, read_engine = create_sqlite_engines(DATABASE_URL)
+    write_queue_engine = engine
+elif is_sqlite(DATABASE_URL):
+    engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+    read_engine = engine
+    # Se crea sin conexiones: solo se conecta si se activa la cola
+    write_queue_engine = create_write_queue_engine(DATABASE_URL)
+else:
+    engine = create_engine(DATABASE_URL)
+    read_engine = engine
+    write_queue_engine = engine
+
+# Tras el commit las instancias conservan sus valores: los modelos leen las
+# columnas generadas con RETURNING (eager_defaults), así que expirarlas solo
+# provocaría un SELECT extra al serializar la respuesta
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=read_engine)
+WriteQueueSessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=write_queue_engine)
 Base = declarative_base()
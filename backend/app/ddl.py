@@ -0,0 +1,311 @@
+# app/ddl.py
+"""
+Objetos de base de datos que no se expresan con los modelos (triggers,
+funciones e índices de texto completo) y que se crean junto con las tablas en
+Base.metadata.create_all.
+
+Todas las sentencias son idempotentes: create_all puede ejecutarse sobre una
+base de datos existente para añadir los objetos que falten. Los contadores y el
+índice de texto completo se llenan con las tareas existentes en la misma
+transacción en que se crean, antes de instalar sus triggers: los triggers
+restan de ellos al borrar o editar, y sobre una tabla vacía dejarían
+contadores negativos y un índice FTS5 corrupto.
+"""
+from sqlalchemy import DDL, event, inspect
+from app.database import Base
+
+# Contadores de las tareas que ya existían al crear tareas_stats
+LLENAR_TAREAS_STATS = """
+    INSERT INTO tareas_stats (usuario_id, total, completadas, prioridad_1, prioridad_2, prioridad_3)
+    SELECT
+        usuario_id,
+        count(*),
+        sum(CASE WHEN completado THEN 1 ELSE 0 END),
+        sum(CASE WHEN prioridad = 1 THEN 1 ELSE 0 END),
+        sum(CASE WHEN prioridad = 2 THEN 1 ELSE 0 END),
+        sum(CASE WHEN prioridad = 3 THEN 1 ELSE 0 END)
+    FROM tareas
+    GROUP BY usuario_id
+"""
+
+@event.listens_for(Base.metadata.tables["tareas_stats"], "after_create")
+def _llenar_tareas_stats(target, connection, **kw) -> None:
+    # En una base de datos nueva tareas puede crearse después de tareas_stats
+    if inspect(connection).has_table("tareas"):
+        connection.exec_driver_sql(LLENAR_TAREAS_STATS)
+
+# Contadores de tareas_stats: cada trigger ajusta la fila del usuario en la
+# misma transacción que la escritura sobre tareas
+SQLITE_TAREAS_STATS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS tareas_stats_insert AFTER INSERT ON tareas
+    BEGIN
+        INSERT OR IGNORE INTO tareas_stats (usuario_id) VALUES (NEW.usuario_id);
+        UPDATE tareas_stats SET
+            total = total + 1,
+            completadas = completadas + (NEW.completado = 1),
+            prioridad_1 = prioridad_1 + (NEW.prioridad = 1),
+            prioridad_2 = prioridad_2 + (NEW.prioridad = 2),
+            prioridad_3 = prioridad_3 + (NEW.prioridad = 3)
+        WHERE usuario_id = NEW.usuario_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS tareas_stats_delete AFTER DELETE ON tareas
+    BEGIN
+        UPDATE tareas_stats SET
+            total = total - 1,
+            completadas = completadas - (OLD.completado = 1),
+            prioridad_1 = prioridad_1 - (OLD.prioridad = 1),
+            prioridad_2 = prioridad_2 - (OLD.prioridad = 2),
+            prioridad_3 = prioridad_3 - (OLD.prioridad = 3)
+        WHERE usuario_id = OLD.usuario_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS tareas_stats_update
+    AFTER UPDATE OF completado, prioridad, usuario_id ON tareas
+    BEGIN
+        UPDATE tareas_stats SET
+            total = total - 1,
+            completadas = completadas - (OLD.completado = 1),
+            prioridad_1 = prioridad_1 - (OLD.prioridad = 1),
+            prioridad_2 = prioridad_2 - (OLD.prioridad = 2),
+            prioridad_3 = prioridad_3 - (OLD.prioridad = 3)
+        WHERE usuario_id = OLD.usuario_id;
+        INSERT OR IGNORE INTO tareas_stats (usuario_id) VALUES (NEW.usuario_id);
+        UPDATE tareas_stats SET
+            total = total + 1,
+            completadas = completadas + (NEW.completado = 1),
+            prioridad_1 = prioridad_1 + (NEW.prioridad = 1),
+            prioridad_2 = prioridad_2 + (NEW.prioridad = 2),
+            prioridad_3 = prioridad_3 + (NEW.prioridad = 3)
+        WHERE usuario_id = NEW.usuario_id;
+    END
+    """,
+]
+
+POSTGRESQL_TAREAS_STATS = [
+    """
+    CREATE OR REPLACE FUNCTION tareas_stats_ajustar() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            UPDATE tareas_stats SET
+                total = total - 1,
+                completadas = completadas - OLD.completado::int,
+                prioridad_1 = prioridad_1 - (OLD.prioridad = 1)::int,
+                prioridad_2 = prioridad_2 - (OLD.prioridad = 2)::int,
+                prioridad_3 = prioridad_3 - (OLD.prioridad = 3)::int
+            WHERE usuario_id = OLD.usuario_id;
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            INSERT INTO tareas_stats (usuario_id) VALUES (NEW.usuario_id)
+            ON CONFLICT (usuario_id) DO NOTHING;
+            UPDATE tareas_stats SET
+                total = total + 1,
+                completadas = completadas + NEW.completado::int,
+                prioridad_1 = prioridad_1 + (NEW.prioridad = 1)::int,
+                prioridad_2 = prioridad_2 + (NEW.prioridad = 2)::int,
+                prioridad_3 = prioridad_3 + (NEW.prioridad = 3)::int
+            WHERE usuario_id = NEW.usuario_id;
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS tareas_stats_cambios ON tareas",
+    """
+    CREATE TRIGGER tareas_stats_cambios
+    AFTER INSERT OR DELETE OR UPDATE OF completado, prioridad, usuario_id ON tareas
+    FOR EACH ROW EXECUTE FUNCTION tareas_stats_ajustar()
+    """,
+]
+
+# Índice de texto completo de título y descripción. En SQLite es una tabla FTS5
+# de contenido externo (solo guarda el índice; el texto se lee de tareas) que
+# también indexa usuario_id para acotar cada búsqueda a las tareas del usuario
+SQLITE_CREAR_TAREAS_FTS = """
+    CREATE VIRTUAL TABLE tareas_fts USING fts5(
+        titulo, descripcion, usuario_id,
+        content='tareas', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+"""
+
+def _crear_tareas_fts(target, connection, **kw) -> None:
+    """Crea tareas_fts si no existe y la llena con las tareas existentes"""
+    if connection.dialect.name != "sqlite" or inspect(connection).has_table("tareas_fts"):
+        return
+    connection.exec_driver_sql(SQLITE_CREAR_TAREAS_FTS)
+    connection.exec_driver_sql("INSERT INTO tareas_fts (tareas_fts) VALUES ('rebuild')")
+
+SQLITE_TAREAS_FTS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS tareas_fts_insert AFTER INSERT ON tareas
+    BEGIN
+        INSERT INTO tareas_fts (rowid, titulo, descripcion, usuario_id)
+        VALUES (NEW.id, NEW.titulo, NEW.descripcion, NEW.usuario_id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS tareas_fts_delete AFTER DELETE ON tareas
+    BEGIN
+        INSERT INTO tareas_fts (tareas_fts, rowid, titulo, descripcion, usuario_id)
+        VALUES ('delete', OLD.id, OLD.titulo, OLD.descripcion, OLD.usuario_id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS tareas_fts_update
+    AFTER UPDATE OF titulo, descripcion, usuario_id ON tareas
+    BEGIN
+        INSERT INTO tareas_fts (tareas_fts, rowid, titulo, descripcion, usuario_id)
+        VALUES ('delete', OLD.id, OLD.titulo, OLD.descripcion, OLD.usuario_id);
+        INSERT INTO tareas_fts (rowid, titulo, descripcion, usuario_id)
+        VALUES (NEW.id, NEW.titulo, NEW.descripcion, NEW.usuario_id);
+    END
+    """,
+]
+
+# En PostgreSQL una columna generada mantiene el tsvector y un índice GIN lo sirve
+POSTGRESQL_TAREAS_FTS = [
+    """
+    ALTER TABLE tareas ADD COLUMN IF NOT EXISTS busqueda tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('spanish', coalesce(titulo, '')), 'A') ||
+        setweight(to_tsvector('spanish', coalesce(descripcion, '')), 'B')
+    ) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_tareas_busqueda ON tareas USING GIN (busqueda)",
+]
+
+# Prefijos del autocompletado: se eliminan con la tarea y siguen su prioridad
+SQLITE_TAREA_PREFIJOS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS tarea_prefijos_delete AFTER DELETE ON tareas
+    BEGIN
+        DELETE FROM tarea_prefijos WHERE tarea_id = OLD.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS tarea_prefijos_prioridad AFTER UPDATE OF prioridad ON tareas
+    BEGIN
+        UPDATE tarea_prefijos SET prioridad = NEW.prioridad WHERE tarea_id = NEW.id;
+    END
+    """,
+]
+
+POSTGRESQL_TAREA_PREFIJOS = [
+    """
+    CREATE OR REPLACE FUNCTION tarea_prefijos_sincronizar() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            DELETE FROM tarea_prefijos WHERE tarea_id = OLD.id;
+        ELSE
+            UPDATE tarea_prefijos SET prioridad = NEW.prioridad WHERE tarea_id = NEW.id;
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS tarea_prefijos_cambios ON tareas",
+    """
+    CREATE TRIGGER tarea_prefijos_cambios
+    AFTER DELETE OR UPDATE OF prioridad ON tareas
+    FOR EACH ROW EXECUTE FUNCTION tarea_prefijos_sincronizar()
+    """,
+]
+
+# Registro de cambios para la sincronización incremental: cada escritura
+# reemplaza la fila de la tarea con un seq nuevo (ver models.TareaCambio). El
+# archivado y la restauración mueven la tarea entre tareas y tareas_archivo
+# sin dejar lápida: solo la deja el borrado de la tarea en la tabla donde está
+SQLITE_TAREAS_CAMBIOS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS tareas_cambios_insert AFTER INSERT ON tareas
+    BEGIN
+        INSERT OR REPLACE INTO tareas_cambios (usuario_id, tarea_id, eliminada, cambiado_en)
+        VALUES (NEW.usuario_id, NEW.id, 0, CURRENT_TIMESTAMP);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS tareas_cambios_update AFTER UPDATE ON tareas
+    BEGIN
+        INSERT OR REPLACE INTO tareas_cambios (usuario_id, tarea_id, eliminada, cambiado_en)
+        VALUES (NEW.usuario_id, NEW.id, 0, CURRENT_TIMESTAMP);
+    END
+    """,
+    # Se reemplaza para que las bases de datos anteriores al archivado sin
+    # lápidas tengan la condición
+    "DROP TRIGGER IF EXISTS tareas_cambios_delete",
+    """
+    CREATE TRIGGER tareas_cambios_delete AFTER DELETE ON tareas
+    WHEN NOT EXISTS (SELECT 1 FROM tareas_archivo WHERE id = OLD.id)
+    BEGIN
+        INSERT OR REPLACE INTO tareas_cambios (usuario_id, tarea_id, eliminada, cambiado_en)
+        VALUES (OLD.usuario_id, OLD.id, 1, CURRENT_TIMESTAMP);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS tareas_archivo_cambios_delete AFTER DELETE ON tareas_archivo
+    WHEN NOT EXISTS (SELECT 1 FROM tareas WHERE id = OLD.id)
+    BEGIN
+        INSERT OR REPLACE INTO tareas_cambios (usuario_id, tarea_id, eliminada, cambiado_en)
+        VALUES (OLD.usuario_id, OLD.id, 1, CURRENT_TIMESTAMP);
+    END
+    """,
+]
+
+POSTGRESQL_TAREAS_CAMBIOS = [
+    """
+    CREATE OR REPLACE FUNCTION tareas_cambios_registrar() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            -- Una tarea que pasa de una tabla a la otra no se ha eliminado
+            IF EXISTS (SELECT 1 FROM tareas_archivo WHERE id = OLD.id)
+                OR EXISTS (SELECT 1 FROM tareas WHERE id = OLD.id) THEN
+                RETURN NULL;
+            END IF;
+            INSERT INTO tareas_cambios (usuario_id, tarea_id, eliminada)
+            VALUES (OLD.usuario_id, OLD.id, true)
+            ON CONFLICT (tarea_id) DO UPDATE SET
+                seq = DEFAULT, usuario_id = EXCLUDED.usuario_id,
+                eliminada = true, cambiado_en = now();
+        ELSE
+            INSERT INTO tareas_cambios (usuario_id, tarea_id, eliminada)
+            VALUES (NEW.usuario_id, NEW.id, false)
+            ON CONFLICT (tarea_id) DO UPDATE SET
+                seq = DEFAULT, usuario_id = EXCLUDED.usuario_id,
+                eliminada = false, cambiado_en = now();
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS tareas_cambios_registro ON tareas",
+    """
+    CREATE TRIGGER tareas_cambios_registro
+    AFTER INSERT OR UPDATE OR DELETE ON tareas
+    FOR EACH ROW EXECUTE FUNCTION tareas_cambios_registrar()
+    """,
+    "DROP TRIGGER IF EXISTS tareas_archivo_cambios_registro ON tareas_archivo",
+    """
+    CREATE TRIGGER tareas_archivo_cambios_registro
+    AFTER DELETE ON tareas_archivo
+    FOR EACH ROW EXECUTE FUNCTION tareas_cambios_registrar()
+    """,
+]
+
+def register(statements, dialect: str) -> None:
+    """Ejecuta las sentencias tras crear las tablas en el dialecto indicado"""
+    for statement in statements:
+        event.listen(Base.metadata, "after_create", DDL(statement).execute_if(dialect=dialect))
+
+register(SQLITE_TAREAS_STATS, "sqlite")
+register(POSTGRESQL_TAREAS_STATS, "postgresql")
+event.listen(Base.metadata, "after_create", _crear_tareas_fts)
+register(SQLITE_TAREAS_FTS, "sqlite")
+register(POSTGRESQL_TAREAS_FTS, "postgresql")
+register(SQLITE_TAREA_PREFIJOS, "sqlite")
+register(POSTGRESQL_TAREA_PREFIJOS, "postgresql")
+register(SQLITE_TAREAS_CAMBIOS, "sqlite")
+register(POSTGRESQL_TAREAS_CAMBIOS, "postgresql")
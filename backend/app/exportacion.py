@@ -0,0 +1,93 @@
+# app/exportacion.py
+"""
+Exportación de las tareas de un usuario en NDJSON o CSV.
+
+Las filas se leen con un cursor del servidor (yield_per, que activa
+stream_results) en particiones de EXPORTACION_LOTE filas, y cada partición se
+codifica y se entrega como un trozo de la respuesta antes de leer la
+siguiente. Se seleccionan columnas y no entidades, así que la sesión no
+acumula objetos: la memoria no depende del número de tareas exportadas.
+
+La respuesta se envía después de que FastAPI cierre las sesiones de las
+dependencias, por lo que la exportación abre y cierra su propia sesión de
+lectura.
+"""
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Any, Callable, Iterator, List, Optional, Sequence
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app import models, schemas
+from app.config import settings
+from app.replicas import router as replica_router
+from app.shards import shard_router
+
+FORMATOS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+CAMPOS = (
+    "id", "titulo", "descripcion", "completado", "prioridad", "fecha_vencimiento",
+    "created_at", "updated_at"
+)
+
+def sesion_de_lectura(usuario_id: int) -> Session:
+    """Sesión de lectura sobre la base de datos con las tareas del usuario"""
+    if shard_router.habilitado:
+        return shard_router.session(usuario_id)
+    return replica_router.read_session(usuario_id)
+
+def _valor(valor: Any) -> Any:
+    if isinstance(valor, datetime):
+        return schemas.en_utc(valor).isoformat()
+    return valor
+
+def _ndjson(filas: Sequence) -> str:
+    return "".join(
+        json.dumps(dict(zip(CAMPOS, map(_valor, fila))), ensure_ascii=False) + "\n"
+        for fila in filas
+    )
+
+def _csv(filas: Sequence, encabezado: bool) -> str:
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    if encabezado:
+        escritor.writerow(CAMPOS)
+    for fila in filas:
+        escritor.writerow([
+            "" if valor is None else str(valor).lower() if isinstance(valor, bool) else _valor(valor)
+            for valor in fila
+        ])
+    return buffer.getvalue()
+
+def exportar_tareas(
+    abrir_sesion: Callable[[], Session],
+    usuario_id: int,
+    formato: str = "ndjson",
+    incluir_archivadas: bool = False,
+    lote: Optional[int] = None
+) -> Iterator[str]:
+    """
+    Genera la exportación de las tareas del usuario, por orden de id, un trozo
+    por partición del cursor. Con `incluir_archivadas` siguen las tareas
+    archivadas.
+    """
+    lote = lote or settings.EXPORTACION_LOTE
+    modelos: List[Any] = [models.Tarea]
+    if incluir_archivadas:
+        modelos.append(models.TareaArchivada)
+    db = abrir_sesion()
+    try:
+        if formato == "csv":
+            yield _csv([], encabezado=True)
+        for modelo in modelos:
+            stmt = select(*(getattr(modelo, campo) for campo in CAMPOS)).where(
+                modelo.usuario_id == usuario_id
+            ).order_by(modelo.id).execution_options(yield_per=lote)
+            for filas in db.execute(stmt).partitions():
+                yield _csv(filas, encabezado=False) if formato == "csv" else _ndjson(filas)
+    finally:
+        db.close()
@@ -0,0 +1,167 @@
+# app/importacion.py
+"""
+Importación de tareas desde un cuerpo NDJSON o CSV.
+
+El cuerpo se lee por trozos a medida que llega y se decodifica y divide en
+líneas de forma incremental, sin guardarlo entero en memoria. Cada fila se
+valida contra TareaCreate al llegar y las válidas se acumulan en lotes de
+IMPORTACION_LOTE, que se guardan con un INSERT de varias filas en su propia
+transacción. Del resultado solo se conservan los contadores y los
+primeros IMPORTACION_MAX_ERRORES errores, de modo que la memoria no depende
+del tamaño del archivo.
+
+En CSV la primera fila es el encabezado con los nombres de los campos; las
+columnas desconocidas (como id o created_at de GET /tareas/export) se
+ignoran y una celda vacía equivale a no indicar el campo.
+"""
+import codecs
+import csv
+import json
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+from pydantic import ValidationError
+from sqlalchemy.exc import SQLAlchemyError
+from app import schemas
+from app.config import settings
+
+FORMATOS = ("ndjson", "csv")
+
+Errores = List[Dict[str, Any]]
+
+def _error(msg: str, tipo: str) -> Errores:
+    return [{"loc": (), "msg": msg, "type": tipo}]
+
+async def lineas(
+    trozos: AsyncIterator[bytes],
+    max_linea: Optional[int] = None
+) -> AsyncIterator[Tuple[int, Optional[str]]]:
+    """
+    Líneas del cuerpo con su número, terminadas en salto de línea. Una línea
+    de más de `max_linea` caracteres se descarta sin acumularla y se entrega
+    como None.
+    """
+    max_linea = max_linea or settings.IMPORTACION_MAX_LINEA
+    decodificador = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    pendiente = ""
+    descartando = False
+    numero = 0
+    async for trozo in trozos:
+        partes = (pendiente + decodificador.decode(trozo)).split("\n")
+        pendiente = partes.pop()
+        for parte in partes:
+            numero += 1
+            yield numero, None if descartando else parte + "\n"
+            descartando = False
+        if len(pendiente) > max_linea:
+            pendiente = ""
+            descartando = True
+    pendiente += decodificador.decode(b"", final=True)
+    if pendiente or descartando:
+        yield numero + 1, None if descartando else pendiente
+
+Registro = Tuple[int, Any, Optional[Errores]]
+
+async def _registros_ndjson(fuente: AsyncIterator[Tuple[int, Optional[str]]]) -> AsyncIterator[Registro]:
+    async for numero, linea in fuente:
+        if linea is None:
+            yield numero, None, _error("Línea demasiado larga", "linea_larga")
+        elif linea.strip():
+            try:
+                yield numero, json.loads(linea), None
+            except json.JSONDecodeError as e:
+                yield numero, None, _error(f"JSON inválido: {e.msg}", "json_invalido")
+
+async def _registros_csv(fuente: AsyncIterator[Tuple[int, Optional[str]]]) -> AsyncIterator[Registro]:
+    encabezado: Optional[List[str]] = None
+    inicio, partes = 0, []
+    async for numero, linea in fuente:
+        if linea is None:
+            inicio, partes = 0, []
+            yield numero, None, _error("Línea demasiado larga", "linea_larga")
+            continue
+        if not partes:
+            inicio = numero
+        partes.append(linea)
+        registro = "".join(partes)
+        # Una celda entre comillas puede incluir saltos de línea: el registro
+        # termina cuando las comillas quedan cerradas
+        if registro.count('"') % 2:
+            if len(registro) > settings.IMPORTACION_MAX_LINEA:
+                partes = []
+                yield inicio, None, _error("Fila demasiado larga", "linea_larga")
+            continue
+        partes = []
+        if not registro.strip():
+            continue
+        try:
+            valores = next(csv.reader([registro]))
+        except csv.Error as e:
+            yield inicio, None, _error(f"CSV inválido: {e}", "csv_invalido")
+            continue
+        if encabezado is None:
+            encabezado = [nombre.strip() for nombre in valores]
+        elif len(valores) != len(encabezado):
+            yield inicio, None, _error(
+                f"La fila tiene {len(valores)} columnas y el encabezado {len(encabezado)}",
+                "columnas"
+            )
+        else:
+            yield inicio, {campo: valor for campo, valor in zip(encabezado, valores) if valor != ""}, None
+    if partes:
+        yield inicio, None, _error("Comillas sin cerrar al final del archivo", "csv_invalido")
+
+async def importar_tareas(
+    trozos: AsyncIterator[bytes],
+    formato: str,
+    guardar: Callable[[List[schemas.TareaCreate]], Awaitable[Any]],
+    lote: Optional[int] = None,
+    max_errores: Optional[int] = None
+) -> schemas.TareaImportResponse:
+    """
+    Importa las tareas del cuerpo en lotes. `guardar` recibe las tareas
+    válidas de cada lote y las guarda en una transacción; si falla, las
+    líneas de ese lote se informan como rechazadas y la importación sigue.
+    """
+    lote = lote or settings.IMPORTACION_LOTE
+    max_errores = settings.IMPORTACION_MAX_ERRORES if max_errores is None else max_errores
+    respuesta = schemas.TareaImportResponse(importadas=0, rechazadas=0, errores=[])
+
+    def rechazar(numero: int, errores: Errores) -> None:
+        respuesta.rechazadas += 1
+        if len(respuesta.errores) < max_errores:
+            respuesta.errores.append(schemas.TareaImportError(linea=numero, errores=errores))
+        else:
+            respuesta.errores_truncados = True
+
+    async def guardar_lote(numeros: List[int], tareas: List[schemas.TareaCreate]) -> None:
+        try:
+            await guardar(tareas)
+            respuesta.importadas += len(tareas)
+        except Exception as e:
+            # Cualquier fallo al guardar (de la base de datos o, por ejemplo,
+            # el 503 de unas tareas que se están moviendo de shard) rechaza
+            # solo ese lote y se informa en la respuesta con lo ya importado
+            tipo = "base_de_datos" if isinstance(e, SQLAlchemyError) else "no_guardado"
+            for numero in numeros:
+                rechazar(numero, _error(f"Error al guardar el lote: {e}", tipo))
+
+    registros = _registros_csv if formato == "csv" else _registros_ndjson
+    numeros: List[int] = []
+    validas: List[schemas.TareaCreate] = []
+    async for numero, item, errores in registros(lineas(trozos)):
+        if errores is None:
+            try:
+                validas.append(schemas.TareaCreate.model_validate(item))
+                numeros.append(numero)
+            except ValidationError as e:
+                errores = [{"loc": err["loc"], "msg": err["msg"], "type": err["type"]} for err in e.errors()]
+        if errores:
+            rechazar(numero, errores)
+        elif len(validas) >= lote:
+            await guardar_lote(numeros, validas)
+            numeros, validas = [], []
+    if validas:
+        await guardar_lote(numeros, validas)
+    # Los errores de un lote que no se pudo guardar llegan después de los de
+    # las líneas siguientes
+    respuesta.errores.sort(key=lambda error: error.linea)
+    return respuesta
@@ -1,23 +1,31 @@
-from fastapi import FastAPI, Depends, HTTPException, status, Request, Response
+from fastapi import FastAPI, Depends, HTTPException, status, Request, Response, Query, Body, BackgroundTasks
 from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import text
-from app import models, schemas, crud
-from app.database import SessionLocal, engine
+from app import models, schemas, crud, queries, archivo, exportacion, importacion
+from app.database import SessionLocal, engine, read_engine
+from app.replicas import router as replica_router
 from app.security import (
     authenticate_user, create_access_token, get_current_active_user,
     create_refresh_token, create_tokens_for_user, get_user_from_token, get_current_user_for_tarea,
-    verify_task_ownership
+    verify_task_ownership, get_read_db, get_request_user_id
 )
 from app.config import settings
+from app.write_queue import write_queue
+from app.bloom import usuarios_registrados
+from app.shards import shard_router, UsuarioEnMovimiento
+from app.recordatorios import programador as programador_recordatorios
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple, Union
 from datetime import datetime, timedelta, timezone
+import asyncio
+import logging
 import time
 from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.concurrency import run_in_threadpool
 import re
 from jose import jwt, JWTError
 import json
@@ -26,6 +34,8 @@ from starlette.types import ASGIApp
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
+logger = logging.getLogger(__name__)
+
 # Middleware para rate limiting
 class RateLimitMiddleware(BaseHTTPMiddleware):
     def __init__(self, app: ASGIApp):
@@ -120,6 +130,24 @@ class AuthMiddleware(BaseHTTPMiddleware):
     def __init__(self, app: ASGIApp):
         super().__init__(app)
         
+    @staticmethod
+    def load_user(email: str, user_id: Optional[int] = None):
+        """
+        Obtiene el usuario y su estado desde una sesión de lectura.
+        
+        La sesión se cierra antes de continuar con la solicitud para no retener
+        una conexión del pool durante toda la petición.
+        """
+        db = replica_router.read_session(user_id)
+        try:
+            user = db.execute(queries.USUARIO_POR_EMAIL, {"email": email}).scalars().first()
+            if not user:
+                return None, False
+            # El estado se lee de la misma fila, sin una segunda consulta
+            return user, bool(user.is_active)
+        finally:
+            db.close()
+        
     async def dispatch(self, request: Request, call_next):
         # Permitir peticiones OPTIONS (preflight CORS) sin autenticación
         if request.method == "OPTIONS":
@@ -128,6 +156,7 @@ class AuthMiddleware(BaseHTTPMiddleware):
         # Lista de rutas públicas que no requieren autenticación
         public_paths = [
             "/register",
+            "/register/availability",
             "/login",
             "/token",
             "/refresh",
@@ -176,34 +205,32 @@ class AuthMiddleware(BaseHTTPMiddleware):
                     headers={"WWW-Authenticate": "Bearer", "Access-Control-Allow-Origin": "*", "Access-Control-Allow-Credentials": "true"},
                 )
                 
-            # Obtener el usuario
-            db = SessionLocal()
-            try:
-                user = db.query(models.Usuario).filter(models.Usuario.email == email).first()
-                if not user:
-                    return JSONResponse(
-                        status_code=status.HTTP_401_UNAUTHORIZED,
-                        content={"detail": "Usuario no encontrado"},
-                        headers={"WWW-Authenticate": "Bearer", "Access-Control-Allow-Origin": "*", "Access-Control-Allow-Credentials": "true"},
-                    )
-                    
-                # Verificar si el usuario está activo usando el atributo directamente
-                is_active = bool(db.query(models.Usuario.is_active).filter(models.Usuario.id == user.id).scalar())
-                if not is_active:
-                    return JSONResponse(
-                        status_code=status.HTTP_401_UNAUTHORIZED,
-                        content={"detail": "Usuario inactivo"},
-                        headers={"WWW-Authenticate": "Bearer", "Access-Control-Allow-Origin": "*", "Access-Control-Allow-Credentials": "true"},
-                    )
+            # Obtener el usuario en el threadpool: la consulta es bloqueante y no
+            # debe ocupar el event loop mientras espera una conexión del pool
+            user_id = payload.get("user_id")
+            user, is_active = await run_in_threadpool(
+                self.load_user, email, user_id if isinstance(user_id, int) else None
+            )
+            if not user:
+                return JSONResponse(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    content={"detail": "Usuario no encontrado"},
+                    headers={"WWW-Authenticate": "Bearer", "Access-Control-Allow-Origin": "*", "Access-Control-Allow-Credentials": "true"},
+                )
                 
-                # Agregar el usuario a la solicitud
-                request.state.user = user
+            if not is_active:
+                return JSONResponse(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    content={"detail": "Usuario inactivo"},
+                    headers={"WWW-Authenticate": "Bearer", "Access-Control-Allow-Origin": "*", "Access-Control-Allow-Credentials": "true"},
+                )
                 
-                # Continuar con la solicitud
-                response = await call_next(request)
-                return response
-            finally:
-                db.close()
+            # Agregar el usuario a la solicitud
+            request.state.user = user
+            
+            # Continuar con la solicitud
+            response = await call_next(request)
+            return response
         except JWTError:
             return JSONResponse(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -217,17 +244,112 @@ class AuthMiddleware(BaseHTTPMiddleware):
                 headers={"Access-Control-Allow-Origin": "*", "Access-Control-Allow-Credentials": "true"}
             )
 
+def reconstruir_filtro_usuarios():
+    """Reconstruye el filtro de Bloom de usuarios desde una sesión de lectura"""
+    db = replica_router.read_session(None)
+    try:
+        usuarios_registrados.reconstruir(db)
+    except Exception:
+        logger.exception("No se pudo construir el filtro de usuarios registrados")
+    finally:
+        db.close()
+
+def archivar_tareas_antiguas():
+    """Archiva las tareas completadas antiguas de todas las bases de datos"""
+    try:
+        archivo.archivar_todo()
+    except Exception:
+        logger.exception("No se pudieron archivar las tareas completadas")
+
+def compactar_cambios():
+    """Elimina las lápidas antiguas de la sincronización en todas las bases de datos"""
+    try:
+        shard_router.en_cada_base(crud.compactar_cambios)
+    except Exception:
+        logger.exception("No se pudieron compactar los cambios de tareas")
+
+def revisar_recordatorios():
+    """Dispara los recordatorios de vencimiento que ya tocan"""
+    try:
+        programador_recordatorios.tick()
+    except Exception:
+        logger.exception("No se pudieron revisar los recordatorios")
+
+def indexar_sugerencias_importadas(usuario_id: int, rangos: List[Tuple[int, int]]) -> None:
+    """
+    Añade al índice de sugerencias las tareas importadas, después de responder.
+
+    La sesión de la solicitud ya está cerrada: abre una propia sobre la base
+    de datos con las tareas del usuario (su shard, si hay shards).
+    """
+    db = shard_router.session(usuario_id) if shard_router.habilitado else SessionLocal()
+    try:
+        # Transacciones cortas para no retener al escritor: cada tarea
+        # aporta decenas de filas al índice
+        paso = settings.SUGERENCIAS_LOTE
+        for desde, hasta in rangos:
+            for inicio in range(desde, hasta + 1, paso):
+                crud.indexar_prefijos(db, usuario_id, inicio, min(inicio + paso - 1, hasta))
+    except Exception:
+        logger.exception("No se pudieron indexar las sugerencias de las tareas importadas")
+    finally:
+        db.close()
+
+async def repetir_periodicamente(segundos: float, tarea):
+    """Ejecuta la tarea en el threadpool cada `segundos`"""
+    while True:
+        await asyncio.sleep(segundos)
+        await run_in_threadpool(tarea)
+
+# Tareas de mantenimiento: (ajuste con el intervalo en segundos, función); un
+# intervalo de 0 las desactiva
+TAREAS_PERIODICAS = [
+    ("BLOOM_RECONSTRUIR_SECONDS", reconstruir_filtro_usuarios),
+    ("ARCHIVO_INTERVALO_SECONDS", archivar_tareas_antiguas),
+    ("CAMBIOS_COMPACTAR_SECONDS", compactar_cambios),
+]
+
 # Gestión del ciclo de vida de la aplicación
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
     Gestiona el ciclo de vida de la aplicación:
     - Crea tablas de la base de datos al inicio.
+    - Crea las tablas de los shards de tareas, si hay configurados.
+    - Construye el filtro de usuarios registrados.
+    - Lanza las tareas de mantenimiento periódicas (filtro de usuarios,
+      archivado y compactación de cambios).
+    - Carga y revisa los recordatorios de vencimiento si están habilitados.
+    - Arranca la cola de escritura si está habilitada.
     - Cierra las conexiones de la base de datos al finalizar.
     """
     models.Base.metadata.create_all(bind=engine)
+    if shard_router.habilitado:
+        shard_router.crear_tablas()
+        shard_router.instalar_asignador_ids()
+    reconstruir_filtro_usuarios()
+    periodicas = [
+        asyncio.create_task(repetir_periodicamente(getattr(settings, ajuste), tarea))
+        for ajuste, tarea in TAREAS_PERIODICAS
+        if getattr(settings, ajuste) > 0
+    ]
+    if settings.RECORDATORIOS_ENABLED:
+        await run_in_threadpool(programador_recordatorios.iniciar)
+        periodicas.append(asyncio.create_task(
+            repetir_periodicamente(settings.RECORDATORIOS_TICK_SECONDS, revisar_recordatorios)
+        ))
+    if settings.WRITE_QUEUE_ENABLED:
+        write_queue.start()
     yield
+    for periodica in periodicas:
+        periodica.cancel()
+    programador_recordatorios.detener()
+    write_queue.stop()
     engine.dispose()
+    if read_engine is not engine:
+        read_engine.dispose()
+    replica_router.dispose()
+    shard_router.dispose()
 
 app = FastAPI(
     lifespan=lifespan,
@@ -277,14 +399,68 @@ app.add_middleware(
 app.add_middleware(AuthMiddleware)
 app.add_middleware(RateLimitMiddleware)
 
-def get_db():
-    """Proporciona una sesión de base de datos por solicitud"""
+def get_db(request: Request):
+    """
+    Proporciona una sesión de la base de datos principal por solicitud.
+    
+    Si la solicitud confirma cambios, las siguientes lecturas del usuario se
+    dirigen a la base de datos principal durante la ventana read-your-writes.
+    """
     db = SessionLocal()
     try:
         yield db
     finally:
+        if db.info.get("wrote"):
+            replica_router.mark_write(get_request_user_id(request))
         db.close()
 
+def comprobar_escritura_de_tareas(usuario_id: int) -> None:
+    """Responde 503 si las tareas del usuario se están moviendo de shard"""
+    try:
+        shard_router.comprobar_escritura(usuario_id)
+    except UsuarioEnMovimiento:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Las tareas se están moviendo a otra base de datos; inténtalo de nuevo en unos segundos",
+            headers={"Retry-After": str(max(1, int(settings.SHARDS_CACHE_SECONDS)))}
+        )
+
+def get_tareas_db(
+    db: Session = Depends(get_db),
+    current_user: models.Usuario = Depends(get_current_active_user)
+):
+    """
+    Proporciona la sesión de escritura de las tareas del usuario actual.
+    
+    Con shards configurados es una sesión sobre el shard del usuario; si no,
+    la sesión de la base de datos principal. Mientras las tareas del usuario
+    se mueven de shard las escrituras responden 503.
+    """
+    if not shard_router.habilitado:
+        yield db
+        return
+    usuario_id = get_safe_id(current_user)
+    comprobar_escritura_de_tareas(usuario_id)
+    shard_db = shard_router.session(usuario_id)
+    try:
+        yield shard_db
+    finally:
+        shard_db.close()
+
+def get_tareas_read_db(
+    db: Session = Depends(get_read_db),
+    current_user: models.Usuario = Depends(get_current_active_user)
+):
+    """Como get_tareas_db, para lecturas (réplicas si no hay shards)"""
+    if not shard_router.habilitado:
+        yield db
+        return
+    shard_db = shard_router.session(get_safe_id(current_user))
+    try:
+        yield shard_db
+    finally:
+        shard_db.close()
+
 def handle_not_found(item_name: str):
     """Levanta una excepción HTTP 404 para recursos no encontrados"""
     raise HTTPException(
@@ -313,7 +489,37 @@ def register(usuario: schemas.UsuarioCrear, db: Session = Depends(get_db)):
     - Verifica que el username sea único
     - Retorna los datos del usuario creado (sin contraseña)
     """
-    return crud.create_usuario(db=db, usuario=usuario)
+    db_usuario = crud.create_usuario(db=db, usuario=usuario)
+    # La solicitud es pública: get_db no conoce al usuario para fijar sus
+    # lecturas a la principal mientras las réplicas reciben la cuenta
+    replica_router.mark_write(db_usuario.id)
+    return db_usuario
+
+@app.get(
+    "/register/availability",
+    response_model=schemas.Disponibilidad,
+    summary="Comprobar si un email o username están disponibles",
+    tags=["Autenticación"]
+)
+def register_availability(
+    email: Optional[str] = Query(None, max_length=255),
+    username: Optional[str] = Query(None, max_length=50),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Indica si el email y el nombre de usuario están libres para registrarse.
+    
+    - No distingue mayúsculas
+    - La mayoría de los valores libres se responden desde un filtro de Bloom
+      en memoria, sin consultar la base de datos
+    - Es orientativo: el registro vuelve a comprobar la unicidad
+    """
+    if email is None and username is None:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Indique email, username o ambos"
+        )
+    return crud.comprobar_disponibilidad(db, email, username)
 
 @app.post(
     "/token",
@@ -329,7 +535,7 @@ def login_oauth2(
     Autenticación estándar OAuth2 Password Flow.
     Recibe username y password como x-www-form-urlencoded.
     """
-    user = db.query(models.Usuario).filter(models.Usuario.email == form_data.username).first()
+    user = db.execute(queries.USUARIO_POR_EMAIL, {"email": form_data.username}).scalars().first()
     is_active = getattr(user, "is_active", False)
     if not user or not is_active:
         raise HTTPException(
@@ -358,6 +564,7 @@ def login_oauth2(
             usuario_id=get_safe_id(user),
             token=refresh_token_jwt
         )
+        replica_router.mark_write(user.id)
         
         return {
             "access_token": access_token,
@@ -461,9 +668,9 @@ def read_users_me(current_user: models.Usuario = Depends(get_current_active_user
 
 # Endpoints de tareas
 @app.post("/tareas", response_model=schemas.Tarea, status_code=status.HTTP_201_CREATED)
-async def crear_tarea(
+def crear_tarea(
     tarea: schemas.TareaCreate,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_tareas_db),
     current_user: models.Usuario = Depends(get_current_active_user)
 ):
     """Crear una nueva tarea"""
@@ -479,6 +686,198 @@ async def crear_tarea(
             headers={"Access-Control-Allow-Origin": "*", "Access-Control-Allow-Credentials": "true"}
         )
 
+@app.post(
+    "/tareas/bulk",
+    response_model=schemas.TareaBulkResponse,
+    status_code=status.HTTP_201_CREATED,
+    summary="Crear tareas en lote",
+    tags=["Tareas"],
+    responses={207: {"model": schemas.TareaBulkResponse, "description": "Algunas tareas fueron rechazadas"}}
+)
+def crear_tareas_bulk(
+    response: Response,
+    tareas: List[Any] = Body(..., description="Tareas a crear, con los campos de POST /tareas"),
+    db: Session = Depends(get_tareas_db),
+    current_user: models.Usuario = Depends(get_current_active_user)
+):
+    """
+    Crea hasta TAREAS_BULK_MAX tareas en una sola transacción.
+
+    Cada tarea se valida por separado y las válidas se insertan juntas. La
+    respuesta trae un resultado por tarea, en el orden de la solicitud, con la
+    tarea creada o sus errores de validación. Responde 201 si se crearon todas
+    y 207 si alguna fue rechazada.
+    """
+    if len(tareas) > settings.TAREAS_BULK_MAX:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Se permiten como máximo {settings.TAREAS_BULK_MAX} tareas por solicitud"
+        )
+    try:
+        resultado = crud.create_tareas_bulk(db, tareas, get_safe_id(current_user))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al crear las tareas: {str(e)}"
+        )
+    if resultado.rechazadas:
+        response.status_code = status.HTTP_207_MULTI_STATUS
+    return resultado
+
+@app.patch(
+    "/tareas",
+    response_model=schemas.TareasAfectadas,
+    summary="Actualizar las tareas que cumplen unos filtros",
+    tags=["Tareas"]
+)
+def actualizar_tareas(
+    cambios: schemas.TareaCambioMasivo,
+    completado: Optional[bool] = None,
+    prioridad: Optional[int] = None,
+    buscar: Optional[str] = None,
+    modo_busqueda: str = "texto",
+    vencidas: bool = False,
+    todas: bool = False,
+    db: Session = Depends(get_tareas_db),
+    current_user: models.Usuario = Depends(get_current_active_user)
+):
+    """
+    Aplica los cambios del cuerpo a todas las tareas del usuario que cumplen
+    los filtros, con los mismos filtros que `GET /tareas`.
+
+    - Una sola sentencia UPDATE; la respuesta trae el número de tareas cambiadas
+    - Sin filtros hay que indicar `todas=true`
+    - El título no se puede cambiar en masa y las tareas archivadas no se modifican
+    """
+    afectadas = crud.update_tareas(
+        db, get_safe_id(current_user), cambios,
+        completado=completado, prioridad=prioridad, buscar=buscar,
+        modo_busqueda=modo_busqueda, vencidas=vencidas, todas=todas
+    )
+    return {"afectadas": afectadas}
+
+@app.delete(
+    "/tareas",
+    response_model=schemas.TareasAfectadas,
+    summary="Eliminar las tareas que cumplen unos filtros",
+    tags=["Tareas"]
+)
+def eliminar_tareas(
+    completado: Optional[bool] = None,
+    prioridad: Optional[int] = None,
+    buscar: Optional[str] = None,
+    modo_busqueda: str = "texto",
+    vencidas: bool = False,
+    todas: bool = False,
+    db: Session = Depends(get_tareas_db),
+    current_user: models.Usuario = Depends(get_current_active_user)
+):
+    """
+    Elimina todas las tareas del usuario que cumplen los filtros, con los
+    mismos filtros que `GET /tareas`.
+
+    - Una sola sentencia DELETE; la respuesta trae el número de tareas eliminadas
+    - Sin filtros hay que indicar `todas=true`
+    - Las tareas archivadas no se eliminan
+    """
+    afectadas = crud.delete_tareas(
+        db, get_safe_id(current_user),
+        completado=completado, prioridad=prioridad, buscar=buscar,
+        modo_busqueda=modo_busqueda, vencidas=vencidas, todas=todas
+    )
+    return {"afectadas": afectadas}
+
+@app.get(
+    "/tareas/export",
+    summary="Exportar las tareas en NDJSON o CSV",
+    tags=["Tareas"],
+    response_class=StreamingResponse,
+    responses={200: {"content": {tipo: {} for tipo in exportacion.FORMATOS.values()}}}
+)
+def exportar_tareas(
+    formato: str = Query("ndjson", alias="format", description="ndjson o csv"),
+    incluir_archivadas: bool = False,
+    current_user: models.Usuario = Depends(get_current_active_user)
+):
+    """
+    Exporta todas las tareas del usuario, por orden de id.
+
+    - `format=ndjson` (un objeto JSON por línea) o `format=csv` (con encabezado)
+    - La respuesta se envía por trozos a medida que se leen las filas, con
+      memoria constante sin importar el número de tareas
+    - `incluir_archivadas=true` añade al final las tareas archivadas
+    """
+    if formato not in exportacion.FORMATOS:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Formato '{formato}' no válido. "
+                   f"Valores permitidos: {', '.join(exportacion.FORMATOS)}"
+        )
+    usuario_id = get_safe_id(current_user)
+    return StreamingResponse(
+        exportacion.exportar_tareas(
+            lambda: exportacion.sesion_de_lectura(usuario_id),
+            usuario_id,
+            formato,
+            incluir_archivadas=incluir_archivadas
+        ),
+        media_type=exportacion.FORMATOS[formato],
+        headers={"Content-Disposition": f'attachment; filename="tareas.{formato}"'}
+    )
+
+@app.post(
+    "/tareas/import",
+    response_model=schemas.TareaImportResponse,
+    summary="Importar tareas desde NDJSON o CSV",
+    tags=["Tareas"],
+    openapi_extra={"requestBody": {"required": True, "content": {
+        "application/x-ndjson": {"schema": {"type": "string"}},
+        "text/csv": {"schema": {"type": "string"}}
+    }}}
+)
+async def importar_tareas(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    formato: str = Query("ndjson", alias="format", description="ndjson o csv"),
+    db: Session = Depends(get_tareas_db),
+    current_user: models.Usuario = Depends(get_current_active_user)
+):
+    """
+    Importa las tareas del cuerpo de la solicitud, con los campos de `POST /tareas`.
+
+    - `format=ndjson` (un objeto JSON por línea) o `format=csv` (con encabezado)
+    - El cuerpo se procesa a medida que llega, en lotes de IMPORTACION_LOTE
+      tareas con una transacción cada uno
+    - Las líneas inválidas no detienen la importación: la respuesta trae
+      cuántas tareas se importaron y los errores de cada línea rechazada
+    - Las tareas importadas aparecen en `GET /tareas/suggest` poco después de
+      la respuesta: sus prefijos se indexan en segundo plano
+    """
+    if formato not in importacion.FORMATOS:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Formato '{formato}' no válido. "
+                   f"Valores permitidos: {', '.join(importacion.FORMATOS)}"
+        )
+    usuario_id = get_safe_id(current_user)
+
+    # Ids de cada lote guardado, para indexar sus prefijos al terminar: son
+    # decenas de filas por tarea y dominarían el tiempo de la importación
+    rangos: List[Tuple[int, int]] = []
+
+    async def guardar(tareas: List[schemas.TareaCreate]) -> None:
+        # Una importación larga puede empezar antes de que se muevan las tareas
+        comprobar_escritura_de_tareas(usuario_id)
+        creadas = await run_in_threadpool(crud.create_tareas, db, tareas, usuario_id, False)
+        rangos.append((creadas[0].id, creadas[-1].id))
+
+    respuesta = await importacion.importar_tareas(request.stream(), formato, guardar)
+    if rangos:
+        background_tasks.add_task(indexar_sugerencias_importadas, usuario_id, rangos)
+    return respuesta
+
 @app.get(
     "/tareas",
     response_model=schemas.TareaListResponse,
@@ -491,21 +890,40 @@ def listar_tareas(
     completado: Optional[bool] = None,
     prioridad: Optional[int] = None,
     buscar: Optional[str] = None,
-    ordenar_por: str = "created_at",
+    ordenar_por: Optional[str] = None,
     orden: str = "desc",
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = None,
+    include_total: bool = True,
+    aproximado: bool = False,
+    modo_busqueda: str = "texto",
+    fields: Optional[str] = None,
+    incluir_archivadas: bool = False,
+    vencidas: bool = False,
+    db: Session = Depends(get_tareas_read_db),
     current_user: models.Usuario = Depends(get_current_active_user)
 ):
     """
     Lista las tareas del usuario con filtros y paginación.
     
     - Soporta filtrado por estado de completado y prioridad
-    - Soporta búsqueda en título y descripción
-    - Soporta ordenamiento por cualquier campo
+    - Soporta búsqueda por palabras en título y descripción con índice de texto
+      completo (`modo_busqueda=subcadena` conserva la búsqueda por subcadena)
+    - Soporta ordenamiento por created_at, prioridad o titulo (columnas con índice),
+      y por relevancia al buscar (orden por defecto con `buscar`)
     - Incluye información de paginación
+    - Con `cursor` (tomado de `next_cursor`) la página siguiente se obtiene por
+      keyset y su coste no depende de la profundidad; `skip` sigue funcionando
+    - `include_total=false` omite el conteo y `aproximado=true` acepta un total
+      calculado recientemente
+    - `fields` (por ejemplo `titulo,completado,prioridad`) limita las columnas
+      consultadas y los campos de cada tarea en la respuesta; `id` se incluye siempre
+    - `incluir_archivadas=true` añade las tareas completadas archivadas; la
+      búsqueda es entonces por subcadena
+    - `vencidas=true` filtra las tareas pendientes con la fecha de vencimiento pasada
     """
     try:
-        tareas, total = crud.get_tareas(
+        campos = crud.parse_campos(fields)
+        tareas, total, next_cursor = crud.get_tareas(
             db=db,
             usuario_id=get_safe_id(current_user),
             skip=skip,
@@ -514,18 +932,28 @@ def listar_tareas(
             prioridad=prioridad,
             buscar=buscar,
             ordenar_por=ordenar_por,
-            orden=orden
+            orden=orden,
+            cursor=cursor,
+            include_total=include_total,
+            aproximado=aproximado,
+            modo_busqueda=modo_busqueda,
+            campos=campos,
+            incluir_archivadas=incluir_archivadas,
+            vencidas=vencidas
         )
+        if campos:
+            tareas = [schemas.TareaParcial.desde(tarea, campos) for tarea in tareas]
         
         # Calcular el número total de páginas
-        total_pages = (total + limit - 1) // limit
+        total_pages = (total + limit - 1) // limit if total is not None else None
         
         return {
             "items": tareas,
             "total": total,
             "page": (skip // limit) + 1,
             "size": limit,
-            "pages": total_pages
+            "pages": total_pages,
+            "next_cursor": next_cursor
         }
         
     except HTTPException as e:
@@ -537,85 +965,190 @@ def listar_tareas(
             headers={"Access-Control-Allow-Origin": "*", "Access-Control-Allow-Credentials": "true"}
         )
 
+@app.get(
+    "/tareas/stats",
+    response_model=schemas.TareaStats,
+    summary="Contadores de tareas del usuario",
+    tags=["Tareas"]
+)
+def get_tareas_stats(
+    db: Session = Depends(get_tareas_read_db),
+    current_user: models.Usuario = Depends(get_current_active_user)
+):
+    """
+    Obtiene el total de tareas, completadas, pendientes y el conteo por prioridad.
+    
+    Los contadores se mantienen al escribir, por lo que la consulta no recorre
+    las tareas del usuario.
+    """
+    return crud.get_tareas_stats(db, get_safe_id(current_user))
+
+@app.get(
+    "/tareas/suggest",
+    response_model=List[schemas.TareaSugerencia],
+    summary="Autocompletado de títulos de tareas",
+    tags=["Tareas"]
+)
+def sugerir_tareas(
+    q: str,
+    limit: int = Query(10, ge=1, le=50),
+    db: Session = Depends(get_tareas_read_db),
+    current_user: models.Usuario = Depends(get_current_active_user)
+):
+    """
+    Sugiere tareas cuyo título tiene una palabra que empieza por `q`.
+    
+    - No distingue mayúsculas ni acentos
+    - Ordena por prioridad y después por las más recientes
+    - Usa un índice de prefijos, por lo que responde en tiempo constante
+      respecto al número de tareas
+    """
+    return crud.get_sugerencias(db, get_safe_id(current_user), q, limit)
+
+@app.get(
+    "/tareas/proximas",
+    response_model=List[schemas.Tarea],
+    summary="Tareas pendientes próximas a vencer",
+    tags=["Tareas"]
+)
+def tareas_proximas(
+    dentro_de: int = Query(7, ge=1, le=366, description="Días a partir de ahora"),
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_tareas_read_db),
+    current_user: models.Usuario = Depends(get_current_active_user)
+):
+    """
+    Lista las tareas pendientes que vencen en los próximos `dentro_de` días,
+    de la más próxima a la más lejana.
+    
+    Se resuelve con un recorrido por rango del índice (usuario_id,
+    fecha_vencimiento), sin leer el resto de las tareas.
+    """
+    return crud.get_tareas_proximas(db, get_safe_id(current_user), timedelta(days=dentro_de), limit)
+
+@app.get(
+    "/tareas/changes",
+    response_model=schemas.TareaCambios,
+    summary="Cambios de tareas para sincronización incremental",
+    tags=["Tareas"]
+)
+def cambios_tareas(
+    since: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_tareas_read_db),
+    current_user: models.Usuario = Depends(get_current_active_user)
+):
+    """
+    Devuelve las tareas creadas o modificadas y los ids de las eliminadas
+    después de `since` (el `next_cursor` de la sincronización anterior).
+    
+    - Sin `since` se entregan todas las tareas del usuario
+    - Con `has_more` hay que seguir pidiendo con `next_cursor`
+    - Con `reset` el cursor ya no es válido (lápidas compactadas o tareas
+      movidas de shard): el cliente descarta su copia y aplica la respuesta
+      como una sincronización completa
+    - El coste depende del número de cambios, no del número de tareas
+    """
+    usuario_id = get_safe_id(current_user)
+    return crud.get_cambios(db, usuario_id, since, limit, origen=shard_router.origen_de(usuario_id))
+
+@app.get(
+    "/tareas/batch",
+    response_model=schemas.TareaBatchResponse,
+    summary="Obtener varias tareas por id",
+    tags=["Tareas"]
+)
+def get_tareas_batch(
+    ids: str = Query(..., description="Ids separados por comas", examples=["12,7,31"]),
+    fields: Optional[str] = None,
+    db: Session = Depends(get_tareas_read_db),
+    current_user: models.Usuario = Depends(get_current_active_user)
+):
+    """
+    Obtiene hasta TAREAS_BATCH_MAX tareas por id con una sola consulta.
+
+    - Las tareas se devuelven en el orden de `ids`; los ids repetidos cuentan una vez
+    - Los ids que no están entre las activas se buscan entre las archivadas
+    - `no_encontradas` lista los ids que no existen o pertenecen a otro usuario
+    - `fields` limita los campos consultados y devueltos, como en `GET /tareas/{id}`
+    """
+    campos = crud.parse_campos(fields)
+    tareas, no_encontradas = crud.get_tareas_por_ids(
+        db, get_safe_id(current_user), crud.parse_ids(ids), campos
+    )
+    if campos:
+        tareas = [schemas.TareaParcial.desde(tarea, campos) for tarea in tareas]
+    return {"items": tareas, "no_encontradas": no_encontradas}
+
 def get_user_for_tarea(tarea_id: int):
     """Función auxiliar para obtener el usuario para una tarea específica"""
     async def get_user(
         token: str = Depends(oauth2_scheme),
-        db: Session = Depends(get_db)
+        db: Session = Depends(get_read_db)
     ) -> models.Usuario:
         return await get_current_user_for_tarea(token=token, db=db, tarea_id=tarea_id)
     return get_user
 
-@app.get("/tareas/{tarea_id}", response_model=schemas.Tarea)
-async def get_tarea(
+@app.get("/tareas/{tarea_id}", response_model=Union[schemas.Tarea, schemas.TareaParcial])
+def get_tarea(
     tarea_id: int,
     request: Request,
-    db: Session = Depends(get_db),
+    fields: Optional[str] = None,
+    db: Session = Depends(get_tareas_read_db),
     current_user: models.Usuario = Depends(get_current_active_user)
 ):
-    """Obtener una tarea por su ID"""
+    """
+    Obtener una tarea por su ID, activa o archivada.
+    
+    `fields` limita los campos consultados y devueltos (`id` se incluye siempre).
+    """
+    campos = crud.parse_campos(fields)
     # Si la tarea está en el estado de la solicitud, usarla
     if hasattr(request.state, "tarea"):
-        return request.state.tarea
+        tarea = request.state.tarea
+        return schemas.TareaParcial.desde(tarea, campos) if campos else tarea
         
     # Si no está en el estado, buscarla en la base de datos
     usuario_id = get_safe_id(current_user)
-    tarea = crud.get_tarea(db, tarea_id, usuario_id)
+    tarea = crud.get_tarea(db, tarea_id, usuario_id, campos)
     if not tarea:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Tarea no encontrada",
             headers={"Access-Control-Allow-Origin": "*", "Access-Control-Allow-Credentials": "true"}
         )
-    return tarea
+    return schemas.TareaParcial.desde(tarea, campos) if campos else tarea
 
 @app.put("/tareas/{tarea_id}", response_model=schemas.Tarea)
-async def update_tarea(
+def update_tarea(
     tarea_id: int,
     tarea_update: schemas.TareaUpdate,
-    request: Request,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_tareas_db),
     current_user: models.Usuario = Depends(get_current_active_user)
 ):
-    """Actualizar una tarea"""
-    # Si la tarea está en el estado de la solicitud, usarla
-    tarea = request.state.tarea if hasattr(request.state, "tarea") else None
-    if not tarea:
-        usuario_id = get_safe_id(current_user)
-        tarea = crud.get_tarea(db, tarea_id, usuario_id)
-        if not tarea:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Tarea no encontrada",
-                headers={"Access-Control-Allow-Origin": "*", "Access-Control-Allow-Credentials": "true"}
-            )
-            
-    # Actualizar la tarea
-    tarea_updated = crud.update_tarea(db, tarea, tarea_update)
-    return tarea_updated
+    """
+    Actualizar una tarea.
+    
+    La comprobación de propiedad y la actualización son una sola sentencia
+    UPDATE ... RETURNING. Si no afecta ninguna fila y la tarea está archivada,
+    vuelve a tareas con los cambios; si no, la respuesta es 404.
+    """
+    return crud.update_tarea(db, tarea_id, get_safe_id(current_user), tarea_update)
 
 @app.delete("/tareas/{tarea_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_tarea(
+def delete_tarea(
     tarea_id: int,
-    request: Request,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_tareas_db),
     current_user: models.Usuario = Depends(get_current_active_user)
 ):
-    """Eliminar una tarea"""
-    # Si la tarea está en el estado de la solicitud, usarla
-    tarea = request.state.tarea if hasattr(request.state, "tarea") else None
-    if not tarea:
-        usuario_id = get_safe_id(current_user)
-        tarea = crud.get_tarea(db, tarea_id, usuario_id)
-        if not tarea:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Tarea no encontrada",
-                headers={"Access-Control-Allow-Origin": "*", "Access-Control-Allow-Credentials": "true"}
-            )
-            
-    # Eliminar la tarea
-    crud.delete_tarea(db, tarea)
+    """
+    Eliminar una tarea.
+    
+    La comprobación de propiedad y el borrado son una sola sentencia DELETE;
+    si no afecta ninguna fila se elimina de las archivadas y, si tampoco
+    está allí, la respuesta es 404.
+    """
+    crud.delete_tarea(db, tarea_id, get_safe_id(current_user))
     return None
 
 @app.get(
@@ -632,6 +1165,8 @@ def health_check(db: Session = Depends(get_db)):
     - Estado del servicio
     - Versión de la API
     - Estado de la base de datos
+    - Aciertos de la caché de sentencias compiladas
+    - Recordatorios programados y enviados
     - Timestamp actual
     """
     try:
@@ -645,6 +1180,12 @@ def health_check(db: Session = Depends(get_db)):
         "status": "ok",
         "version": settings.APP_VERSION,
         "database": db_status,
+        "statement_cache": queries.estadisticas_compilacion.resumen(),
+        "reminders": {
+            "enabled": programador_recordatorios.activo,
+            "scheduled": programador_recordatorios.pendientes,
+            "fired": programador_recordatorios.disparados_total,
+        },
         "timestamp": datetime.now(timezone.utc).isoformat()
     }
 
@@ -1,5 +1,5 @@
 # app/models.py
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Text
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Text, Index, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
@@ -19,6 +19,17 @@ class Usuario(Base):
     tareas = relationship("Tarea", back_populates="usuario", cascade="all, delete-orphan")
     refresh_tokens = relationship("RefreshToken", back_populates="usuario", cascade="all, delete-orphan")
 
+    # Unicidad sin distinguir mayúsculas: el registro comprueba email y username
+    # con una sola consulta que resuelven estos índices
+    __table_args__ = (
+        Index("ix_usuarios_email_lower", func.lower(email), unique=True),
+        Index("ix_usuarios_username_lower", func.lower(username), unique=True),
+    )
+
+    # Las columnas generadas por el servidor se leen con RETURNING en el mismo
+    # INSERT/UPDATE, sin un SELECT posterior
+    __mapper_args__ = {"eager_defaults": True}
+
 class RefreshToken(Base):
     __tablename__ = "refresh_tokens"
 
@@ -32,6 +43,8 @@ class RefreshToken(Base):
     usuario_id = Column(Integer, ForeignKey("usuarios.id", ondelete="CASCADE"), nullable=False)
     usuario = relationship("Usuario", back_populates="refresh_tokens")
 
+    __mapper_args__ = {"eager_defaults": True}
+
 class Tarea(Base):
     __tablename__ = "tareas"
 
@@ -47,3 +60,170 @@ class Tarea(Base):
     # Relación con usuario
     usuario_id = Column(Integer, ForeignKey("usuarios.id", ondelete="CASCADE"), nullable=False)
     usuario = relationship("Usuario", back_populates="tareas")
+
+    # Índices compuestos que siguen la forma de las consultas de listado: siempre
+    # se filtra por usuario_id, opcionalmente por completado/prioridad, y se
+    # ordena por una columna permitida con id como desempate
+    __table_args__ = (
+        Index("ix_tareas_usuario_created", "usuario_id", "created_at", "id"),
+        Index("ix_tareas_usuario_completado", "usuario_id", "completado", "created_at", "id"),
+        Index("ix_tareas_usuario_estado", "usuario_id", "completado", "prioridad", "created_at", "id"),
+        Index("ix_tareas_usuario_prioridad", "usuario_id", "prioridad", "id"),
+        Index("ix_tareas_usuario_titulo", "usuario_id", "titulo", "id"),
+        # Tareas próximas a vencer y vencidas: rango sobre la fecha de un usuario
+        Index("ix_tareas_usuario_vencimiento", "usuario_id", "fecha_vencimiento", "id"),
+        # Vencimientos pendientes de todos los usuarios, para cargar la ventana
+        # del programador de recordatorios (app/recordatorios.py)
+        Index(
+            "ix_tareas_vencimiento_pendientes", "fecha_vencimiento",
+            sqlite_where=text("completado = 0"),
+            postgresql_where=text("completado = false")
+        ),
+        # AUTOINCREMENT impide que SQLite reutilice el id de una tarea
+        # eliminada o archivada en tareas_archivo
+        {"sqlite_autoincrement": True},
+    )
+    __mapper_args__ = {"eager_defaults": True}
+
+class TareaArchivada(Base):
+    """
+    Tareas completadas antiguas que el archivado (app/archivo.py) saca de tareas.
+    
+    Conservan su id y sus columnas. No tienen índice de búsqueda ni prefijos y
+    no cuentan en tareas_stats; el listado las incluye solo con
+    incluir_archivadas, de modo que la tabla tareas y sus índices se mantienen
+    pequeños aunque la cuenta acumule años de tareas.
+    """
+    __tablename__ = "tareas_archivo"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    titulo = Column(String(100), nullable=False)
+    descripcion = Column(Text, nullable=True)
+    completado = Column(Boolean, default=True, nullable=False)
+    prioridad = Column(Integer, default=1, nullable=False)
+    fecha_vencimiento = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+    updated_at = Column(DateTime(timezone=True), nullable=True)
+    usuario_id = Column(Integer, ForeignKey("usuarios.id", ondelete="CASCADE"), nullable=False)
+    archivada_en = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        Index("ix_tareas_archivo_usuario_created", "usuario_id", "created_at", "id"),
+    )
+
+class TareaCambio(Base):
+    """
+    Último cambio de cada tarea, para la sincronización incremental
+    (GET /tareas/changes).
+
+    Los triggers de app/ddl.py reemplazan la fila de la tarea en cada alta,
+    cambio o baja, con un seq nuevo y creciente; una baja deja una lápida
+    (eliminada = true), pero archivar o restaurar una tarea no. La tabla tiene una fila por tarea viva o eliminada
+    recientemente, y las lápidas antiguas se compactan periódicamente.
+    """
+    __tablename__ = "tareas_cambios"
+
+    seq = Column(Integer, primary_key=True)
+    usuario_id = Column(Integer, nullable=False)
+    tarea_id = Column(Integer, nullable=False, unique=True)
+    eliminada = Column(Boolean, default=False, nullable=False)
+    cambiado_en = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    # AUTOINCREMENT impide que SQLite reutilice el seq de una fila compactada
+    __table_args__ = (
+        Index("ix_tareas_cambios_usuario_seq", "usuario_id", "seq"),
+        {"sqlite_autoincrement": True},
+    )
+
+class TareaCambiosHorizonte(Base):
+    """
+    Mayor seq de las lápidas compactadas de cada usuario. Un cursor anterior
+    puede haber perdido bajas y obliga al cliente a sincronizar desde cero.
+    """
+    __tablename__ = "tareas_cambios_horizonte"
+
+    usuario_id = Column(Integer, primary_key=True)
+    seq = Column(Integer, nullable=False)
+
+class TareaStats(Base):
+    """
+    Contadores de tareas por usuario.
+    
+    Los mantienen los triggers definidos en app/ddl.py en la misma transacción
+    que cada alta, cambio o baja de tareas; no se escriben desde la aplicación.
+    """
+    __tablename__ = "tareas_stats"
+
+    usuario_id = Column(Integer, ForeignKey("usuarios.id", ondelete="CASCADE"), primary_key=True)
+    total = Column(Integer, default=0, server_default="0", nullable=False)
+    completadas = Column(Integer, default=0, server_default="0", nullable=False)
+    prioridad_1 = Column(Integer, default=0, server_default="0", nullable=False)
+    prioridad_2 = Column(Integer, default=0, server_default="0", nullable=False)
+    prioridad_3 = Column(Integer, default=0, server_default="0", nullable=False)
+
+class TareaPrefijo(Base):
+    """
+    Índice de prefijos de los títulos para el autocompletado.
+    
+    Cada palabra del título aporta los prefijos del texto que empieza en ella
+    (normalizados en minúsculas y sin acentos). La aplicación inserta las filas
+    al crear o renombrar una tarea; los triggers de app/ddl.py las eliminan con
+    la tarea y copian los cambios de prioridad.
+    """
+    __tablename__ = "tarea_prefijos"
+
+    usuario_id = Column(Integer, primary_key=True)
+    prefijo = Column(String(50), primary_key=True)
+    tarea_id = Column(Integer, primary_key=True)
+    prioridad = Column(Integer, nullable=False)
+
+    # Las sugerencias de un prefijo se leen en orden de prioridad y recencia
+    # (id descendente) directamente del índice
+    __table_args__ = (
+        Index("ix_tarea_prefijos_ranking", "usuario_id", "prefijo", "prioridad", "tarea_id"),
+        Index("ix_tarea_prefijos_tarea", "tarea_id"),
+    )
+
+class UsuarioShard(Base):
+    """
+    Shard que guarda las tareas de cada usuario (ver app/shards.py).
+    
+    Vive en la base de datos directorio. La fila se crea la primera vez que se
+    enruta al usuario y solo la cambia el comando de rebalanceo al mover sus
+    tareas, de modo que añadir shards al anillo no reubica a usuarios existentes.
+    """
+    __tablename__ = "usuario_shards"
+
+    usuario_id = Column(Integer, ForeignKey("usuarios.id", ondelete="CASCADE"), primary_key=True)
+    shard = Column(String(50), nullable=False)
+    asignado_en = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+class UsuarioMovimiento(Base):
+    """
+    Usuarios cuyas tareas se están moviendo de shard (ver shards.mover_usuarios).
+    
+    Mientras el usuario tiene fila aquí sus tareas se pueden leer pero no
+    escribir, de modo que ningún cambio se pierde durante la copia. La fila se
+    borra al asignar el usuario a su destino.
+    """
+    __tablename__ = "usuario_movimientos"
+
+    usuario_id = Column(Integer, ForeignKey("usuarios.id", ondelete="CASCADE"), primary_key=True)
+    destino = Column(String(50), nullable=False)
+    iniciado_en = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+class SecuenciaIds(Base):
+    """
+    Próximo id libre de una tabla repartida entre shards.
+    
+    Cada proceso reserva bloques de ids en la base de datos directorio para que
+    los ids de tareas sean únicos en todos los shards y una tarea conserve su
+    id al moverse de shard.
+    """
+    __tablename__ = "secuencias_ids"
+
+    nombre = Column(String(50), primary_key=True)
+    siguiente = Column(Integer, nullable=False)
+
+# Triggers y funciones que acompañan a las tablas
+from app import ddl  # noqa: E402,F401
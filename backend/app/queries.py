@@ -0,0 +1,372 @@
+# app/queries.py
+"""
+Sentencias prearmadas para las consultas más frecuentes.
+
+Cada sentencia se construye una sola vez con parámetros enlazados (bindparam)
+y se reutiliza en todas las ejecuciones. SQLAlchemy no vuelve a armar la
+consulta ni a calcular su clave de caché, y la forma compilada sale de la caché
+de compilación del engine. El listado de tareas cambia según los filtros y el
+ordenamiento: se arma una sentencia por cada combinación ("forma"), que se
+guarda en una caché LRU.
+"""
+import threading
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from sqlalchemy import (
+    DateTime, String, bindparam, delete, desc, event, func, insert, literal_column, or_, select, table,
+    tuple_, type_coerce, union_all, update
+)
+from sqlalchemy.engine import Engine
+from sqlalchemy.engine.default import CACHE_HIT, CACHE_MISS
+from sqlalchemy.orm import aliased, load_only
+from sqlalchemy.sql import Delete, Select, Subquery, Update
+from sqlalchemy.sql.elements import BindParameter
+from sqlalchemy.sql.visitors import replacement_traverse
+from app import models
+
+# Consultas por clave
+USUARIO_POR_ID = select(models.Usuario).where(models.Usuario.id == bindparam("usuario_id"))
+USUARIO_POR_EMAIL = select(models.Usuario).where(models.Usuario.email == bindparam("email"))
+REFRESH_TOKEN_POR_VALOR = select(models.RefreshToken).where(
+    models.RefreshToken.token == bindparam("token")
+)
+REFRESH_TOKEN_VIGENTE = REFRESH_TOKEN_POR_VALOR.where(
+    models.RefreshToken.is_revoked == False,  # noqa: E712
+    models.RefreshToken.expires_at > bindparam("ahora")
+)
+# Email o username ya registrados, sin distinguir mayúsculas; cada fila indica
+# cuál de los dos coincide
+_EMAIL_REGISTRADO = func.lower(models.Usuario.email) == func.lower(bindparam("email"))
+_USERNAME_REGISTRADO = func.lower(models.Usuario.username) == func.lower(bindparam("username"))
+USUARIO_EXISTENTE = select(
+    _EMAIL_REGISTRADO.label("email"),
+    _USERNAME_REGISTRADO.label("username")
+).where(or_(_EMAIL_REGISTRADO, _USERNAME_REGISTRADO)).limit(2)
+# Tareas pendientes que vencen en [desde, hasta), en orden de vencimiento:
+# un recorrido por rango de ix_tareas_usuario_vencimiento
+TAREAS_PROXIMAS = select(models.Tarea).where(
+    models.Tarea.usuario_id == bindparam("usuario_id"),
+    models.Tarea.fecha_vencimiento >= bindparam("desde"),
+    models.Tarea.fecha_vencimiento < bindparam("hasta"),
+    models.Tarea.completado == False  # noqa: E712
+).order_by(models.Tarea.fecha_vencimiento, models.Tarea.id).limit(bindparam("limite"))
+STATS_DE_USUARIO = select(models.TareaStats).where(
+    models.TareaStats.usuario_id == bindparam("usuario_id")
+)
+
+# Sincronización incremental: cambios de un usuario posteriores a un seq, con
+# el estado actual de la tarea (None si ya no existe)
+CAMBIOS_DESDE = select(
+    models.TareaCambio.seq,
+    models.TareaCambio.tarea_id,
+    models.TareaCambio.eliminada,
+    models.Tarea,
+    models.TareaArchivada
+).outerjoin(
+    models.Tarea, models.Tarea.id == models.TareaCambio.tarea_id
+).outerjoin(
+    models.TareaArchivada, models.TareaArchivada.id == models.TareaCambio.tarea_id
+).where(
+    models.TareaCambio.usuario_id == bindparam("usuario_id"),
+    models.TareaCambio.seq > bindparam("desde")
+).order_by(models.TareaCambio.seq).limit(bindparam("limite"))
+HORIZONTE_DE_USUARIO = select(models.TareaCambiosHorizonte.seq).where(
+    models.TareaCambiosHorizonte.usuario_id == bindparam("usuario_id")
+)
+
+# Columnas por las que se puede ordenar el listado. Cada una tiene un índice
+# compuesto (usuario_id, columna, ...) que evita ordenar todas las tareas del usuario
+ORDENAR_POR_PERMITIDOS = {
+    "created_at": models.Tarea.created_at,
+    "prioridad": models.Tarea.prioridad,
+    "titulo": models.Tarea.titulo,
+}
+
+# Tareas activas y archivadas como una sola entidad Tarea (incluir_archivadas)
+_TAREAS_Y_ARCHIVO = union_all(
+    select(*models.Tarea.__table__.columns),
+    select(*(
+        models.TareaArchivada.__table__.c[columna.name]
+        for columna in models.Tarea.__table__.columns
+    ))
+).subquery("tareas_todas")
+TAREAS_CON_ARCHIVO = aliased(models.Tarea, _TAREAS_Y_ARCHIVO)
+
+# Motores con índice de texto completo (ver app/ddl.py)
+DIALECTOS_BUSQUEDA_TEXTO = ("sqlite", "postgresql")
+
+def _cargar_campos(campos: Tuple[str, ...], entidad=models.Tarea):
+    """Opción de consulta que limita las columnas cargadas a los campos pedidos"""
+    return load_only(*(getattr(entidad, campo) for campo in campos))
+
+@lru_cache(maxsize=256)
+def tarea_de_usuario(campos: Optional[Tuple[str, ...]] = None, archivadas: bool = False) -> Select:
+    """
+    Tarea por (id, usuario_id), opcionalmente solo con algunos campos. Con
+    `archivadas` se busca en tareas_archivo.
+    """
+    entidad = models.TareaArchivada if archivadas else models.Tarea
+    stmt = select(entidad).where(
+        entidad.id == bindparam("tarea_id"),
+        entidad.usuario_id == bindparam("usuario_id")
+    )
+    if campos:
+        stmt = stmt.options(_cargar_campos(campos, entidad))
+    return stmt
+
+@lru_cache(maxsize=256)
+def tareas_de_usuario_por_ids(campos: Optional[Tuple[str, ...]] = None, archivadas: bool = False) -> Select:
+    """
+    Tareas del usuario con id en la lista `ids`. El parámetro se expande al
+    ejecutar, así que la sentencia es la misma para cualquier número de ids.
+    Con `archivadas` se busca en tareas_archivo.
+    """
+    entidad = models.TareaArchivada if archivadas else models.Tarea
+    stmt = select(entidad).where(
+        entidad.id.in_(bindparam("ids", expanding=True)),
+        entidad.usuario_id == bindparam("usuario_id")
+    )
+    if campos:
+        stmt = stmt.options(_cargar_campos(campos, entidad))
+    return stmt
+
+# Vuelta de una tarea archivada a tareas, con su mismo id
+RESTAURAR_ARCHIVADA = insert(models.Tarea.__table__).from_select(
+    [columna.name for columna in models.Tarea.__table__.columns],
+    select(*(
+        models.TareaArchivada.__table__.c[columna.name]
+        for columna in models.Tarea.__table__.columns
+    )).where(
+        models.TareaArchivada.id == bindparam("tarea_id"),
+        models.TareaArchivada.usuario_id == bindparam("usuario_id")
+    )
+)
+BORRAR_ARCHIVADA = delete(models.TareaArchivada.__table__).where(
+    models.TareaArchivada.id == bindparam("tarea_id"),
+    models.TareaArchivada.usuario_id == bindparam("usuario_id")
+)
+
+def sort_key(order_column):
+    """
+    Expresión usada para ordenar y comparar en la paginación por cursor.
+
+    Las fechas se comparan con el valor tal como está almacenado: en SQLite
+    created_at se guarda como texto y volver a formatear el datetime podría
+    no coincidir exactamente con el valor de la fila.
+    """
+    if isinstance(order_column.type, DateTime):
+        return type_coerce(order_column, String)
+    return order_column
+
+def valor_busqueda(dialecto: str, usuario_id: int, palabras: List[str]) -> str:
+    """
+    Texto de la consulta de búsqueda para el parámetro "busqueda".
+
+    Todas las palabras deben aparecer en el título o la descripción y la
+    última puede estar incompleta. En SQLite la consulta también se acota a
+    las tareas del usuario, que la tabla FTS5 indexa en la columna usuario_id.
+    """
+    if dialecto == "sqlite":
+        terminos = " AND ".join(f'"{p}"' for p in palabras) + "*"
+        return f'usuario_id : "{usuario_id}" AND {{titulo descripcion}} : ({terminos})'
+    return " & ".join(f"{p}:*" for p in palabras)
+
+def _subconsulta_busqueda(dialecto: str) -> Subquery:
+    """Subconsulta (tarea_id, relevancia) sobre el índice de texto completo"""
+    if dialecto == "sqlite":
+        return select(
+            literal_column("tareas_fts.rowid").label("tarea_id"),
+            # bm25 es menor cuanto más relevante; el título pesa más que la descripción
+            literal_column("-bm25(tareas_fts, 10.0, 1.0, 0.0)").label("relevancia")
+        ).select_from(table("tareas_fts")).where(
+            literal_column("tareas_fts").op("MATCH")(bindparam("busqueda"))
+        ).subquery("busqueda")
+    vector = literal_column("tareas.busqueda")
+    consulta = func.to_tsquery("spanish", bindparam("busqueda"))
+    return select(
+        models.Tarea.id.label("tarea_id"),
+        func.ts_rank(vector, consulta).label("relevancia")
+    ).where(
+        models.Tarea.usuario_id == bindparam("usuario_id"),
+        vector.op("@@")(consulta)
+    ).subquery("busqueda")
+
+class FormaListado(NamedTuple):
+    """Combinación de opciones que determina la sentencia del listado de tareas"""
+    dialecto: str
+    busqueda: Optional[str] = None  # "texto", "subcadena" o None
+    completado: bool = False
+    prioridad: bool = False
+    ordenar_por: str = "created_at"
+    orden: str = "desc"
+    cursor: bool = False
+    offset: bool = False
+    total: bool = False
+    campos: Optional[Tuple[str, ...]] = None
+    archivadas: bool = False
+    vencidas: bool = False
+
+def _entidad(forma: FormaListado):
+    """Tarea, o la unión de tareas y tareas_archivo si la forma incluye archivadas"""
+    return TAREAS_CON_ARCHIVO if forma.archivadas else models.Tarea
+
+def _filtros(forma: FormaListado) -> list:
+    """Condiciones de filtrado compartidas por el listado y el conteo"""
+    tarea = _entidad(forma)
+    filtros = [tarea.usuario_id == bindparam("usuario_id")]
+    if forma.completado:
+        filtros.append(tarea.completado == bindparam("completado"))
+    if forma.prioridad:
+        filtros.append(tarea.prioridad == bindparam("prioridad"))
+    if forma.vencidas:
+        filtros.append(tarea.fecha_vencimiento < bindparam("ahora"))
+        filtros.append(tarea.completado == False)  # noqa: E712
+    if forma.busqueda == "subcadena":
+        filtros.append(
+            or_(
+                tarea.titulo.ilike(bindparam("patron")),
+                tarea.descripcion.ilike(bindparam("patron"))
+            )
+        )
+    return filtros
+
+@lru_cache(maxsize=1024)
+def listado_tareas(forma: FormaListado) -> Select:
+    """
+    Sentencia del listado de tareas para una forma dada.
+
+    Columnas: la tarea, el valor de orden de la fila (para el cursor) y, si
+    forma.total, el total de filas que cumplen los filtros.
+    """
+    tarea = _entidad(forma)
+    stmt = select(tarea)
+    order_column = ORDENAR_POR_PERMITIDOS.get(forma.ordenar_por)
+    if forma.archivadas:
+        # Ordenar por la columna de la unión (sin índice: se ordena en memoria)
+        order_column = getattr(tarea, forma.ordenar_por)
+    if forma.busqueda == "texto":
+        # La búsqueda se resuelve con la unión a la subconsulta del índice
+        busqueda = _subconsulta_busqueda(forma.dialecto)
+        stmt = stmt.join(busqueda, busqueda.c.tarea_id == models.Tarea.id)
+        if forma.ordenar_por == "relevancia":
+            order_column = busqueda.c.relevancia
+    stmt = stmt.where(*_filtros(forma))
+    if forma.campos:
+        stmt = stmt.options(_cargar_campos(forma.campos, tarea))
+
+    clave = sort_key(order_column)
+    stmt = stmt.add_columns(clave.label("cursor_valor"))
+
+    # El id desempata para que el orden sea estable entre páginas
+    if forma.orden == "desc":
+        order_by = [desc(order_column), desc(tarea.id)]
+    else:
+        order_by = [order_column, tarea.id]
+    stmt = stmt.order_by(*order_by)
+
+    # La ventana se evalúa antes del cursor y del LIMIT, así que cuenta todas
+    # las filas que cumplen los filtros. Repite el orden del listado para que
+    # SQLite recorra el índice una sola vez en lugar de ordenar en memoria.
+    if forma.total:
+        stmt = stmt.add_columns(
+            func.count().over(order_by=order_by, rows=(None, None)).label("total")
+        )
+
+    if forma.cursor:
+        posicion = tuple_(clave, tarea.id)
+        limite = tuple_(bindparam("cursor_clave", type_=clave.type), bindparam("cursor_id"))
+        stmt = stmt.where(posicion < limite if forma.orden == "desc" else posicion > limite)
+    if forma.offset:
+        stmt = stmt.offset(bindparam("offset"))
+    return stmt.limit(bindparam("limite"))
+
+@lru_cache(maxsize=256)
+def conteo_tareas(forma: FormaListado) -> Select:
+    """Sentencia del total de tareas que cumplen los filtros de la forma"""
+    stmt = select(func.count(_entidad(forma).id)).where(*_filtros(forma))
+    if forma.busqueda == "texto":
+        busqueda = _subconsulta_busqueda(forma.dialecto)
+        stmt = stmt.where(models.Tarea.id.in_(select(busqueda.c.tarea_id)))
+    return stmt
+
+# Columnas que necesita el programador de recordatorios de cada tarea afectada
+_COLUMNAS_RECORDATORIO = (
+    models.Tarea.id, models.Tarea.usuario_id, models.Tarea.titulo,
+    models.Tarea.completado, models.Tarea.fecha_vencimiento
+)
+
+def _renombrar_parametro(elemento):
+    if isinstance(elemento, BindParameter):
+        return bindparam(f"filtro_{elemento.key}", type_=elemento.type)
+    return None
+
+def _filtros_masivos(forma: FormaListado) -> list:
+    """
+    Filtros del listado sobre tareas, para sentencias UPDATE y DELETE.
+
+    Un UPDATE reserva los nombres de columna para los valores de SET, así que
+    los parámetros de los filtros pasan a llamarse filtro_<nombre>.
+    """
+    filtros = _filtros(forma)
+    if forma.busqueda == "texto":
+        busqueda = _subconsulta_busqueda(forma.dialecto)
+        filtros.append(models.Tarea.id.in_(select(busqueda.c.tarea_id)))
+    return [replacement_traverse(filtro, {}, _renombrar_parametro) for filtro in filtros]
+
+@lru_cache(maxsize=256)
+def actualizacion_masiva(forma: FormaListado, campos: Tuple[str, ...], devolver: bool) -> Update:
+    """
+    UPDATE de las tareas que cumplen los filtros de la forma.
+
+    Los filtros van en los parámetros filtro_<nombre> y el nuevo valor de cada campo va en el parámetro nuevo_<campo>. Con
+    `devolver` retorna las columnas de cada tarea afectada para los
+    recordatorios; sin él basta con rowcount.
+    """
+    stmt = update(models.Tarea).where(*_filtros_masivos(forma)).values(
+        {campo: bindparam(f"nuevo_{campo}") for campo in campos}
+    )
+    return stmt.returning(*_COLUMNAS_RECORDATORIO) if devolver else stmt
+
+@lru_cache(maxsize=256)
+def borrado_masivo(forma: FormaListado, devolver: bool) -> Delete:
+    """DELETE de las tareas que cumplen los filtros de la forma"""
+    stmt = delete(models.Tarea).where(*_filtros_masivos(forma))
+    return stmt.returning(models.Tarea.id) if devolver else stmt
+
+class EstadisticasCompilacion:
+    """Aciertos y fallos de la caché de sentencias compiladas de los engines"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.aciertos = 0
+            self.fallos = 0
+
+    def registrar(self, cache_hit) -> None:
+        if cache_hit is CACHE_HIT:
+            with self._lock:
+                self.aciertos += 1
+        elif cache_hit is CACHE_MISS:
+            with self._lock:
+                self.fallos += 1
+
+    def resumen(self) -> Dict[str, float]:
+        with self._lock:
+            total = self.aciertos + self.fallos
+            return {
+                "hits": self.aciertos,
+                "misses": self.fallos,
+                "hit_rate": round(self.aciertos / total, 4) if total else 0.0,
+                "list_shapes": listado_tareas.cache_info().currsize,
+            }
+
+estadisticas_compilacion = EstadisticasCompilacion()
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _registrar_compilacion(conn, cursor, statement, parameters, context, executemany):
+    # Las sentencias de texto y DDL no pasan por la caché de compilación
+    if context is not None and context.compiled is not None:
+        estadisticas_compilacion.registrar(context.cache_hit)
@@ -0,0 +1,233 @@
+# app/recordatorios.py
+"""
+Recordatorios de tareas próximas a vencer.
+
+El programador guarda en un montículo (heap) las tareas pendientes que vencen
+dentro de la ventana cargada (RECORDATORIOS_VENTANA_SECONDS). Cada tick saca
+del montículo solo los recordatorios que ya tocan, así que su coste depende de
+los recordatorios que se disparan y no del tamaño de la tabla. Cuando el tiempo
+se acerca al final de la ventana se carga la siguiente con una consulta por
+rango sobre el índice parcial de vencimientos pendientes.
+
+Las altas, cambios y bajas hechas con crud se anotan en la sesión y se aplican
+al programador después del commit, de modo que una transacción que se
+deshace no programa nada. Los cambios hechos fuera de crud se ven en la
+siguiente carga de ventana.
+"""
+import heapq
+import json
+import logging
+import threading
+import urllib.request
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from app import models, schemas
+from app.config import settings
+from app.shards import shard_router
+
+logger = logging.getLogger(__name__)
+
+class Recordatorio(NamedTuple):
+    tarea_id: int
+    usuario_id: int
+    titulo: str
+    fecha_vencimiento: datetime  # UTC sin zona horaria, como en la base de datos
+
+    def como_dict(self) -> dict:
+        return {
+            "tarea_id": self.tarea_id,
+            "usuario_id": self.usuario_id,
+            "titulo": self.titulo,
+            "fecha_vencimiento": schemas.en_utc(self.fecha_vencimiento).isoformat(),
+        }
+
+Sink = Callable[[Recordatorio], None]
+
+def sink_log(recordatorio: Recordatorio) -> None:
+    """Escribe el recordatorio en el log de la aplicación"""
+    logger.info("Recordatorio: %s", json.dumps(recordatorio.como_dict(), ensure_ascii=False))
+
+class SinkWebhook:
+    """Envía cada recordatorio como JSON en un POST a una URL"""
+
+    def __init__(self, url: str, timeout: float = 5.0):
+        self.url = url
+        self.timeout = timeout
+
+    def __call__(self, recordatorio: Recordatorio) -> None:
+        solicitud = urllib.request.Request(
+            self.url,
+            data=json.dumps(recordatorio.como_dict()).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST"
+        )
+        with urllib.request.urlopen(solicitud, timeout=self.timeout):
+            pass
+
+def _utc(fecha: datetime) -> datetime:
+    """Fecha en UTC sin zona horaria, para compararla con las de la base de datos"""
+    return schemas.en_utc(fecha).replace(tzinfo=None)
+
+def _ahora() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+class ProgramadorRecordatorios:
+    """Montículo de recordatorios de la ventana de vencimientos cargada"""
+
+    def __init__(
+        self,
+        sink: Sink,
+        ventana: timedelta = timedelta(hours=1),
+        antelacion: timedelta = timedelta(0),
+        cargar: Optional[Callable[[Callable[[Session], int]], int]] = None
+    ):
+        self.sink = sink
+        self.ventana = ventana
+        self.antelacion = antelacion
+        # Ejecuta la carga de ventana en cada base de datos con tareas
+        self._cargar_en_bases = cargar or shard_router.en_cada_base
+        self._lock = threading.Lock()
+        self._monticulo: List[Tuple[datetime, int]] = []
+        # Recordatorio vigente de cada tarea; las entradas del montículo que no
+        # coinciden con él están obsoletas y se descartan al salir
+        self._programados: Dict[int, Recordatorio] = {}
+        # Vencimiento ya avisado de cada tarea, para no repetir el aviso
+        self._disparados: Dict[int, datetime] = {}
+        self.horizonte: Optional[datetime] = None
+        self.disparados_total = 0
+
+    @property
+    def activo(self) -> bool:
+        return self.horizonte is not None
+
+    @property
+    def pendientes(self) -> int:
+        return len(self._programados)
+
+    def _programar(self, recordatorio: Recordatorio, ahora: datetime) -> None:
+        """Programa o reprograma una tarea; debe llamarse con el lock tomado"""
+        self._programados.pop(recordatorio.tarea_id, None)
+        vence = recordatorio.fecha_vencimiento
+        if vence <= ahora or vence >= self.horizonte:
+            return
+        if self._disparados.get(recordatorio.tarea_id) == vence:
+            return
+        self._programados[recordatorio.tarea_id] = recordatorio
+        heapq.heappush(self._monticulo, (vence - self.antelacion, recordatorio.tarea_id))
+
+    def _cargar(self, db: Session, desde: datetime, hasta: datetime, ahora: datetime) -> int:
+        tarea = models.Tarea
+        filas = db.execute(
+            select(tarea.id, tarea.usuario_id, tarea.titulo, tarea.fecha_vencimiento).where(
+                tarea.completado == False,  # noqa: E712
+                tarea.fecha_vencimiento >= desde,
+                tarea.fecha_vencimiento < hasta
+            )
+        ).all()
+        with self._lock:
+            for fila in filas:
+                self._programar(Recordatorio(*fila), ahora)
+        return len(filas)
+
+    def cargar_ventana(self, ahora: Optional[datetime] = None) -> int:
+        """Carga los vencimientos entre el horizonte actual y ahora + ventana"""
+        ahora = ahora or _ahora()
+        desde = self.horizonte or ahora
+        hasta = ahora + self.antelacion + self.ventana
+        with self._lock:
+            self.horizonte = hasta
+            self._disparados = {
+                tarea_id: vence for tarea_id, vence in self._disparados.items() if vence > ahora
+            }
+        return self._cargar_en_bases(lambda db: self._cargar(db, desde, hasta, ahora))
+
+    def iniciar(self, ahora: Optional[datetime] = None) -> None:
+        self.detener()
+        cargados = self.cargar_ventana(ahora)
+        logger.info("Programador de recordatorios iniciado con %d tareas", cargados)
+
+    def detener(self) -> None:
+        with self._lock:
+            self._monticulo.clear()
+            self._programados.clear()
+            self._disparados.clear()
+            self.horizonte = None
+
+    def tick(self, ahora: Optional[datetime] = None) -> int:
+        """Dispara los recordatorios que ya tocan y retorna cuántos disparó"""
+        if not self.activo:
+            return 0
+        ahora = ahora or _ahora()
+        listos = []
+        with self._lock:
+            while self._monticulo and self._monticulo[0][0] <= ahora:
+                momento, tarea_id = heapq.heappop(self._monticulo)
+                recordatorio = self._programados.get(tarea_id)
+                if recordatorio is None or recordatorio.fecha_vencimiento - self.antelacion != momento:
+                    continue
+                del self._programados[tarea_id]
+                self._disparados[tarea_id] = recordatorio.fecha_vencimiento
+                listos.append(recordatorio)
+            recargar = ahora + self.antelacion >= self.horizonte - self.ventana / 2
+        for recordatorio in listos:
+            try:
+                self.sink(recordatorio)
+            except Exception:
+                logger.exception("No se pudo enviar el recordatorio de la tarea %s", recordatorio.tarea_id)
+        self.disparados_total += len(listos)
+        if recargar:
+            self.cargar_ventana(ahora)
+        return len(listos)
+
+    def aplicar(self, cambios: Dict[int, Optional[Recordatorio]], ahora: Optional[datetime] = None) -> None:
+        """Aplica cambios confirmados: un recordatorio nuevo o None si la tarea ya no avisa"""
+        if not self.activo:
+            return
+        ahora = ahora or _ahora()
+        with self._lock:
+            for tarea_id, recordatorio in cambios.items():
+                if recordatorio is None:
+                    self._programados.pop(tarea_id, None)
+                    self._disparados.pop(tarea_id, None)
+                else:
+                    self._programar(recordatorio, ahora)
+
+def crear_sink() -> Sink:
+    """Webhook si RECORDATORIOS_WEBHOOK_URL está configurada; si no, el log"""
+    if settings.RECORDATORIOS_WEBHOOK_URL:
+        return SinkWebhook(settings.RECORDATORIOS_WEBHOOK_URL)
+    return sink_log
+
+programador = ProgramadorRecordatorios(
+    crear_sink(),
+    ventana=timedelta(seconds=settings.RECORDATORIOS_VENTANA_SECONDS),
+    antelacion=timedelta(seconds=settings.RECORDATORIOS_ANTELACION_SECONDS)
+)
+
+# Cambios de la transacción en curso, por sesión
+
+def anotar(db: Session, tarea: models.Tarea) -> None:
+    """Anota el estado de una tarea escrita con crud para aplicarlo tras el commit"""
+    if not programador.activo:
+        return
+    recordatorio = None
+    if not tarea.completado and tarea.fecha_vencimiento is not None:
+        recordatorio = Recordatorio(tarea.id, tarea.usuario_id, tarea.titulo, _utc(tarea.fecha_vencimiento))
+    db.info.setdefault("recordatorios", {})[tarea.id] = recordatorio
+
+def anotar_eliminada(db: Session, tarea_id: int) -> None:
+    """Anota que una tarea ya no debe avisar"""
+    if programador.activo:
+        db.info.setdefault("recordatorios", {})[tarea_id] = None
+
+@event.listens_for(Session, "after_commit")
+def _aplicar_tras_commit(session: Session) -> None:
+    cambios = session.info.pop("recordatorios", None)
+    if cambios:
+        programador.aplicar(cambios)
+
+@event.listens_for(Session, "after_rollback")
+def _descartar_tras_rollback(session: Session) -> None:
+    session.info.pop("recordatorios", None)
@@ -0,0 +1,94 @@
+# app/replicas.py
+"""
+Enrutamiento de lecturas hacia réplicas con protección read-your-writes.
+
+Las rutas y dependencias de solo lectura obtienen su sesión de una réplica
+(en rotación) y las escrituras siguen usando la base de datos principal. Tras
+una escritura, las solicitudes del mismo usuario se leen de la principal
+durante READ_YOUR_WRITES_SECONDS para no ver datos anteriores a su propio
+cambio mientras la réplica se pone al día.
+"""
+import itertools
+import threading
+import time
+from typing import Dict, List, Optional
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+from app.config import settings
+from app.database import SessionLocal, ReadSessionLocal, is_sqlite, apply_sqlite_pragmas
+
+def create_replica_engine(url: str) -> Engine:
+    """Crea el engine de una réplica de solo lectura"""
+    if not is_sqlite(url):
+        return create_engine(url)
+    replica = create_engine(url, connect_args={"check_same_thread": False})
+    if settings.SQLITE_PRODUCTION_MODE:
+        apply_sqlite_pragmas(replica, read_only=True)
+    return replica
+
+class ReplicaRouter:
+    """Elige la base de datos de lectura de cada solicitud"""
+
+    def __init__(
+        self,
+        primary_read_factory: sessionmaker,
+        replica_engines: List[Engine],
+        sticky_seconds: float
+    ):
+        self.primary_read_factory = primary_read_factory
+        self.replica_engines = replica_engines
+        self.sticky_seconds = sticky_seconds
+        self.replica_factory = sessionmaker(autocommit=False, autoflush=False)
+        self._cycle = itertools.cycle(replica_engines) if replica_engines else None
+        self._last_writes: Dict[int, float] = {}
+        self._lock = threading.Lock()
+
+    def mark_write(self, usuario_id: Optional[int]) -> None:
+        """Registra que el usuario acaba de escribir en la base de datos principal"""
+        if usuario_id is None or not self.replica_engines:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._last_writes[usuario_id] = now
+            # Purgar entradas vencidas para que el registro no crezca sin límite
+            if len(self._last_writes) > 10000:
+                cutoff = now - self.sticky_seconds
+                self._last_writes = {
+                    uid: ts for uid, ts in self._last_writes.items() if ts > cutoff
+                }
+
+    def is_sticky(self, usuario_id: Optional[int]) -> bool:
+        """Indica si las lecturas del usuario deben ir a la base de datos principal"""
+        if usuario_id is None:
+            return False
+        with self._lock:
+            last_write = self._last_writes.get(usuario_id)
+        return last_write is not None and time.monotonic() - last_write < self.sticky_seconds
+
+    def next_replica(self) -> Engine:
+        """Devuelve la siguiente réplica en rotación"""
+        with self._lock:
+            return next(self._cycle)
+
+    def read_session(self, usuario_id: Optional[int] = None) -> Session:
+        """Abre una sesión de lectura para el usuario indicado"""
+        if not self.replica_engines or self.is_sticky(usuario_id):
+            return self.primary_read_factory()
+        return self.replica_factory(bind=self.next_replica())
+
+    def dispose(self) -> None:
+        """Cierra las conexiones de todas las réplicas"""
+        for replica in self.replica_engines:
+            replica.dispose()
+
+router = ReplicaRouter(
+    ReadSessionLocal,
+    [create_replica_engine(url) for url in settings.DATABASE_REPLICA_URLS],
+    settings.READ_YOUR_WRITES_SECONDS
+)
+
+@event.listens_for(SessionLocal, "after_commit")
+def _flag_write(session: Session) -> None:
+    """Marca las sesiones de la base de datos principal que confirmaron cambios"""
+    session.info["wrote"] = True
@@ -1,7 +1,7 @@
 # app/schemas.py
-from pydantic import BaseModel, Field, EmailStr, field_validator, ConfigDict
-from typing import Optional, List
-from datetime import datetime
+from pydantic import BaseModel, Field, EmailStr, field_validator, ConfigDict, model_serializer
+from typing import Any, Dict, Optional, List, Sequence, Union
+from datetime import datetime, timezone
 import re
 from app.config import settings
 from app.password_validator import validate_password_strength
@@ -65,12 +65,25 @@ class RefreshTokenResponse(BaseModel):
     expires_in: int = Field(default=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60)
 
 # Esquemas de tareas
+def en_utc(valor: Optional[datetime]) -> Optional[datetime]:
+    """Convierte una fecha a UTC; una fecha sin zona horaria se toma como UTC"""
+    if valor is None:
+        return None
+    if valor.tzinfo is None:
+        return valor.replace(tzinfo=timezone.utc)
+    return valor.astimezone(timezone.utc)
+
+FECHA_VENCIMIENTO_DESCRIPCION = "Fecha de vencimiento en UTC (sin zona horaria se asume UTC)"
+
 class TareaBase(BaseModel):
     """Esquema base para tareas"""
     titulo: str = Field(..., min_length=1, max_length=100, examples=["Completar proyecto"])
     descripcion: Optional[str] = Field(None, max_length=500, examples=["Finalizar la implementación del módulo de autenticación"])
     completado: bool = Field(default=False, examples=[False])
     prioridad: int = Field(default=1, ge=1, le=3, examples=[1, 2, 3], description="1: Baja, 2: Media, 3: Alta")
+    fecha_vencimiento: Optional[datetime] = Field(
+        None, examples=["2024-01-15T18:00:00Z"], description=FECHA_VENCIMIENTO_DESCRIPCION
+    )
 
     model_config = ConfigDict(
         json_schema_extra={
@@ -78,11 +91,17 @@ class TareaBase(BaseModel):
                 "titulo": "Completar proyecto",
                 "descripcion": "Finalizar la implementación del módulo de autenticación",
                 "completado": False,
-                "prioridad": 1
+                "prioridad": 1,
+                "fecha_vencimiento": "2024-01-15T18:00:00Z"
             }
         }
     )
 
+    @field_validator('fecha_vencimiento')
+    @classmethod
+    def vencimiento_en_utc(cls, v: Optional[datetime]) -> Optional[datetime]:
+        return en_utc(v)
+
 class TareaCreate(TareaBase):
     """Esquema para crear tareas"""
     model_config = ConfigDict(
@@ -91,7 +110,8 @@ class TareaCreate(TareaBase):
                 "titulo": "Completar proyecto",
                 "descripcion": "Finalizar la implementación del módulo de autenticación",
                 "completado": False,
-                "prioridad": 1
+                "prioridad": 1,
+                "fecha_vencimiento": "2024-01-15T18:00:00Z"
             }
         }
     )
@@ -102,6 +122,10 @@ class TareaUpdate(BaseModel):
     descripcion: Optional[str] = Field(None, max_length=500, examples=["Finalizar la implementación del módulo de autenticación"])
     completado: Optional[bool] = Field(None, examples=[True, False])
     prioridad: Optional[int] = Field(None, ge=1, le=3, examples=[1, 2, 3], description="1: Baja, 2: Media, 3: Alta")
+    fecha_vencimiento: Optional[datetime] = Field(
+        None, examples=["2024-01-15T18:00:00Z"],
+        description=FECHA_VENCIMIENTO_DESCRIPCION + "; null la quita"
+    )
 
     model_config = ConfigDict(
         json_schema_extra={
@@ -109,11 +133,42 @@ class TareaUpdate(BaseModel):
                 "titulo": "Completar proyecto actualizado",
                 "descripcion": "Finalizar la implementación del módulo de autenticación",
                 "completado": True,
-                "prioridad": 2
+                "prioridad": 2,
+                "fecha_vencimiento": "2024-01-20T18:00:00Z"
             }
         }
     )
 
+    @field_validator('fecha_vencimiento')
+    @classmethod
+    def vencimiento_en_utc(cls, v: Optional[datetime]) -> Optional[datetime]:
+        return en_utc(v)
+
+class TareaCambioMasivo(BaseModel):
+    """Cambios de PATCH /tareas, aplicados a todas las tareas que cumplen los filtros"""
+    descripcion: Optional[str] = Field(None, max_length=500, examples=["Revisada en la reunión semanal"])
+    completado: Optional[bool] = Field(None, examples=[True])
+    prioridad: Optional[int] = Field(None, ge=1, le=3, examples=[3], description="1: Baja, 2: Media, 3: Alta")
+    fecha_vencimiento: Optional[datetime] = Field(
+        None, examples=["2024-01-20T18:00:00Z"],
+        description=FECHA_VENCIMIENTO_DESCRIPCION + "; null la quita"
+    )
+
+    # El título no se cambia en masa: se rechaza en lugar de ignorarlo
+    model_config = ConfigDict(extra="forbid")
+
+    @field_validator('completado', 'prioridad')
+    @classmethod
+    def no_nulo(cls, v: Any) -> Any:
+        if v is None:
+            raise ValueError("No puede ser null")
+        return v
+
+    @field_validator('fecha_vencimiento')
+    @classmethod
+    def vencimiento_en_utc(cls, v: Optional[datetime]) -> Optional[datetime]:
+        return en_utc(v)
+
 class Tarea(TareaBase):
     """Esquema para respuestas de tareas"""
     id: int = Field(examples=[1])
@@ -130,6 +185,7 @@ class Tarea(TareaBase):
                 "descripcion": "Finalizar la implementación del módulo de autenticación",
                 "completado": False,
                 "prioridad": 1,
+                "fecha_vencimiento": "2024-01-15T18:00:00Z",
                 "usuario_id": 1,
                 "created_at": "2024-01-01T12:00:00Z",
                 "updated_at": None
@@ -137,13 +193,130 @@ class Tarea(TareaBase):
         }
     )
 
+class TareaParcial(BaseModel):
+    """
+    Esquema para respuestas de tareas con solo los campos pedidos en `fields`.
+    
+    Los campos que no se asignaron no aparecen en la respuesta.
+    """
+    id: int = Field(examples=[1])
+    titulo: Optional[str] = None
+    descripcion: Optional[str] = None
+    completado: Optional[bool] = None
+    prioridad: Optional[int] = None
+    fecha_vencimiento: Optional[datetime] = None
+    usuario_id: Optional[int] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+    model_config = ConfigDict(
+        json_schema_extra={
+            "example": {
+                "id": 1,
+                "titulo": "Completar proyecto",
+                "completado": False,
+                "prioridad": 1
+            }
+        }
+    )
+
+    @field_validator('fecha_vencimiento')
+    @classmethod
+    def vencimiento_en_utc(cls, v: Optional[datetime]) -> Optional[datetime]:
+        return en_utc(v)
+
+    @model_serializer(mode="wrap")
+    def _solo_campos_asignados(self, handler) -> Dict[str, Any]:
+        data = handler(self)
+        return {key: value for key, value in data.items() if key in self.model_fields_set}
+
+    @classmethod
+    def desde(cls, tarea: Any, campos: Sequence[str]) -> "TareaParcial":
+        """Construye la respuesta con los campos indicados de una tarea"""
+        return cls(**{campo: getattr(tarea, campo) for campo in campos})
+
 class TareaListResponse(BaseModel):
     """Esquema para respuesta de lista de tareas con paginación"""
-    items: List[Tarea]
-    total: int
+    items: List[Union[Tarea, TareaParcial]]
+    total: Optional[int] = Field(None, description="Total de tareas; null con include_total=false")
     page: int
     size: int
-    pages: int
+    pages: Optional[int] = None
+    next_cursor: Optional[str] = Field(
+        None,
+        description="Cursor opaco para pedir la página siguiente; null si no hay más tareas"
+    )
+
+class TareaBatchResponse(BaseModel):
+    """Esquema para las tareas pedidas por id en GET /tareas/batch"""
+    items: List[Union[Tarea, TareaParcial]] = Field(description="Tareas encontradas, en el orden de ids")
+    no_encontradas: List[int] = Field(
+        examples=[[7]],
+        description="Ids que no existen o pertenecen a otro usuario, en el orden de ids"
+    )
+
+class TareaCambios(BaseModel):
+    """Esquema para los cambios de tareas desde un cursor de sincronización"""
+    items: List[Tarea] = Field(description="Tareas creadas o modificadas, en su estado actual")
+    eliminadas: List[int] = Field(examples=[[3, 8]], description="Ids de las tareas eliminadas")
+    next_cursor: str = Field(description="Cursor para pedir los cambios siguientes")
+    has_more: bool = Field(examples=[False], description="Hay más cambios a partir de next_cursor")
+    reset: bool = Field(
+        default=False,
+        description="El cursor ya no es válido: los cambios empiezan desde cero y el "
+                    "cliente debe descartar su copia local"
+    )
+
+class TareaBulkResultado(BaseModel):
+    """Resultado de una tarea de POST /tareas/bulk"""
+    indice: int = Field(examples=[0], description="Posición de la tarea en la solicitud")
+    tarea: Optional[Tarea] = Field(None, description="Tarea creada; null si fue rechazada")
+    errores: Optional[List[Dict[str, Any]]] = Field(
+        None, description="Errores de validación (loc, msg, type); null si se creó"
+    )
+
+class TareaBulkResponse(BaseModel):
+    """Esquema para la respuesta de la creación de tareas en lote"""
+    creadas: int = Field(examples=[2])
+    rechazadas: int = Field(examples=[0])
+    resultados: List[TareaBulkResultado]
+
+class TareaImportError(BaseModel):
+    """Errores de una línea de POST /tareas/import"""
+    linea: int = Field(examples=[3], description="Número de línea del archivo (en CSV, donde empieza la fila)")
+    errores: List[Dict[str, Any]] = Field(description="Errores (loc, msg, type) de la línea")
+
+class TareaImportResponse(BaseModel):
+    """Esquema para el resultado de la importación de tareas"""
+    importadas: int = Field(examples=[9998])
+    rechazadas: int = Field(examples=[2])
+    errores: List[TareaImportError]
+    errores_truncados: bool = Field(
+        default=False,
+        description="Hubo más líneas rechazadas que las listadas en errores"
+    )
+
+class TareasAfectadas(BaseModel):
+    """Esquema para la respuesta de PATCH y DELETE /tareas"""
+    afectadas: int = Field(examples=[12], description="Número de tareas actualizadas o eliminadas")
+
+class TareaSugerencia(BaseModel):
+    """Esquema para una sugerencia del autocompletado de títulos"""
+    id: int = Field(examples=[1])
+    titulo: str = Field(examples=["Completar proyecto"])
+    prioridad: int = Field(examples=[2])
+
+class Disponibilidad(BaseModel):
+    """Esquema para la disponibilidad de email y username (None si no se consultó)"""
+    email: Optional[bool] = Field(default=None, examples=[True])
+    username: Optional[bool] = Field(default=None, examples=[False])
+
+class TareaStats(BaseModel):
+    """Esquema para los contadores de tareas del usuario"""
+    total: int = Field(examples=[12])
+    completadas: int = Field(examples=[5])
+    pendientes: int = Field(examples=[7])
+    por_prioridad: Dict[int, int] = Field(examples=[{1: 4, 2: 6, 3: 2}])
 
 class PasswordCheck(BaseModel):
     """Esquema para validación de contraseña"""
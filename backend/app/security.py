@@ -6,8 +6,10 @@ from passlib.context import CryptContext
 from fastapi import HTTPException, status, Depends, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
-from app import models, schemas
+from app import models, schemas, queries
 from app.database import SessionLocal
+from app.replicas import router as replica_router
+from app.shards import shard_router
 from app.config import settings
 from app.password_validator import validate_password, validate_password_strength
 import re
@@ -56,6 +58,26 @@ def get_db():
     finally:
         db.close()
 
+def get_request_user_id(request: Request) -> Optional[int]:
+    """Obtiene el ID del usuario autenticado por el middleware, si existe"""
+    user = getattr(request.state, "user", None)
+    return getattr(user, "id", None)
+
+def get_read_db(request: Request):
+    """
+    Proporciona una sesión de solo lectura.
+
+    Usa una réplica de lectura si hay alguna configurada, salvo que el usuario
+    haya escrito recientemente (read-your-writes). Sin réplicas, con el perfil
+    de producción de SQLite usa el pool de lectores, de modo que las consultas
+    no ocupan la única conexión de escritura.
+    """
+    db = replica_router.read_session(get_request_user_id(request))
+    try:
+        yield db
+    finally:
+        db.close()
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """
     Verifica si la contraseña en texto plano coincide con el hash bcrypt.
@@ -131,7 +153,7 @@ def verify_token(token: str, secret_key: str) -> Optional[Dict[str, Any]]:
 
 def authenticate_user(db: Session, email: str, password: str) -> Union[models.Usuario, bool]:
     """Autentica un usuario con email y contraseña"""
-    user = db.query(models.Usuario).filter(models.Usuario.email == email).first()
+    user = db.execute(queries.USUARIO_POR_EMAIL, {"email": email}).scalars().first()
     if not user:
         return False
     if not verify_password(password, str(user.hashed_password)):
@@ -161,17 +183,16 @@ def create_tokens_for_user(user: models.Usuario) -> Dict[str, Union[str, int]]:
 def verify_task_ownership(db: Session, tarea_id: int, user_id: int) -> bool:
     """Verifica si una tarea pertenece a un usuario específico"""
     try:
-        result = db.query(models.Tarea).filter(
-            models.Tarea.id == tarea_id,
-            models.Tarea.usuario_id == user_id
-        ).first()
+        result = db.execute(
+            queries.tarea_de_usuario(), {"tarea_id": tarea_id, "usuario_id": user_id}
+        ).scalars().first()
         return result is not None
     except Exception:
         return False
 
-async def get_current_active_user(
+def get_current_active_user(
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ) -> models.Usuario:
     """
     Obtiene el usuario activo actual a partir del token JWT.
@@ -198,7 +219,7 @@ async def get_current_active_user(
                 headers={"WWW-Authenticate": "Bearer"},
             )
             
-        user = db.query(models.Usuario).filter(models.Usuario.email == email).first()
+        user = db.execute(queries.USUARIO_POR_EMAIL, {"email": email}).scalars().first()
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -225,7 +246,7 @@ async def get_current_active_user(
 
 async def get_current_user_for_tarea(
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     tarea_id: Optional[int] = None
 ) -> models.Usuario:
     """
@@ -252,7 +273,7 @@ async def get_current_user_for_tarea(
                 headers={"WWW-Authenticate": "Bearer"},
             )
             
-        user = db.query(models.Usuario).filter(models.Usuario.email == email).first()
+        user = db.execute(queries.USUARIO_POR_EMAIL, {"email": email}).scalars().first()
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -270,10 +291,17 @@ async def get_current_user_for_tarea(
             )
             
         if tarea_id is not None:
-            tarea = db.query(models.Tarea).filter(
-                models.Tarea.id == tarea_id,
-                models.Tarea.usuario_id == get_safe_id(user)
-            ).first()
+            usuario_id = get_safe_id(user)
+            # Con shards, la tarea está en el shard del usuario y no en el directorio
+            tareas_db = shard_router.session(usuario_id) if shard_router.habilitado else db
+            try:
+                tarea = tareas_db.execute(
+                    queries.tarea_de_usuario(),
+                    {"tarea_id": tarea_id, "usuario_id": usuario_id}
+                ).scalars().first()
+            finally:
+                if tareas_db is not db:
+                    tareas_db.close()
             if not tarea:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
@@ -299,9 +327,9 @@ def refresh_access_token(refresh_token: str, db: Session) -> Dict[str, Union[str
                 headers={"WWW-Authenticate": "Bearer"},
             )
             
-        user = db.query(models.Usuario).filter(
-            models.Usuario.email == str(payload.get("sub"))
-        ).first()
+        user = db.execute(
+            queries.USUARIO_POR_EMAIL, {"email": str(payload.get("sub"))}
+        ).scalars().first()
         
         if user is None:
             raise HTTPException(
@@ -327,9 +355,9 @@ def get_user_from_token(token: str) -> Optional[models.Usuario]:
         if user_id is None:
             return None
             
-        db = SessionLocal()
+        db = replica_router.read_session(user_id)
         try:
-            user = db.query(models.Usuario).filter(models.Usuario.id == user_id).first()
+            user = db.execute(queries.USUARIO_POR_ID, {"usuario_id": user_id}).scalars().first()
             return user
         finally:
             db.close()
@@ -0,0 +1,474 @@
+# app/shards.py
+"""
+Reparto de las tareas de los usuarios entre varias bases de datos (shards).
+
+Las tablas globales (usuarios, refresh_tokens) siguen en la base de datos
+principal, que actúa de directorio. Las tareas de cada usuario, junto con sus
+contadores, su índice de búsqueda y sus prefijos, viven en un único shard:
+
+- Un anillo de hash consistente elige el shard de los usuarios nuevos; añadir
+  un shard solo cambia el destino de una fracción 1/N de ellos
+- La elección se guarda en usuario_shards la primera vez que se enruta al
+  usuario, de modo que cambiar el anillo no reubica a nadie por sí solo
+- Los usuarios con tareas anteriores al reparto quedan asignados al directorio
+  ("principal") hasta que el comando de rebalanceo las mueve
+- Los ids de tareas se reservan por bloques en el directorio, son únicos en
+  todos los shards y se conservan al mover a un usuario
+- Mientras se mueven las tareas de un usuario a otro shard, sus escrituras
+  se rechazan con UsuarioEnMovimiento y sus lecturas siguen en el origen
+- Los shards son archivos SQLite: sus tablas conservan las claves foráneas a
+  usuarios, que solo existen en el directorio y SQLite no comprueba
+
+Cada shard tiene su propio bloqueo de escritura, así que el rendimiento de
+escritura crece con el número de archivos. Sin TAREAS_SHARDS configurados
+todas las tareas siguen en la base de datos principal.
+"""
+import bisect
+import hashlib
+import logging
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import create_engine, delete, event, func, insert, select, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, sessionmaker
+from app import models
+from app.config import settings
+from app.database import SessionLocal, is_sqlite, apply_sqlite_pragmas
+
+logger = logging.getLogger(__name__)
+
+# Nombre del directorio cuando guarda las tareas de un usuario
+PRINCIPAL = "principal"
+
+class UsuarioEnMovimiento(Exception):
+    """Las tareas del usuario se están moviendo de shard y no admiten escrituras"""
+
+    def __init__(self, usuario_id: int):
+        super().__init__(f"Las tareas del usuario {usuario_id} se están moviendo de shard")
+        self.usuario_id = usuario_id
+
+def _hash(valor: str) -> int:
+    return int.from_bytes(hashlib.blake2b(valor.encode("utf-8"), digest_size=8).digest(), "big")
+
+class AnilloHash:
+    """Anillo de hash consistente con nodos virtuales por shard"""
+
+    def __init__(self, nombres: Iterable[str], nodos_virtuales: int = 64):
+        puntos = sorted(
+            (_hash(f"{nombre}#{i}"), nombre)
+            for nombre in nombres
+            for i in range(nodos_virtuales)
+        )
+        self._puntos = [punto for punto, _ in puntos]
+        self._nombres = [nombre for _, nombre in puntos]
+
+    def shard_para(self, usuario_id: int) -> str:
+        """Shard del primer punto del anillo a partir del hash del usuario"""
+        indice = bisect.bisect(self._puntos, _hash(f"usuario:{usuario_id}")) % len(self._puntos)
+        return self._nombres[indice]
+
+class AsignadorIds:
+    """
+    Reserva bloques de ids en la tabla secuencias_ids del directorio.
+
+    Una reserva es una sola escritura en el directorio cada `bloque` tareas
+    creadas por el proceso. Los ids son únicos pero no crecientes entre
+    procesos, que reservan bloques distintos.
+    """
+
+    def __init__(self, directorio: sessionmaker, nombre: str = "tareas", bloque: int = 1000):
+        self.directorio = directorio
+        self.nombre = nombre
+        self.bloque = bloque
+        self._lock = threading.Lock()
+        self._proximo = 0
+        self._limite = 0
+
+    def _reservar(self) -> int:
+        """Reserva el siguiente bloque y devuelve su primer id"""
+        tabla = models.SecuenciaIds.__table__
+        db = self.directorio()
+        try:
+            fin = db.execute(
+                update(tabla)
+                .where(tabla.c.nombre == self.nombre)
+                .values(siguiente=tabla.c.siguiente + self.bloque)
+                .returning(tabla.c.siguiente)
+            ).scalar()
+            if fin is not None:
+                db.commit()
+                return fin - self.bloque
+            # Primera reserva: continuar después de las tareas del directorio
+            inicio = max(
+                db.execute(select(func.max(modelo.id))).scalar() or 0
+                for modelo in (models.Tarea, models.TareaArchivada)
+            ) + 1
+            db.execute(insert(tabla).values(nombre=self.nombre, siguiente=inicio + self.bloque))
+            db.commit()
+            return inicio
+        except IntegrityError:
+            # Otro proceso creó la fila a la vez; reservar sobre ella
+            db.rollback()
+            db.close()
+            return self._reservar()
+        finally:
+            db.close()
+
+    def siguiente(self) -> int:
+        with self._lock:
+            if self._proximo >= self._limite:
+                self._proximo = self._reservar()
+                self._limite = self._proximo + self.bloque
+            valor = self._proximo
+            self._proximo += 1
+            return valor
+
+class ShardRouter:
+    """Elige y abre la sesión del shard que guarda las tareas de cada usuario"""
+
+    def __init__(
+        self,
+        directorio: sessionmaker,
+        shards: Dict[str, Engine],
+        nodos_virtuales: int = 64,
+        cache_seconds: float = 60.0,
+        bloque_ids: int = 1000
+    ):
+        if PRINCIPAL in shards:
+            raise ValueError(f"'{PRINCIPAL}' está reservado para la base de datos directorio")
+        self.directorio = directorio
+        self.shards = shards
+        self.anillo = AnilloHash(sorted(shards), nodos_virtuales) if shards else None
+        self.cache_seconds = cache_seconds
+        self.asignador = AsignadorIds(directorio, bloque=bloque_ids)
+        self._factories: Dict[str, sessionmaker] = {
+            nombre: sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=shard)
+            for nombre, shard in shards.items()
+        }
+        self._factories[PRINCIPAL] = directorio
+        self._asignaciones: Dict[int, Tuple[str, bool, float]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def habilitado(self) -> bool:
+        """Indica si hay shards configurados"""
+        return bool(self.shards)
+
+    @property
+    def nombres(self) -> List[str]:
+        """Shards a los que se puede enrutar, incluido el directorio"""
+        return [PRINCIPAL] + sorted(self.shards)
+
+    def _asignacion(self, usuario_id: int) -> Tuple[str, bool]:
+        """
+        Shard del usuario y si sus tareas se están moviendo. El shard es el
+        asignado en usuario_shards o, si todavía no tiene, el que le
+        corresponde en el anillo (que queda asignado).
+
+        La asignación se guarda en memoria durante SHARDS_CACHE_SECONDS.
+        """
+        ahora = time.monotonic()
+        with self._lock:
+            en_cache = self._asignaciones.get(usuario_id)
+        if en_cache is not None and ahora - en_cache[2] < self.cache_seconds:
+            return en_cache[0], en_cache[1]
+
+        db = self.directorio()
+        try:
+            fila = db.execute(
+                select(models.UsuarioShard.shard, models.UsuarioMovimiento.usuario_id.is_not(None))
+                .outerjoin(
+                    models.UsuarioMovimiento,
+                    models.UsuarioMovimiento.usuario_id == models.UsuarioShard.usuario_id
+                )
+                .where(models.UsuarioShard.usuario_id == usuario_id)
+            ).first()
+            shard, moviendo = fila if fila is not None else (self._asignar(db, usuario_id), False)
+        finally:
+            db.close()
+        with self._lock:
+            # Purgar entradas vencidas para que la caché no crezca sin límite
+            if len(self._asignaciones) > 100000:
+                self._asignaciones = {
+                    uid: valor for uid, valor in self._asignaciones.items()
+                    if ahora - valor[2] < self.cache_seconds
+                }
+            self._asignaciones[usuario_id] = (shard, moviendo, ahora)
+        return shard, moviendo
+
+    def shard_de(self, usuario_id: int) -> str:
+        """Shard con las tareas del usuario (ver _asignacion)"""
+        return self._asignacion(usuario_id)[0]
+
+    def comprobar_escritura(self, usuario_id: int) -> None:
+        """Lanza UsuarioEnMovimiento si las tareas del usuario se están moviendo"""
+        if self.habilitado and self._asignacion(usuario_id)[1]:
+            raise UsuarioEnMovimiento(usuario_id)
+
+    def _asignar(self, db: Session, usuario_id: int) -> str:
+        # Las tareas anteriores al reparto siguen en el directorio hasta moverlas
+        tiene_tareas = any(
+            db.execute(select(modelo.id).where(modelo.usuario_id == usuario_id).limit(1)).first()
+            for modelo in (models.Tarea, models.TareaArchivada)
+        )
+        shard = PRINCIPAL if tiene_tareas else self.anillo.shard_para(usuario_id)
+        try:
+            db.add(models.UsuarioShard(usuario_id=usuario_id, shard=shard))
+            db.commit()
+            return shard
+        except IntegrityError:
+            # Otro proceso lo asignó a la vez; prevalece su asignación
+            db.rollback()
+            return db.execute(
+                select(models.UsuarioShard.shard).where(models.UsuarioShard.usuario_id == usuario_id)
+            ).scalar()
+
+    def marcar_movimiento(self, usuario_id: int, destino: str) -> None:
+        """Bloquea las escrituras del usuario mientras se mueven sus tareas"""
+        db = self.directorio()
+        try:
+            db.merge(models.UsuarioMovimiento(usuario_id=usuario_id, destino=destino))
+            db.commit()
+        finally:
+            db.close()
+        with self._lock:
+            self._asignaciones.pop(usuario_id, None)
+
+    def desmarcar_movimiento(self, usuario_id: int) -> None:
+        """Vuelve a admitir escrituras del usuario sin cambiar su shard"""
+        db = self.directorio()
+        try:
+            db.execute(delete(models.UsuarioMovimiento).where(models.UsuarioMovimiento.usuario_id == usuario_id))
+            db.commit()
+        finally:
+            db.close()
+        with self._lock:
+            self._asignaciones.pop(usuario_id, None)
+
+    def fijar(self, usuario_id: int, shard: str) -> None:
+        """Asigna el usuario a un shard en el directorio y termina su movimiento"""
+        db = self.directorio()
+        try:
+            resultado = db.execute(
+                update(models.UsuarioShard)
+                .where(models.UsuarioShard.usuario_id == usuario_id)
+                .values(shard=shard, asignado_en=func.now())
+            )
+            if resultado.rowcount == 0:
+                db.add(models.UsuarioShard(usuario_id=usuario_id, shard=shard))
+            db.execute(delete(models.UsuarioMovimiento).where(models.UsuarioMovimiento.usuario_id == usuario_id))
+            db.commit()
+        finally:
+            db.close()
+        with self._lock:
+            self._asignaciones.pop(usuario_id, None)
+
+    def session(self, usuario_id: int) -> Session:
+        """Abre una sesión sobre el shard del usuario"""
+        return self._factories[self.shard_de(usuario_id)]()
+
+    def session_de_shard(self, nombre: str) -> Session:
+        """Abre una sesión sobre un shard por su nombre"""
+        if nombre not in self._factories:
+            raise ValueError(f"Shard desconocido: '{nombre}'. Shards disponibles: {', '.join(self.nombres)}")
+        return self._factories[nombre]()
+
+    def en_cada_base(self, funcion: Callable[[Session], int]) -> int:
+        """
+        Ejecuta funcion(db) sobre la base de datos principal y cada shard (solo
+        la principal si no hay shards) y suma los resultados.
+        """
+        total = 0
+        for nombre in self.nombres if self.habilitado else [PRINCIPAL]:
+            db = self._factories[nombre]()
+            try:
+                total += funcion(db)
+            finally:
+                db.close()
+        return total
+
+    def origen_de(self, usuario_id: int) -> str:
+        """Nombre de la base de datos con las tareas del usuario"""
+        return self.shard_de(usuario_id) if self.habilitado else PRINCIPAL
+
+    def crear_tablas(self) -> None:
+        """Crea las tablas, índices y triggers en cada shard"""
+        for shard in self.shards.values():
+            models.Base.metadata.create_all(bind=shard)
+
+    def _asignar_id(self, mapper, connection, target) -> None:
+        if target.id is None:
+            target.id = self.asignador.siguiente()
+
+    def instalar_asignador_ids(self) -> None:
+        """Hace que toda tarea nueva reciba un id reservado en el directorio"""
+        if not event.contains(models.Tarea, "before_insert", self._asignar_id):
+            event.listen(models.Tarea, "before_insert", self._asignar_id)
+
+    def desinstalar_asignador_ids(self) -> None:
+        if event.contains(models.Tarea, "before_insert", self._asignar_id):
+            event.remove(models.Tarea, "before_insert", self._asignar_id)
+
+    def dispose(self) -> None:
+        """Cierra las conexiones de todos los shards"""
+        for shard in self.shards.values():
+            shard.dispose()
+
+def _copiar_tabla(origen: Session, destino: Session, tabla, usuario_id: int, lote: int) -> List[int]:
+    """Copia al destino las filas del usuario que aún no tiene y retorna sus ids"""
+    ids_origen = origen.execute(select(tabla.c.id).where(tabla.c.usuario_id == usuario_id)).scalars().all()
+    ya_copiados = set(
+        destino.execute(select(tabla.c.id).where(tabla.c.usuario_id == usuario_id)).scalars()
+    )
+    faltantes = [fila_id for fila_id in ids_origen if fila_id not in ya_copiados]
+    for inicio in range(0, len(faltantes), lote):
+        ids = faltantes[inicio:inicio + lote]
+        filas = [dict(fila) for fila in origen.execute(select(tabla).where(tabla.c.id.in_(ids))).mappings()]
+        destino.execute(insert(tabla), filas)
+        if tabla is models.Tarea.__table__:
+            # Los triggers del destino mantienen sus contadores e índice de
+            # búsqueda; los prefijos se copian aparte
+            prefijos = models.TareaPrefijo.__table__
+            filas_prefijos = [
+                dict(fila) for fila in origen.execute(
+                    select(prefijos).where(prefijos.c.tarea_id.in_(ids))
+                ).mappings()
+            ]
+            if filas_prefijos:
+                destino.execute(insert(prefijos), filas_prefijos)
+        destino.commit()
+    return faltantes
+
+def _copiar_faltantes(origen: Session, destino: Session, usuario_id: int, lote: int) -> int:
+    """Copia al destino las tareas activas (con sus prefijos) y archivadas del usuario"""
+    copiadas = _copiar_tabla(origen, destino, models.Tarea.__table__, usuario_id, lote)
+    archivadas = _copiar_tabla(origen, destino, models.TareaArchivada.__table__, usuario_id, lote)
+    return len(copiadas) + len(archivadas)
+
+def mover_usuarios(
+    router: ShardRouter,
+    movimientos: List[Tuple[int, str]],
+    espera_seconds: Optional[float] = None,
+    lote: int = 500
+) -> int:
+    """
+    Mueve las tareas de cada (usuario_id, destino) a su shard de destino y
+    devuelve cuántas tareas copió.
+
+    1. Marca a los usuarios en movimiento: sus escrituras se rechazan
+    2. Espera a que los procesos vean la marca (SHARDS_CACHE_SECONDS), de modo
+       que nadie más escribe en el origen
+    3. Copia las tareas activas y archivadas (con los mismos ids) y los
+       prefijos al destino, y asigna cada usuario a su destino, lo que vuelve
+       a admitir sus escrituras
+    4. Espera a que los procesos dejen de leer del origen y elimina de él las
+       tareas, las archivadas y los contadores; los triggers limpian el índice
+       de búsqueda y los prefijos
+
+    Cada espera es una sola para todos los usuarios. Si la copia falla, los
+    usuarios que faltaban por asignar vuelven a admitir escrituras en el
+    origen.
+    """
+    if espera_seconds is None:
+        espera_seconds = router.cache_seconds
+    pendientes = []
+    for usuario_id, destino in movimientos:
+        router.session_de_shard(destino).close()  # valida el nombre
+        origen = router.shard_de(usuario_id)
+        if origen != destino:
+            pendientes.append((usuario_id, origen, destino))
+
+    def copiar(usuario_id: int, origen: str, destino: str) -> int:
+        db_origen = router.session_de_shard(origen)
+        db_destino = router.session_de_shard(destino)
+        try:
+            return _copiar_faltantes(db_origen, db_destino, usuario_id, lote)
+        finally:
+            db_origen.close()
+            db_destino.close()
+
+    for usuario_id, _, destino in pendientes:
+        router.marcar_movimiento(usuario_id, destino)
+    copiadas, asignados = 0, 0
+    try:
+        if pendientes and espera_seconds > 0:
+            time.sleep(espera_seconds)
+        for usuario_id, origen, destino in pendientes:
+            copiadas += copiar(usuario_id, origen, destino)
+            router.fijar(usuario_id, destino)
+            asignados += 1
+    except Exception:
+        for usuario_id, _, _ in pendientes[asignados:]:
+            router.desmarcar_movimiento(usuario_id)
+        raise
+    if pendientes and espera_seconds > 0:
+        time.sleep(espera_seconds)
+    for usuario_id, origen, destino in pendientes:
+        db_origen = router.session_de_shard(origen)
+        try:
+            db_origen.execute(delete(models.Tarea.__table__).where(models.Tarea.usuario_id == usuario_id))
+            db_origen.execute(
+                delete(models.TareaArchivada.__table__).where(models.TareaArchivada.usuario_id == usuario_id)
+            )
+            # Los triggers dejan los contadores en cero; la fila ya no hace falta
+            db_origen.execute(
+                delete(models.TareaStats.__table__).where(models.TareaStats.usuario_id == usuario_id)
+            )
+            db_origen.commit()
+        finally:
+            db_origen.close()
+        logger.info("Usuario %s movido de %s a %s", usuario_id, origen, destino)
+    return copiadas
+
+def mover_usuario(
+    router: ShardRouter,
+    usuario_id: int,
+    destino: str,
+    espera_seconds: Optional[float] = None
+) -> int:
+    """Mueve las tareas de un usuario a otro shard (ver mover_usuarios)"""
+    return mover_usuarios(router, [(usuario_id, destino)], espera_seconds)
+
+def pendientes_de_rebalanceo(router: ShardRouter) -> List[Tuple[int, str, str]]:
+    """
+    Usuarios que no están en el shard que les corresponde en el anillo, como
+    (usuario_id, shard actual, shard del anillo). Incluye a los usuarios con
+    tareas anteriores al reparto que todavía están en el directorio.
+    """
+    db = router.directorio()
+    try:
+        asignados = dict(db.execute(select(models.UsuarioShard.usuario_id, models.UsuarioShard.shard)).all())
+        con_tareas = db.execute(
+            select(models.Tarea.usuario_id).union(select(models.TareaArchivada.usuario_id))
+        ).scalars().all()
+    finally:
+        db.close()
+    for usuario_id in con_tareas:
+        asignados.setdefault(usuario_id, PRINCIPAL)
+    return [
+        (usuario_id, actual, router.anillo.shard_para(usuario_id))
+        for usuario_id, actual in sorted(asignados.items())
+        if actual != router.anillo.shard_para(usuario_id)
+    ]
+
+def create_shard_engine(url: str) -> Engine:
+    """Crea el engine de un shard; solo se admiten archivos SQLite"""
+    if not is_sqlite(url):
+        raise ValueError(
+            f"Los shards de tareas deben ser bases de datos SQLite: '{url}'. Sus tablas tienen "
+            "claves foráneas a usuarios, que solo existen en la base de datos directorio"
+        )
+    shard = create_engine(url, connect_args={"check_same_thread": False})
+    if settings.SQLITE_PRODUCTION_MODE:
+        apply_sqlite_pragmas(shard)
+    return shard
+
+shard_router = ShardRouter(
+    SessionLocal,
+    {nombre: create_shard_engine(url) for nombre, url in settings.TAREAS_SHARDS.items()},
+    nodos_virtuales=settings.SHARDS_NODOS_VIRTUALES,
+    cache_seconds=settings.SHARDS_CACHE_SECONDS,
+    bloque_ids=settings.SHARDS_BLOQUE_IDS
+)
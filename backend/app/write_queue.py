@@ -0,0 +1,192 @@
+# app/write_queue.py
+"""
+Cola de escritura con commit agrupado (group commit) para SQLite.
+
+En SQLite cada commit implica al menos un fsync y solo un escritor puede tener
+el bloqueo del archivo, por lo que las escrituras concurrentes se serializan y
+el rendimiento queda limitado por la latencia del disco. La cola reúne las
+escrituras de solicitudes concurrentes y las aplica desde un único hilo
+escritor en una sola transacción, cada WRITE_QUEUE_MAX_DELAY_MS milisegundos o
+cada WRITE_QUEUE_MAX_BATCH operaciones. Cada operación se ejecuta dentro de un
+SAVEPOINT, de modo que un error solo deshace esa operación y se entrega a su
+llamador mientras el resto del lote se confirma. Con SQLite el engine de la
+cola debe usar apply_sqlite_transactions: si no, pysqlite confirma cada
+SAVEPOINT por separado y no hay commit agrupado. Por eso la cola escribe con
+WriteQueueSessionLocal (el escritor en el perfil de producción y un engine
+propio de una conexión en el perfil por defecto) y no con SessionLocal.
+"""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional
+from sqlalchemy.orm import Session, sessionmaker
+from app.config import settings
+from app.database import WriteQueueSessionLocal, engine
+
+logger = logging.getLogger(__name__)
+
+WriteOperation = Callable[..., Any]
+
+class _PendingWrite:
+    """Operación encolada junto con el futuro que recibe su resultado"""
+    __slots__ = ("fn", "args", "kwargs", "future")
+
+    def __init__(self, fn: WriteOperation, args: tuple, kwargs: dict):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.future: Future = Future()
+
+_STOP = object()
+
+class WriteQueue:
+    """Hilo escritor único que aplica las operaciones encoladas por lotes"""
+
+    def __init__(
+        self,
+        session_factory: sessionmaker,
+        max_batch: int = 64,
+        max_delay_ms: float = 5
+    ):
+        self.session_factory = session_factory
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        """Indica si el hilo escritor está activo"""
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        """Arranca el hilo escritor"""
+        if self.running:
+            return
+        self._thread = threading.Thread(target=self._run, name="write-queue", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Procesa las operaciones pendientes y detiene el hilo escritor"""
+        if not self.running:
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._thread = None
+
+    def submit(self, fn: WriteOperation, *args, **kwargs) -> Future:
+        """
+        Encola una operación de escritura.
+
+        La operación recibe la sesión del hilo escritor como primer argumento y
+        no debe hacer commit: la cola confirma el lote completo.
+        """
+        pending = _PendingWrite(fn, args, kwargs)
+        self._queue.put(pending)
+        return pending.future
+
+    def _collect_batch(self, first: _PendingWrite) -> tuple:
+        """Reúne operaciones hasta llenar el lote o agotar el tiempo de espera"""
+        batch = [first]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            batch, stopping = self._collect_batch(item)
+            self._apply_batch(batch)
+        # Vaciar lo que quede en la cola antes de terminar
+        leftovers = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                leftovers.append(item)
+        if leftovers:
+            self._apply_batch(leftovers)
+
+    def _apply_batch(self, batch: List[_PendingWrite]) -> None:
+        """
+        Aplica un lote en una única transacción y resuelve cada futuro.
+
+        Las instancias devueltas ya tienen sus columnas generadas (los modelos
+        las leen con RETURNING al hacer flush) y no se expiran en el commit,
+        así que se entregan tal cual, desvinculadas de la sesión del escritor.
+        """
+        db = self.session_factory(expire_on_commit=False)
+        outcomes = []
+        try:
+            for pending in batch:
+                try:
+                    with db.begin_nested():
+                        result = pending.fn(db, *pending.args, **pending.kwargs)
+                    outcomes.append((pending, result, None))
+                except Exception as e:
+                    outcomes.append((pending, None, e))
+            db.commit()
+        except Exception as e:
+            logger.exception("Error al confirmar el lote de escrituras")
+            db.rollback()
+            for pending, _, error in outcomes:
+                pending.future.set_exception(error or e)
+            for pending in batch[len(outcomes):]:
+                pending.future.set_exception(e)
+            return
+        finally:
+            db.close()
+
+        for pending, result, error in outcomes:
+            if error is not None:
+                pending.future.set_exception(error)
+            else:
+                pending.future.set_result(result)
+
+write_queue = WriteQueue(
+    WriteQueueSessionLocal,
+    max_batch=settings.WRITE_QUEUE_MAX_BATCH,
+    max_delay_ms=settings.WRITE_QUEUE_MAX_DELAY_MS
+)
+
+def run_write(db: Session, fn: WriteOperation, *args, **kwargs) -> Any:
+    """
+    Ejecuta una operación de escritura y la confirma.
+
+    Si la cola de escritura está activa y la sesión apunta a la base de datos
+    principal, la operación se delega al hilo escritor y se espera su
+    resultado. En caso contrario se ejecuta sobre la sesión recibida y se hace
+    commit directamente.
+    """
+    if write_queue.running and db.get_bind() is engine:
+        # Liberar la conexión de la sesión de la solicitud: con el perfil de
+        # producción de SQLite el escritor dispone de una única conexión
+        db.close()
+        result = write_queue.submit(fn, *args, **kwargs).result()
+        db.info["wrote"] = True
+        return result
+
+    try:
+        result = fn(db, *args, **kwargs)
+        db.commit()
+        return result
+    except Exception:
+        db.rollback()
+        raise
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Benchmark de lecturas y escrituras concurrentes sobre /tareas con SQLite.
+
+Levanta la API con uvicorn sobre un archivo SQLite temporal con cada perfil
+(configuración por defecto, SQLITE_PRODUCTION_MODE=true y producción con la
+cola de escritura de commit agrupado) y lanza clientes concurrentes que
+mezclan GET /tareas y POST /tareas.
+
+Uso:
+    python benchmarks/bench_sqlite_concurrency.py --clients 16 --seconds 10
+"""
+import argparse
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+USER = {
+    "email": "bench@example.com",
+    "username": "benchuser",
+    "password": "SecurePassX9!"
+}
+
+
+def free_port() -> int:
+    """Obtiene un puerto libre en localhost"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+PROFILES = [
+    ("por defecto", {}),
+    ("producción (WAL + pool lector/escritor)", {"SQLITE_PRODUCTION_MODE": "true"}),
+    ("producción + cola de escritura", {"SQLITE_PRODUCTION_MODE": "true", "WRITE_QUEUE_ENABLED": "true"}),
+]
+
+
+def start_server(db_path: str, profile_env: dict, port: int) -> subprocess.Popen:
+    """Arranca uvicorn con la base de datos y el perfil indicados"""
+    env = dict(os.environ)
+    env.update({
+        "DATABASE_URL": f"sqlite:///{db_path}",
+        "SQLITE_PRODUCTION_MODE": "false",
+        "WRITE_QUEUE_ENABLED": "false",
+        "RATE_LIMIT_PER_MINUTE": "100000000",
+        "LOGIN_RATE_LIMIT_PER_MINUTE": "100000000",
+        "TASK_RATE_LIMIT_PER_MINUTE": "100000000",
+    })
+    env.update(profile_env)
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env=env,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            if httpx.get(f"{base_url}/health").status_code == 200:
+                return process
+        except httpx.TransportError:
+            pass
+        time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("El servidor no arrancó a tiempo")
+
+
+def login(base_url: str) -> dict:
+    """Registra el usuario de benchmark y devuelve los headers de autenticación"""
+    httpx.post(f"{base_url}/register", json=USER)
+    response = httpx.post(f"{base_url}/token", data={"username": USER["email"], "password": USER["password"]})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def client_loop(base_url: str, headers: dict, seconds: float, write_ratio: float) -> dict:
+    """Ejecuta solicitudes mezcladas durante el tiempo indicado"""
+    stats = {"reads": [], "writes": [], "errors": 0}
+    deadline = time.perf_counter() + seconds
+    with httpx.Client(base_url=base_url, headers=headers, timeout=60) as client:
+        while time.perf_counter() < deadline:
+            is_write = random.random() < write_ratio
+            start = time.perf_counter()
+            if is_write:
+                response = client.post("/tareas", json={"titulo": "Tarea de benchmark", "prioridad": random.randint(1, 3)})
+            else:
+                response = client.get("/tareas", params={"limit": 20})
+            elapsed = time.perf_counter() - start
+            if response.status_code >= 400:
+                stats["errors"] += 1
+            else:
+                stats["writes" if is_write else "reads"].append(elapsed)
+    return stats
+
+
+def run_mode(label: str, profile_env: dict, clients: int, seconds: float, write_ratio: float) -> None:
+    """Ejecuta el benchmark para un perfil y muestra los resultados"""
+    with tempfile.TemporaryDirectory() as tmp:
+        port = free_port()
+        process = start_server(os.path.join(tmp, "bench.db"), profile_env, port)
+        try:
+            base_url = f"http://127.0.0.1:{port}"
+            headers = login(base_url)
+            with ThreadPoolExecutor(max_workers=clients) as pool:
+                results = list(pool.map(
+                    lambda _: client_loop(base_url, headers, seconds, write_ratio),
+                    range(clients)
+                ))
+        finally:
+            process.terminate()
+            process.wait()
+
+    reads = [t for r in results for t in r["reads"]]
+    writes = [t for r in results for t in r["writes"]]
+    errors = sum(r["errors"] for r in results)
+    print(f"\nPerfil SQLite {label}")
+    print(f"  lecturas:  {len(reads) / seconds:8.1f} req/s  p50={percentile(reads, 50):7.1f} ms  p99={percentile(reads, 99):7.1f} ms")
+    print(f"  escrituras:{len(writes) / seconds:8.1f} req/s  p50={percentile(writes, 50):7.1f} ms  p99={percentile(writes, 99):7.1f} ms")
+    print(f"  errores:   {errors}")
+
+
+def percentile(values: list, pct: int) -> float:
+    """Percentil en milisegundos"""
+    if not values:
+        return 0.0
+    if len(values) == 1:
+        return values[0] * 1000
+    return statistics.quantiles(values, n=100)[pct - 1] * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=16, help="Clientes concurrentes")
+    parser.add_argument("--seconds", type=float, default=10, help="Duración de cada perfil")
+    parser.add_argument("--write-ratio", type=float, default=0.2, help="Proporción de escrituras")
+    args = parser.parse_args()
+
+    for label, profile_env in PROFILES:
+        run_mode(label, profile_env, args.clients, args.seconds, args.write_ratio)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,10 @@
+import argparse
 import sqlite3
 from datetime import datetime, timedelta
 import os
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.schema import CreateIndex
 
 def migrate_database():
     """Migra la base de datos a la nueva estructura"""
@@ -106,5 +110,397 @@ def migrate_database():
     conn.close()
     print("Migración completada exitosamente")
 
+# Índices únicos sin distinguir mayúsculas de usuarios y la columna de cada uno
+INDICES_SIN_MAYUSCULAS = {"ix_usuarios_email_lower": "email", "ix_usuarios_username_lower": "username"}
+
+def usuarios_duplicados(engine) -> Dict[str, List[Tuple[int, str]]]:
+    """
+    Busca los usuarios cuyo email o username solo difiere en mayúsculas del de
+    otro usuario.
+    
+    Retorna, por columna, los (id, valor) de esos usuarios ordenados por valor
+    e id. No depende de los modelos: funciona antes de crear los índices
+    únicos por lower().
+    """
+    duplicados = {}
+    with engine.connect() as conn:
+        for columna in INDICES_SIN_MAYUSCULAS.values():
+            filas = conn.execute(text(
+                f"SELECT id, {columna} FROM usuarios WHERE lower({columna}) IN ("
+                f"SELECT lower({columna}) FROM usuarios GROUP BY lower({columna}) HAVING count(*) > 1"
+                f") ORDER BY lower({columna}), id"
+            )).all()
+            if filas:
+                duplicados[columna] = [tuple(fila) for fila in filas]
+    return duplicados
+
+def comprobar_usuarios(database_url: Optional[str] = None) -> int:
+    """
+    Informa de los usuarios que impiden crear los índices únicos por lower() de
+    email y username, y retorna cuántos hay.
+    
+    Se ejecuta antes de actualizar una base de datos existente: mientras haya
+    usuarios que solo difieren en mayúsculas el arranque no puede crear esos
+    índices. Cada grupo se resuelve a mano (cambiando el email o username, o
+    fusionando las cuentas) y después se ejecuta `migrate_db.py indices`.
+    """
+    from app.config import settings
+    
+    engine = create_engine(database_url or settings.DATABASE_URL)
+    try:
+        duplicados = usuarios_duplicados(engine) if inspect(engine).has_table("usuarios") else {}
+    finally:
+        engine.dispose()
+    for columna, filas in duplicados.items():
+        print(f"Usuarios con el mismo {columna} salvo mayúsculas:")
+        for usuario_id, valor in filas:
+            print(f"  id={usuario_id} {columna}={valor}")
+    total = sum(len(filas) for filas in duplicados.values())
+    print(f"Usuarios duplicados: {total}")
+    return total
+
+def crear_indices(database_url: Optional[str] = None) -> None:
+    """
+    Crea en una base de datos existente los índices declarados en los modelos
+    que todavía no existan.
+    
+    - Cada índice se crea en su propia transacción corta, de modo que las
+      escrituras pueden avanzar entre un índice y el siguiente
+    - En PostgreSQL se usa CREATE INDEX CONCURRENTLY, que no bloquea escrituras
+    - En SQLite (con WAL) las lecturas continúan durante la creación
+    - Al terminar se ejecuta ANALYZE para que el planificador use los índices
+    - Los índices únicos por lower() de usuarios se omiten mientras haya
+      usuarios que solo difieren en mayúsculas (ver `comprobar_usuarios`)
+    """
+    from app import models
+    from app.config import settings
+    
+    engine = create_engine(database_url or settings.DATABASE_URL)
+    is_postgres = engine.dialect.name == "postgresql"
+    try:
+        inspector = inspect(engine)
+        duplicados = usuarios_duplicados(engine) if inspector.has_table("usuarios") else {}
+        creados = 0
+        for table in models.Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existentes = {ix["name"] for ix in inspector.get_indexes(table.name)}
+            for index in sorted(table.indexes, key=lambda ix: ix.name):
+                if index.name in existentes:
+                    continue
+                if INDICES_SIN_MAYUSCULAS.get(index.name) in duplicados:
+                    print(
+                        f"Se omite {index.name}: hay usuarios que solo difieren en mayúsculas; "
+                        "ejecuta 'python migrate_db.py usuarios'"
+                    )
+                    continue
+                ddl = str(CreateIndex(index, if_not_exists=True).compile(dialect=engine.dialect))
+                print(f"Creando índice {index.name} en {table.name}...")
+                inicio = datetime.now()
+                if is_postgres:
+                    ddl = ddl.replace("CREATE INDEX", "CREATE INDEX CONCURRENTLY", 1)
+                    ddl = ddl.replace("CREATE UNIQUE INDEX", "CREATE UNIQUE INDEX CONCURRENTLY", 1)
+                    # CONCURRENTLY no puede ejecutarse dentro de una transacción
+                    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                        conn.execute(text(ddl))
+                else:
+                    with engine.begin() as conn:
+                        conn.execute(text(ddl))
+                creados += 1
+                print(f"  listo en {(datetime.now() - inicio).total_seconds():.2f}s")
+        
+        if creados:
+            with engine.begin() as conn:
+                conn.execute(text("ANALYZE"))
+        print(f"Índices creados: {creados}")
+    finally:
+        engine.dispose()
+
+def reconstruir_estadisticas(database_url: Optional[str] = None) -> None:
+    """
+    Recalcula tareas_stats a partir de la tabla tareas.
+    
+    Crea la tabla y sus triggers si todavía no existen y reemplaza los
+    contadores en una única transacción, de modo que corrige cualquier
+    desviación (por ejemplo, tareas anteriores a la creación de los triggers).
+    """
+    from sqlalchemy import case, func, insert, select
+    from app import models
+    from app.config import settings
+    
+    engine = create_engine(database_url or settings.DATABASE_URL)
+    try:
+        models.Base.metadata.create_all(bind=engine)
+        tarea = models.Tarea
+        conteos = select(
+            tarea.usuario_id,
+            func.count(),
+            func.sum(case((tarea.completado == True, 1), else_=0)),  # noqa: E712
+            func.sum(case((tarea.prioridad == 1, 1), else_=0)),
+            func.sum(case((tarea.prioridad == 2, 1), else_=0)),
+            func.sum(case((tarea.prioridad == 3, 1), else_=0)),
+        ).group_by(tarea.usuario_id)
+        stats = models.TareaStats.__table__
+        with engine.begin() as conn:
+            conn.execute(stats.delete())
+            resultado = conn.execute(insert(stats).from_select(
+                ["usuario_id", "total", "completadas", "prioridad_1", "prioridad_2", "prioridad_3"],
+                conteos
+            ))
+        print(f"Estadísticas reconstruidas para {resultado.rowcount} usuarios")
+    finally:
+        engine.dispose()
+
+def reconstruir_busqueda(database_url: Optional[str] = None) -> None:
+    """
+    Crea el índice de texto completo de tareas y lo llena con las tareas existentes.
+    
+    En PostgreSQL la columna generada se calcula al añadirla; en SQLite se
+    reconstruye la tabla FTS5 a partir de la tabla tareas.
+    """
+    from app import models
+    from app.config import settings
+    
+    engine = create_engine(database_url or settings.DATABASE_URL)
+    try:
+        models.Base.metadata.create_all(bind=engine)
+        if engine.dialect.name == "sqlite":
+            with engine.begin() as conn:
+                conn.execute(text("INSERT INTO tareas_fts (tareas_fts) VALUES ('rebuild')"))
+                conn.execute(text("INSERT INTO tareas_fts (tareas_fts) VALUES ('optimize')"))
+        print("Índice de búsqueda reconstruido")
+    finally:
+        engine.dispose()
+
+def reconstruir_sugerencias(database_url: Optional[str] = None, lote: int = 1000) -> None:
+    """
+    Recalcula el índice de prefijos del autocompletado a partir de los títulos.
+    
+    Recorre las tareas por id en lotes, cada uno en su propia transacción.
+    """
+    from sqlalchemy.orm import sessionmaker
+    from app import models, crud
+    from app.config import settings
+    
+    engine = create_engine(database_url or settings.DATABASE_URL)
+    try:
+        models.Base.metadata.create_all(bind=engine)
+        db = sessionmaker(bind=engine)()
+        try:
+            db.query(models.TareaPrefijo).delete(synchronize_session=False)
+            db.commit()
+            ultimo_id, procesadas = 0, 0
+            while True:
+                tareas = db.query(models.Tarea).filter(
+                    models.Tarea.id > ultimo_id
+                ).order_by(models.Tarea.id).limit(lote).all()
+                if not tareas:
+                    break
+                for tarea in tareas:
+                    crud._indexar_prefijos(db, tarea)
+                db.commit()
+                ultimo_id = tareas[-1].id
+                procesadas += len(tareas)
+            print(f"Sugerencias reconstruidas para {procesadas} tareas")
+        finally:
+            db.close()
+    finally:
+        engine.dispose()
+
+def registrar_cambios() -> None:
+    """
+    Crea tareas_cambios y sus triggers en la base de datos principal y en los
+    shards y registra las tareas existentes, que la sincronización incremental
+    no vería hasta su próximo cambio.
+    """
+    from sqlalchemy import insert, literal, select
+    from app import models
+    from app.database import engine
+    from app.shards import shard_router
+    
+    def registrar(db) -> int:
+        tareas, cambios = models.Tarea.__table__, models.TareaCambio.__table__
+        resultado = db.execute(insert(cambios).from_select(
+            ["usuario_id", "tarea_id", "eliminada"],
+            select(tareas.c.usuario_id, tareas.c.id, literal(False)).where(
+                tareas.c.id.not_in(select(cambios.c.tarea_id))
+            ).order_by(tareas.c.id)
+        ))
+        db.commit()
+        return resultado.rowcount
+    
+    models.Base.metadata.create_all(bind=engine)
+    shard_router.crear_tablas()
+    try:
+        print(f"Tareas registradas: {shard_router.en_cada_base(registrar)}")
+    finally:
+        shard_router.dispose()
+        engine.dispose()
+
+def migrar_ids(engine) -> int:
+    """
+    Reconstruye la tabla tareas de una base de datos SQLite con AUTOINCREMENT.
+    
+    Retorna 1 si la migró y 0 si ya lo tenía. La secuencia se inicia después
+    del id más alto de tareas y de tareas_archivo. La reconstrucción es una
+    sola transacción; los índices y triggers se vuelven a crear al final.
+    """
+    from sqlalchemy.orm import Session
+    from sqlalchemy.schema import CreateTable
+    from app import models
+    from app.archivo import ids_monotonos
+    
+    models.Base.metadata.create_all(bind=engine)
+    with Session(engine) as db:
+        if ids_monotonos(db):
+            return 0
+        tabla = models.Tarea.__table__
+        columnas = ", ".join(columna.name for columna in tabla.columns)
+        ddl = str(CreateTable(tabla).compile(dialect=engine.dialect))
+        # El RENAME comprueba todo el esquema: un trigger de otra tabla que lee
+        # tareas (como el de las lápidas de tareas_archivo) lo haría fallar
+        # mientras tareas no existe. Los de tareas desaparecen con el DROP
+        triggers = db.execute(text(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name != 'tareas'"
+        )).scalars().all()
+        for trigger in triggers:
+            db.execute(text(f'DROP TRIGGER "{trigger}"'))
+        db.execute(text(ddl.replace("CREATE TABLE tareas ", "CREATE TABLE tareas_migracion ", 1)))
+        db.execute(text(f"INSERT INTO tareas_migracion ({columnas}) SELECT {columnas} FROM tareas"))
+        db.execute(text("DROP TABLE tareas"))
+        db.execute(text("ALTER TABLE tareas_migracion RENAME TO tareas"))
+        db.execute(text(
+            "INSERT INTO sqlite_sequence (name, seq) SELECT 'tareas', 0 "
+            "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'tareas')"
+        ))
+        db.execute(text(
+            "UPDATE sqlite_sequence SET seq = max(seq, (SELECT coalesce(max(id), 0) FROM tareas_archivo)) "
+            "WHERE name = 'tareas'"
+        ))
+        db.commit()
+    models.Base.metadata.create_all(bind=engine)
+    return 1
+
+def ids_crecientes(database_url: Optional[str] = None) -> None:
+    """
+    Añade AUTOINCREMENT a la tabla tareas en la base de datos principal y en
+    los shards SQLite que todavía no lo tengan.
+    
+    Sin AUTOINCREMENT, SQLite asigna a una tarea nueva el id más alto más uno y
+    puede repetir el id de una tarea eliminada o archivada.
+    """
+    from app.config import settings
+    from app.shards import shard_router
+    
+    engine = create_engine(database_url or settings.DATABASE_URL)
+    try:
+        migradas = sum(migrar_ids(base) for base in [engine, *shard_router.shards.values()])
+        print(f"Bases de datos migradas: {migradas}")
+    finally:
+        shard_router.dispose()
+        engine.dispose()
+
+def archivar(dias: Optional[int] = None) -> None:
+    """
+    Mueve a tareas_archivo las tareas completadas sin cambios en `dias` días
+    (ARCHIVO_DIAS por defecto) de la base de datos principal y de los shards.
+    """
+    from app import models
+    from app.archivo import archivar_todo
+    from app.database import engine
+    from app.shards import shard_router
+    
+    models.Base.metadata.create_all(bind=engine)
+    shard_router.crear_tablas()
+    try:
+        print(f"Tareas archivadas: {archivar_todo(dias)}")
+    finally:
+        shard_router.dispose()
+        engine.dispose()
+
+def rebalancear_shards(
+    usuario_id: Optional[int] = None,
+    destino: Optional[str] = None,
+    limite: Optional[int] = None,
+    espera: Optional[float] = None
+) -> None:
+    """
+    Mueve tareas entre los shards configurados en TAREAS_SHARDS.
+    
+    - Con --usuario mueve a ese usuario a --destino (por defecto, el shard que
+      le corresponde en el anillo)
+    - Sin --usuario mueve a todos los usuarios que no están en el shard del
+      anillo, incluidos los que tienen tareas anteriores al reparto en la base
+      de datos principal (hasta --limite usuarios)
+    """
+    from app.shards import shard_router, mover_usuarios, pendientes_de_rebalanceo
+    
+    if not shard_router.habilitado:
+        print("No hay shards configurados (TAREAS_SHARDS)")
+        return
+    try:
+        shard_router.crear_tablas()
+        if usuario_id is not None:
+            movimientos = [(usuario_id, destino or shard_router.anillo.shard_para(usuario_id))]
+        else:
+            movimientos = [
+                (uid, objetivo) for uid, _, objetivo in pendientes_de_rebalanceo(shard_router)
+            ][:limite]
+        print(f"Usuarios a mover: {len(movimientos)}")
+        copiadas = mover_usuarios(shard_router, movimientos, espera)
+        print(f"Tareas copiadas: {copiadas}")
+    finally:
+        shard_router.dispose()
+
 if __name__ == "__main__":
-    migrate_database() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Migraciones de la base de datos")
+    parser.add_argument(
+        "comando",
+        nargs="?",
+        default="recrear",
+        choices=[
+            "recrear", "indices", "estadisticas", "busqueda", "sugerencias", "shards", "archivar", "cambios", "ids",
+            "usuarios"
+        ],
+        help="recrear: reconstruye tareas.db desde un backup; indices: crea los índices que falten; "
+             "estadisticas: recalcula los contadores de tareas_stats; "
+             "busqueda: reconstruye el índice de texto completo; "
+             "sugerencias: reconstruye el índice de prefijos del autocompletado; "
+             "shards: mueve tareas de usuarios entre shards; "
+             "archivar: mueve las tareas completadas antiguas a tareas_archivo; "
+             "cambios: registra las tareas existentes para la sincronización incremental; "
+             "ids: añade AUTOINCREMENT a tareas para no reutilizar ids archivados; "
+             "usuarios: lista los usuarios que solo difieren en mayúsculas"
+    )
+    parser.add_argument("--database-url", help="URL de la base de datos (por defecto DATABASE_URL)")
+    parser.add_argument("--usuario", type=int, help="shards: usuario a mover")
+    parser.add_argument("--destino", help="shards: shard de destino del usuario")
+    parser.add_argument("--limite", type=int, help="shards: máximo de usuarios a mover")
+    parser.add_argument(
+        "--espera", type=float,
+        help="shards: segundos de espera antes de borrar el origen (por defecto SHARDS_CACHE_SECONDS)"
+    )
+    parser.add_argument("--dias", type=int, help="archivar: días sin cambios (por defecto ARCHIVO_DIAS)")
+    args = parser.parse_args()
+    
+    if args.comando == "indices":
+        crear_indices(args.database_url)
+    elif args.comando == "estadisticas":
+        reconstruir_estadisticas(args.database_url)
+    elif args.comando == "busqueda":
+        reconstruir_busqueda(args.database_url)
+    elif args.comando == "sugerencias":
+        reconstruir_sugerencias(args.database_url)
+    elif args.comando == "shards":
+        rebalancear_shards(args.usuario, args.destino, args.limite, args.espera)
+    elif args.comando == "archivar":
+        archivar(args.dias)
+    elif args.comando == "cambios":
+        registrar_cambios()
+    elif args.comando == "ids":
+        ids_crecientes(args.database_url)
+    elif args.comando == "usuarios":
+        if comprobar_usuarios(args.database_url):
+            raise SystemExit(1)
+    else:
+        migrate_database() 
\ No newline at end of file
@@ -2,12 +2,17 @@
 Configuración de pruebas para la aplicación de Lista de Tareas
 """
 import pytest
+from collections import namedtuple
+from contextlib import contextmanager
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 from app.main import app
+from app import models
 from app.database import Base
-from app.main import get_db
+from app.main import get_db, get_read_db
+import app.main as main_module
+from app.replicas import router as replica_router
 from app.config import settings
 
 # Configuración de base de datos SQLite en memoria para tests
@@ -32,7 +37,27 @@ def db_session():
         session.close()
 
 @pytest.fixture(scope="function")
-def client(db_session):
+def fresh_db(tmp_path):
+    """
+    Sesión sobre una base de datos SQLite nueva con el esquema actual completo.
+    
+    A diferencia de test.db, que se reutiliza entre ejecuciones, incluye siempre
+    los índices y objetos que se hayan añadido al esquema.
+    """
+    fresh_engine = create_engine(
+        f"sqlite:///{tmp_path / 'fresh.db'}",
+        connect_args={"check_same_thread": False}
+    )
+    Base.metadata.create_all(bind=fresh_engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=fresh_engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+        fresh_engine.dispose()
+
+@pytest.fixture(scope="function")
+def client(db_session, monkeypatch):
     """Cliente de prueba que usa la sesión de base de datos del test"""
     def override_get_db():
         try:
@@ -46,7 +71,22 @@ def client(db_session):
     settings.LOGIN_RATE_LIMIT_PER_MINUTE = 1000000
     settings.TASK_RATE_LIMIT_PER_MINUTE = 1000000
     
+    def override_get_read_db():
+        # Sesión propia, como en la aplicación: una lectura abierta no debe
+        # ocultar bloqueos con la sesión de escritura
+        db = TestingSessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+    
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_read_db
+    # El middleware de autenticación y la exportación abren sus propias
+    # sesiones de lectura: también deben leer la base de datos de pruebas
+    monkeypatch.setattr(replica_router, "primary_read_factory", TestingSessionLocal)
+    # Igual que las tareas en segundo plano, que abren sesiones al terminar la solicitud
+    monkeypatch.setattr(main_module, "SessionLocal", TestingSessionLocal)
     with TestClient(app) as test_client:
         yield test_client
     app.dependency_overrides.clear()
@@ -60,6 +100,40 @@ def clean_db(db_session):
     db_session.commit()
     yield
 
+@pytest.fixture
+def usuario(fresh_db):
+    """Usuario propietario de las tareas de prueba en fresh_db"""
+    usuario = models.Usuario(email="usuario@example.com", username="usuario", hashed_password="x")
+    fresh_db.add(usuario)
+    fresh_db.commit()
+    # Cargado, para que leer usuario.id no ejecute un SELECT en las pruebas
+    # que cuentan sentencias
+    fresh_db.refresh(usuario)
+    return usuario
+
+Sentencia = namedtuple("Sentencia", ["sql", "parametros", "opciones"])
+
+@pytest.fixture
+def sentencias():
+    """
+    Registra las sentencias que se ejecutan sobre un engine dentro del bloque:
+    `with sentencias(engine) as ejecutadas: ...`. Cada elemento es una
+    Sentencia con el SQL, sus parámetros y las opciones de ejecución.
+    """
+    @contextmanager
+    def capturar(engine):
+        ejecutadas = []
+
+        def registrar(conn, cursor, statement, parameters, context, executemany):
+            ejecutadas.append(Sentencia(statement, parameters, context.execution_options))
+
+        event.listen(engine, "before_cursor_execute", registrar)
+        try:
+            yield ejecutadas
+        finally:
+            event.remove(engine, "before_cursor_execute", registrar)
+    return capturar
+
 @pytest.fixture
 def test_user_data():
     """Datos de usuario de prueba"""
@@ -98,6 +172,16 @@ def test_tarea_data_2():
         "prioridad": 2
     }
 
+@pytest.fixture
+def crear_tareas(client, auth_headers):
+    """Crea tareas con los títulos indicados mediante POST /tareas y devuelve sus ids"""
+    def crear(titulos):
+        return [
+            client.post("/tareas", json={"titulo": titulo}, headers=auth_headers).json()["id"]
+            for titulo in titulos
+        ]
+    return crear
+
 @pytest.fixture
 def auth_headers(client, clean_db, test_user_data):
     """Fixture para obtener headers de autenticación"""
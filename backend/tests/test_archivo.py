@@ -0,0 +1,304 @@
+"""
+Pruebas para el archivado de tareas completadas antiguas
+"""
+import pytest
+from fastapi import HTTPException
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import create_engine, event, text, update
+from sqlalchemy.orm import sessionmaker
+from app import models, schemas, crud
+from app.archivo import archivar_tareas, ids_monotonos
+from migrate_db import migrar_ids
+from tests.test_cambios import sincronizar
+
+
+@pytest.fixture
+def tareas(fresh_db, usuario):
+    """
+    Diez tareas: las de índice par están completadas y las cinco primeras
+    tienen un año sin cambios. Solo 0, 2 y 4 deben archivarse.
+    """
+    nuevas = [
+        models.Tarea(
+            titulo=f"Informe {i:02d}",
+            descripcion=f"Descripción {i}",
+            completado=i % 2 == 0,
+            usuario_id=usuario.id
+        )
+        for i in range(10)
+    ]
+    fresh_db.add_all(nuevas)
+    fresh_db.commit()
+    for tarea in nuevas:
+        crud._indexar_prefijos(fresh_db, tarea)
+    hace_un_anio = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=365)
+    ids_antiguos = [tarea.id for tarea in nuevas[:5]]
+    fresh_db.execute(
+        update(models.Tarea.__table__)
+        .where(models.Tarea.id.in_(ids_antiguos))
+        .values(created_at=hace_un_anio, updated_at=hace_un_anio)
+    )
+    fresh_db.commit()
+    return [tarea.id for tarea in nuevas]
+
+
+# Esquema de usuarios y tareas anterior a los cambios de rendimiento, sin
+# AUTOINCREMENT en tareas
+ESQUEMA_ORIGINAL = [
+    """
+    CREATE TABLE usuarios (
+        id INTEGER NOT NULL,
+        email VARCHAR(255) NOT NULL,
+        username VARCHAR(50) NOT NULL,
+        hashed_password VARCHAR(255) NOT NULL,
+        is_active BOOLEAN NOT NULL,
+        created_at DATETIME DEFAULT (CURRENT_TIMESTAMP) NOT NULL,
+        last_login DATETIME,
+        PRIMARY KEY (id)
+    )
+    """,
+    "CREATE INDEX ix_usuarios_id ON usuarios (id)",
+    "CREATE UNIQUE INDEX ix_usuarios_email ON usuarios (email)",
+    "CREATE UNIQUE INDEX ix_usuarios_username ON usuarios (username)",
+    """
+    CREATE TABLE tareas (
+        id INTEGER NOT NULL,
+        titulo VARCHAR(100) NOT NULL,
+        descripcion TEXT,
+        completado BOOLEAN NOT NULL,
+        prioridad INTEGER NOT NULL,
+        fecha_vencimiento DATETIME,
+        created_at DATETIME DEFAULT (CURRENT_TIMESTAMP) NOT NULL,
+        updated_at DATETIME,
+        usuario_id INTEGER NOT NULL,
+        PRIMARY KEY (id),
+        FOREIGN KEY(usuario_id) REFERENCES usuarios (id) ON DELETE CASCADE
+    )
+    """,
+    "CREATE INDEX ix_tareas_id ON tareas (id)",
+    "CREATE INDEX ix_tareas_titulo ON tareas (titulo)",
+]
+
+
+def ids_activos(db):
+    return sorted(db.execute(text("SELECT id FROM tareas")).scalars())
+
+
+def ids_archivados(db):
+    return sorted(db.execute(text("SELECT id FROM tareas_archivo")).scalars())
+
+
+@pytest.mark.database
+@pytest.mark.unit
+class TestArchivado:
+    """Pruebas del movimiento de tareas a tareas_archivo"""
+
+    def test_archiva_solo_completadas_antiguas(self, fresh_db, usuario, tareas):
+        """Las pendientes y las recientes siguen en tareas"""
+        assert archivar_tareas(fresh_db, dias=30) == 3
+        esperadas = [tareas[0], tareas[2], tareas[4]]
+        assert ids_archivados(fresh_db) == esperadas
+        assert ids_activos(fresh_db) == [t for t in tareas if t not in esperadas]
+
+    def test_lotes_pequenos(self, fresh_db, usuario, tareas):
+        """El recorrido por keyset archiva todo aunque el lote sea menor"""
+        assert archivar_tareas(fresh_db, dias=30, lote=1) == 3
+        assert archivar_tareas(fresh_db, dias=30, lote=1) == 0
+
+    def test_no_reutiliza_ids_archivados(self, fresh_db, usuario, tareas):
+        """Una tarea nueva nunca recibe el id de una tarea archivada, aunque sea el más alto"""
+        fresh_db.execute(update(models.Tarea.__table__).values(completado=True))
+        fresh_db.commit()
+        assert archivar_tareas(fresh_db, dias=0, ahora=datetime.now(timezone.utc) + timedelta(days=1)) == 10
+        nueva = crud.create_tarea(fresh_db, schemas.TareaCreate(titulo="Nueva"), usuario.id)
+        assert nueva.id > tareas[-1]
+        items, total, _ = crud.get_tareas(fresh_db, usuario.id, limit=20, incluir_archivadas=True)
+        assert total == 11
+        assert len({t.id for t in items}) == 11
+
+    def test_no_archiva_tareas_que_cambian_durante_el_lote(self, fresh_db, usuario, tareas):
+        """Una tarea reabierta después de elegir los ids sigue en tareas"""
+        reabrir = tareas[2]
+
+        def reabrir_antes_del_delete(conn, cursor, statement, parameters, context, executemany):
+            if statement.startswith("DELETE FROM tareas "):
+                cursor.execute("UPDATE tareas SET completado = 0 WHERE id = ?", (reabrir,))
+
+        engine = fresh_db.get_bind()
+        event.listen(engine, "before_cursor_execute", reabrir_antes_del_delete)
+        try:
+            assert archivar_tareas(fresh_db, dias=30) == 2
+        finally:
+            event.remove(engine, "before_cursor_execute", reabrir_antes_del_delete)
+        assert ids_archivados(fresh_db) == [tareas[0], tareas[4]]
+        assert reabrir in ids_activos(fresh_db)
+
+    def test_sin_autoincrement_no_archiva(self, tmp_path):
+        """Una base de datos anterior, sin AUTOINCREMENT en tareas, no se archiva hasta migrarla"""
+        engine = create_engine(f"sqlite:///{tmp_path / 'antigua.db'}")
+        with engine.begin() as conn:
+            conn.execute(text("CREATE TABLE tareas (id INTEGER PRIMARY KEY, titulo VARCHAR(100))"))
+        db = sessionmaker(bind=engine)()
+        try:
+            assert not ids_monotonos(db)
+            assert archivar_tareas(db, dias=0) == 0
+        finally:
+            db.close()
+            engine.dispose()
+
+    def test_migrar_base_de_datos_anterior(self, tmp_path):
+        """La migración añade AUTOINCREMENT a una base de datos con el esquema original"""
+        engine = create_engine(f"sqlite:///{tmp_path / 'antigua.db'}")
+        with engine.begin() as conn:
+            for sentencia in ESQUEMA_ORIGINAL:
+                conn.execute(text(sentencia))
+            conn.execute(text(
+                "INSERT INTO usuarios (id, email, username, hashed_password, is_active) "
+                "VALUES (1, 'antigua@example.com', 'antigua', 'x', 1)"
+            ))
+            for i in range(1, 4):
+                conn.execute(text(
+                    "INSERT INTO tareas (id, titulo, completado, prioridad, usuario_id) "
+                    f"VALUES ({i}, 'Informe {i}', 1, 1, 1)"
+                ))
+        try:
+            assert migrar_ids(engine) == 1
+            assert migrar_ids(engine) == 0
+            db = sessionmaker(bind=engine)()
+            try:
+                assert ids_monotonos(db)
+                db.execute(update(models.Tarea.__table__).values(created_at=datetime(2000, 1, 1), updated_at=None))
+                db.commit()
+                assert archivar_tareas(db, dias=30) == 3
+                nueva = crud.create_tarea(db, schemas.TareaCreate(titulo="Nueva"), 1)
+                assert nueva.id == 4
+                assert crud.get_tareas_stats(db, 1).total == 1
+                assert [s.id for s in crud.get_sugerencias(db, 1, "nue")] == [4]
+                crud.delete_tarea(db, 2, 1)
+                assert sincronizar(db, models.Usuario(id=1))[1] == [2]
+            finally:
+                db.close()
+        finally:
+            engine.dispose()
+
+    def test_triggers_limpian_indices_y_contadores(self, fresh_db, usuario, tareas):
+        """Las tareas archivadas salen de tareas_stats, del índice de búsqueda y de los prefijos"""
+        archivar_tareas(fresh_db, dias=30)
+        stats = crud.get_tareas_stats(fresh_db, usuario.id)
+        assert stats.total == 7
+        assert stats.completadas == 2
+        archivados = ", ".join(str(i) for i in ids_archivados(fresh_db))
+        assert fresh_db.execute(
+            text(f"SELECT count(*) FROM tareas_fts WHERE rowid IN ({archivados})")
+        ).scalar() == 0
+        assert fresh_db.execute(
+            text(f"SELECT count(*) FROM tarea_prefijos WHERE tarea_id IN ({archivados})")
+        ).scalar() == 0
+
+
+@pytest.mark.database
+@pytest.mark.unit
+class TestListadoConArchivadas:
+    """Pruebas de GET /tareas con incluir_archivadas"""
+
+    def test_listado_por_defecto_excluye_archivadas(self, fresh_db, usuario, tareas):
+        archivar_tareas(fresh_db, dias=30)
+        items, total, _ = crud.get_tareas(fresh_db, usuario.id, limit=20)
+        assert total == 7
+        assert sorted(t.id for t in items) == ids_activos(fresh_db)
+
+    def test_incluir_archivadas_une_ambas_tablas(self, fresh_db, usuario, tareas):
+        archivar_tareas(fresh_db, dias=30)
+        items, total, _ = crud.get_tareas(
+            fresh_db, usuario.id, limit=20, ordenar_por="titulo", orden="asc", incluir_archivadas=True
+        )
+        assert total == 10
+        assert [t.id for t in items] == tareas
+        assert [t.titulo for t in items] == [f"Informe {i:02d}" for i in range(10)]
+
+    def test_cursor_y_filtros_sobre_la_union(self, fresh_db, usuario, tareas):
+        """Los filtros, la búsqueda y el cursor se aplican a la unión"""
+        archivar_tareas(fresh_db, dias=30)
+        vistos, cursor = [], None
+        while True:
+            items, total, cursor = crud.get_tareas(
+                fresh_db, usuario.id, limit=2, completado=True, buscar="informe",
+                cursor=cursor, incluir_archivadas=True
+            )
+            vistos += [t.id for t in items]
+            if cursor is None:
+                break
+        assert total == 5
+        assert sorted(vistos) == tareas[::2]
+
+    def test_total_aproximado_no_usa_contadores(self, fresh_db, usuario, tareas):
+        """tareas_stats no cuenta las archivadas, así que el total se calcula"""
+        archivar_tareas(fresh_db, dias=30)
+        assert crud.get_tareas_count(fresh_db, usuario.id, aproximado=True) == 7
+        assert crud.get_tareas_count(fresh_db, usuario.id, aproximado=True, incluir_archivadas=True) == 10
+
+
+@pytest.mark.database
+@pytest.mark.unit
+class TestArchivadasPorId:
+    """Las tareas archivadas se consultan, editan y eliminan por id"""
+
+    def test_consultar(self, fresh_db, usuario, tareas):
+        archivar_tareas(fresh_db, dias=30)
+        tarea = crud.get_tarea(fresh_db, tareas[0], usuario.id)
+        assert (tarea.id, tarea.titulo) == (tareas[0], "Informe 00")
+        campos = crud.parse_campos("titulo")
+        parcial = crud.get_tarea(fresh_db, tareas[2], usuario.id, campos)
+        assert schemas.TareaParcial.desde(parcial, campos).model_dump() == {"id": tareas[2], "titulo": "Informe 02"}
+        assert crud.get_tarea(fresh_db, tareas[0], usuario.id + 1) is None
+
+    def test_batch(self, fresh_db, usuario, tareas):
+        archivar_tareas(fresh_db, dias=30)
+        encontradas, no_encontradas = crud.get_tareas_por_ids(
+            fresh_db, usuario.id, [tareas[1], tareas[0], 9999, tareas[4]]
+        )
+        assert [t.id for t in encontradas] == [tareas[1], tareas[0], tareas[4]]
+        assert no_encontradas == [9999]
+
+    def test_eliminar(self, fresh_db, usuario, tareas):
+        archivar_tareas(fresh_db, dias=30)
+        crud.delete_tarea(fresh_db, tareas[0], usuario.id)
+        assert tareas[0] not in ids_archivados(fresh_db)
+        with pytest.raises(HTTPException) as exc_info:
+            crud.delete_tarea(fresh_db, tareas[2], usuario.id + 1)
+        assert exc_info.value.status_code == 404
+        assert tareas[2] in ids_archivados(fresh_db)
+
+    def test_editar_la_restaura(self, fresh_db, usuario, tareas):
+        """Editar una tarea archivada la devuelve a tareas con sus índices y contadores"""
+        archivar_tareas(fresh_db, dias=30)
+        tarea = crud.update_tarea(fresh_db, tareas[2], usuario.id, schemas.TareaUpdate(completado=False))
+        assert (tarea.id, tarea.titulo, tarea.completado) == (tareas[2], "Informe 02", False)
+        assert tareas[2] in ids_activos(fresh_db)
+        assert tareas[2] not in ids_archivados(fresh_db)
+        assert crud.get_tareas_stats(fresh_db, usuario.id).total == 8
+        assert [s.id for s in crud.get_sugerencias(fresh_db, usuario.id, "inf", limit=20)].count(tareas[2]) == 1
+        assert [t.id for t in crud.get_tareas(fresh_db, usuario.id, buscar="informe", limit=20)[0]].count(tareas[2]) == 1
+
+
+@pytest.mark.database
+@pytest.mark.unit
+class TestArchivadoYSincronizacion:
+    """Archivar no elimina: la sincronización incremental no ve lápidas"""
+
+    def test_archivar_no_deja_lapidas(self, fresh_db, usuario, tareas):
+        _, _, cursor, _ = sincronizar(fresh_db, usuario)
+        archivar_tareas(fresh_db, dias=30)
+        assert sincronizar(fresh_db, usuario, cursor)[:2] == ({}, [])
+        items, eliminadas, _, _ = sincronizar(fresh_db, usuario)
+        assert sorted(items) == tareas
+        assert eliminadas == []
+
+    def test_eliminar_o_restaurar_archivada(self, fresh_db, usuario, tareas):
+        archivar_tareas(fresh_db, dias=30)
+        _, _, cursor, _ = sincronizar(fresh_db, usuario)
+        crud.delete_tarea(fresh_db, tareas[0], usuario.id)
+        crud.update_tarea(fresh_db, tareas[2], usuario.id, schemas.TareaUpdate(titulo="Restaurada"))
+        items, eliminadas, _, _ = sincronizar(fresh_db, usuario, cursor)
+        assert items == {tareas[2]: "Restaurada"}
+        assert eliminadas == [tareas[0]]
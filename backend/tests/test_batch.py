@@ -0,0 +1,77 @@
+"""
+Pruebas para la obtención de varias tareas por id
+"""
+import pytest
+from fastapi import HTTPException
+from app import models, schemas, crud
+from app.config import settings
+
+
+@pytest.fixture
+def usuarios(fresh_db, usuario):
+    """Dos usuarios con tres tareas cada uno"""
+    otro = models.Usuario(email="otro@example.com", username="otro", hashed_password="x")
+    fresh_db.add(otro)
+    fresh_db.commit()
+    propias = [r.tarea.id for r in crud.create_tareas_bulk(
+        fresh_db, [{"titulo": f"Propia {i}", "prioridad": i + 1} for i in range(3)], usuario.id
+    ).resultados]
+    ajenas = [r.tarea.id for r in crud.create_tareas_bulk(
+        fresh_db, [{"titulo": f"Ajena {i}"} for i in range(3)], otro.id
+    ).resultados]
+    return usuario.id, propias, ajenas
+
+
+@pytest.mark.database
+@pytest.mark.unit
+class TestTareasPorIds:
+    """Pruebas de GET /tareas/batch"""
+
+    def test_orden_de_entrada_y_no_encontradas(self, fresh_db, usuarios):
+        usuario_id, propias, ajenas = usuarios
+        ids = [propias[2], 9999, propias[0], ajenas[0], propias[1]]
+        tareas, no_encontradas = crud.get_tareas_por_ids(fresh_db, usuario_id, ids)
+        assert [t.id for t in tareas] == [propias[2], propias[0], propias[1]]
+        assert no_encontradas == [9999, ajenas[0]]
+
+    def test_una_sola_consulta(self, fresh_db, usuarios, sentencias):
+        usuario_id, propias, _ = usuarios
+        with sentencias(fresh_db.get_bind()) as ejecutadas:
+            tareas, _ = crud.get_tareas_por_ids(fresh_db, usuario_id, propias)
+            [schemas.Tarea.model_validate(tarea) for tarea in tareas]
+        assert len(ejecutadas) == 1
+        assert "IN (" in ejecutadas[0].sql
+
+    def test_campos(self, fresh_db, usuarios):
+        usuario_id, propias, _ = usuarios
+        campos = crud.parse_campos("titulo")
+        tareas, _ = crud.get_tareas_por_ids(fresh_db, usuario_id, propias[:1], campos)
+        assert schemas.TareaParcial.desde(tareas[0], campos).model_dump() == {"id": propias[0], "titulo": "Propia 0"}
+
+    def test_parse_ids(self):
+        assert crud.parse_ids("3, 1,3,,2") == [3, 1, 2]
+        for invalido in ("1,a", "", ",".join(str(i) for i in range(settings.TAREAS_BATCH_MAX + 1))):
+            with pytest.raises(HTTPException) as exc_info:
+                crud.parse_ids(invalido)
+            assert exc_info.value.status_code == 422
+
+
+@pytest.mark.api
+@pytest.mark.unit
+class TestTareasPorIdsApi:
+    """Pruebas de GET /tareas/batch a través de la API"""
+
+    def test_requires_authentication(self, client, clean_db):
+        assert client.get("/tareas/batch?ids=1").status_code == 401
+
+    def test_batch(self, client, auth_headers, crear_tareas):
+        """Devuelve las tareas en el orden pedido, sin confundir la ruta con /tareas/{tarea_id}"""
+        ids = crear_tareas(["Uno", "Dos"])
+        response = client.get(f"/tareas/batch?ids={ids[1]},9999,{ids[0]}&fields=titulo", headers=auth_headers)
+        assert response.status_code == 200
+        data = response.json()
+        assert data["items"] == [{"id": ids[1], "titulo": "Dos"}, {"id": ids[0], "titulo": "Uno"}]
+        assert data["no_encontradas"] == [9999]
+
+        response = client.get("/tareas/batch?ids=1,a", headers=auth_headers)
+        assert response.status_code == 422
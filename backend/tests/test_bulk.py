@@ -0,0 +1,80 @@
+"""
+Pruebas para la creación de tareas en lote
+"""
+import pytest
+from sqlalchemy import select
+from app import models, crud
+from app.config import settings
+
+
+@pytest.mark.database
+@pytest.mark.unit
+class TestCrearTareasBulk:
+    """Pruebas de POST /tareas/bulk"""
+
+    def test_crea_todas_en_orden(self, fresh_db, usuario):
+        items = [{"titulo": f"Importada {i}", "prioridad": i % 3 + 1} for i in range(50)]
+        respuesta = crud.create_tareas_bulk(fresh_db, items, usuario.id)
+
+        assert (respuesta.creadas, respuesta.rechazadas) == (50, 0)
+        assert [r.indice for r in respuesta.resultados] == list(range(50))
+        assert [r.tarea.titulo for r in respuesta.resultados] == [item["titulo"] for item in items]
+        assert crud.get_tareas_stats(fresh_db, usuario.id).total == 50
+        sugeridas = crud.get_sugerencias(fresh_db, usuario.id, "impor", limit=100)
+        assert {s.id for s in sugeridas} == {r.tarea.id for r in respuesta.resultados}
+
+    def test_un_solo_insert_de_tareas(self, fresh_db, usuario, sentencias):
+        """Las tareas se insertan con un INSERT de varias filas, sin SELECT posteriores"""
+        # Como las sesiones de la aplicación, que no expiran los objetos al confirmar
+        fresh_db.expire_on_commit = False
+        with sentencias(fresh_db.get_bind()) as ejecutadas:
+            crud.create_tareas_bulk(fresh_db, [{"titulo": f"Tarea {i}"} for i in range(200)], usuario.id)
+        inserts = [s for s in ejecutadas if s.sql.startswith("INSERT INTO tareas ")]
+        assert len(inserts) == 1
+        assert not [s for s in ejecutadas if s.sql.startswith("SELECT")]
+
+    def test_errores_por_item(self, fresh_db, usuario):
+        """Los elementos inválidos se informan en su posición y el resto se crea"""
+        items = [{"titulo": "Válida"}, {"titulo": ""}, "no es una tarea", {"titulo": "Otra", "prioridad": 7}]
+        respuesta = crud.create_tareas_bulk(fresh_db, items, usuario.id)
+
+        assert (respuesta.creadas, respuesta.rechazadas) == (1, 3)
+        assert respuesta.resultados[0].tarea.titulo == "Válida"
+        assert respuesta.resultados[1].errores[0]["loc"] == ("titulo",)
+        assert respuesta.resultados[2].errores[0]["type"] == "model_type"
+        assert respuesta.resultados[3].errores[0]["loc"] == ("prioridad",)
+        assert all(r.tarea is None for r in respuesta.resultados[1:])
+        assert fresh_db.execute(select(models.Tarea.titulo)).scalars().all() == ["Válida"]
+
+    def test_sin_tareas_validas_no_escribe(self, fresh_db, usuario, sentencias):
+        with sentencias(fresh_db.get_bind()) as ejecutadas:
+            respuesta = crud.create_tareas_bulk(fresh_db, [{"prioridad": 2}], usuario.id)
+        assert (respuesta.creadas, respuesta.rechazadas) == (0, 1)
+        assert not [s for s in ejecutadas if s.sql.startswith("INSERT")]
+
+
+@pytest.mark.api
+@pytest.mark.unit
+class TestCrearTareasBulkApi:
+    """Pruebas de POST /tareas/bulk a través de la API"""
+
+    def test_requires_authentication(self, client, clean_db):
+        assert client.post("/tareas/bulk", json=[{"titulo": "Uno"}]).status_code == 401
+
+    def test_bulk_create(self, client, auth_headers):
+        """201 si se crean todas y 207 si alguna se rechaza"""
+        response = client.post("/tareas/bulk", json=[{"titulo": "Uno"}, {"titulo": "Dos"}], headers=auth_headers)
+        assert response.status_code == 201
+        assert response.json()["creadas"] == 2
+
+        response = client.post("/tareas/bulk", json=[{"titulo": "Tres"}, {"titulo": ""}], headers=auth_headers)
+        assert response.status_code == 207
+        data = response.json()
+        assert (data["creadas"], data["rechazadas"]) == (1, 1)
+        assert data["resultados"][1]["errores"]
+
+    def test_bulk_create_too_many(self, client, auth_headers, monkeypatch):
+        """Por encima de TAREAS_BULK_MAX responde 413"""
+        monkeypatch.setattr(settings, "TAREAS_BULK_MAX", 2)
+        response = client.post("/tareas/bulk", json=[{"titulo": "T"}] * 3, headers=auth_headers)
+        assert response.status_code == 413
@@ -0,0 +1,109 @@
+"""
+Pruebas para la búsqueda de tareas por texto completo
+"""
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import text
+from app import models, schemas, crud
+from tests.test_tareas_queries import query_plan
+
+
+@pytest.fixture
+def tareas(fresh_db, usuario):
+    """Tareas con textos variados para buscar"""
+    datos = [
+        ("Comprar café", "Grano de Colombia para la oficina"),
+        ("Reunión de equipo", "Revisar el informe del café"),
+        ("Informe trimestral", "Preparar gráficos de ventas"),
+        ("Llamar al cafetero", None),
+        ("Desayuno", "Comprar pan y mermelada"),
+    ]
+    return [
+        crud.create_tarea(fresh_db, schemas.TareaCreate(titulo=titulo, descripcion=descripcion), usuario.id)
+        for titulo, descripcion in datos
+    ]
+
+
+def titulos(items):
+    return [t.titulo for t in items]
+
+
+@pytest.mark.database
+@pytest.mark.unit
+class TestBusquedaTexto:
+    """Pruebas de la búsqueda por palabras con el índice FTS5"""
+
+    def test_results_ranked_by_relevance(self, fresh_db, usuario, tareas):
+        """Una coincidencia en el título pesa más que en la descripción"""
+        items, total, _ = crud.get_tareas(fresh_db, usuario.id, buscar="cafe")
+        assert total == 3
+        assert set(titulos(items)[:2]) == {"Comprar café", "Llamar al cafetero"}
+        assert titulos(items)[2] == "Reunión de equipo"
+
+    def test_all_words_must_match(self, fresh_db, usuario, tareas):
+        """Todas las palabras deben aparecer, en cualquier orden"""
+        items, total, _ = crud.get_tareas(fresh_db, usuario.id, buscar="oficina comprar")
+        assert titulos(items) == ["Comprar café"]
+        assert total == 1
+
+    def test_search_is_token_based(self, fresh_db, usuario, tareas):
+        """El modo texto busca palabras; el modo subcadena conserva el ILIKE"""
+        items, _, _ = crud.get_tareas(fresh_db, usuario.id, buscar="forme")
+        assert items == []
+        items, total, _ = crud.get_tareas(fresh_db, usuario.id, buscar="forme", modo_busqueda="subcadena")
+        assert total == 2
+        assert set(titulos(items)) == {"Reunión de equipo", "Informe trimestral"}
+
+    def test_index_follows_writes(self, fresh_db, usuario, tareas):
+        """Actualizar o eliminar una tarea actualiza el índice de búsqueda"""
+        crud.update_tarea(fresh_db, tareas[2].id, usuario.id, schemas.TareaUpdate(titulo="Balance anual"))
+        assert crud.get_tareas_count(fresh_db, usuario.id, buscar="trimestral") == 0
+        assert crud.get_tareas_count(fresh_db, usuario.id, buscar="balance") == 1
+        crud.delete_tarea(fresh_db, tareas[0].id, usuario.id)
+        assert crud.get_tareas_count(fresh_db, usuario.id, buscar="colombia") == 0
+
+    def test_search_limited_to_owner(self, fresh_db, usuario, tareas):
+        """Las tareas de otros usuarios no aparecen en la búsqueda"""
+        otro = models.Usuario(email="otro@example.com", username="otro", hashed_password="x")
+        fresh_db.add(otro)
+        fresh_db.commit()
+        crud.create_tarea(fresh_db, schemas.TareaCreate(titulo="Café del otro"), otro.id)
+        assert crud.get_tareas_count(fresh_db, usuario.id, buscar="cafe") == 3
+        assert crud.get_tareas_count(fresh_db, otro.id, buscar="cafe") == 1
+
+    def test_cursor_pagination_by_relevance(self, fresh_db, usuario, tareas):
+        """Los resultados ordenados por relevancia se pueden recorrer con cursor"""
+        completos, _, _ = crud.get_tareas(fresh_db, usuario.id, buscar="cafe")
+        primera, _, cursor = crud.get_tareas(fresh_db, usuario.id, buscar="cafe", limit=2)
+        segunda, _, siguiente = crud.get_tareas(fresh_db, usuario.id, buscar="cafe", limit=2, cursor=cursor)
+        assert [t.id for t in primera + segunda] == [t.id for t in completos]
+        assert siguiente is None
+
+    def test_search_uses_fts_index(self, fresh_db, usuario, tareas):
+        """La búsqueda consulta el índice de texto en lugar de recorrer tareas"""
+        plan = query_plan(fresh_db, lambda: crud.get_tareas(fresh_db, usuario.id, buscar="informe"))
+        assert "tareas_fts VIRTUAL TABLE INDEX" in plan
+        # Solo se leen de tareas las filas encontradas, por clave primaria
+        assert "SEARCH tareas USING INTEGER PRIMARY KEY" in plan
+
+    def test_invalid_search_options(self, fresh_db, usuario, tareas):
+        """El modo desconocido y la relevancia sin búsqueda se rechazan con 422"""
+        for kwargs in [{"buscar": "cafe", "modo_busqueda": "regex"}, {"ordenar_por": "relevancia"}]:
+            with pytest.raises(HTTPException) as exc_info:
+                crud.get_tareas(fresh_db, usuario.id, **kwargs)
+            assert exc_info.value.status_code == 422
+
+    def test_create_all_on_existing_database(self, fresh_db, usuario, tareas):
+        """Al añadir tareas_fts a una base de datos con tareas, el índice parte de ellas"""
+        for nombre in ("tareas_fts_insert", "tareas_fts_delete", "tareas_fts_update"):
+            fresh_db.execute(text(f"DROP TRIGGER {nombre}"))
+        fresh_db.execute(text("DROP TABLE tareas_fts"))
+        fresh_db.commit()
+
+        models.Base.metadata.create_all(bind=fresh_db.get_bind())
+        assert crud.get_tareas_count(fresh_db, usuario.id, buscar="informe") == 2
+
+        crud.delete_tarea(fresh_db, tareas[2].id, usuario.id)
+        fresh_db.execute(text("INSERT INTO tareas_fts (tareas_fts) VALUES ('integrity-check')"))
+        items, _, _ = crud.get_tareas(fresh_db, usuario.id, buscar="informe")
+        assert titulos(items) == ["Reunión de equipo"]
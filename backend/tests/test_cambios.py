@@ -0,0 +1,127 @@
+"""
+Pruebas para la sincronización incremental de tareas
+"""
+import pytest
+from datetime import datetime
+from fastapi import HTTPException
+from sqlalchemy import text, update
+from app import models, schemas, crud
+
+
+def crear(db, usuario, titulo):
+    return crud.create_tarea(db, schemas.TareaCreate(titulo=titulo), usuario.id).id
+
+
+def sincronizar(db, usuario, cursor=None, limit=100):
+    """Recorre todas las páginas de cambios desde el cursor"""
+    items, eliminadas, reset = {}, [], False
+    while True:
+        respuesta = crud.get_cambios(db, usuario.id, cursor, limit)
+        reset = reset or respuesta.reset
+        items.update({tarea.id: tarea.titulo for tarea in respuesta.items})
+        eliminadas += respuesta.eliminadas
+        cursor = respuesta.next_cursor
+        if not respuesta.has_more:
+            return items, eliminadas, cursor, reset
+
+
+@pytest.mark.database
+@pytest.mark.unit
+class TestCambios:
+    """Pruebas de GET /tareas/changes"""
+
+    def test_sin_cursor_entrega_todas_las_tareas(self, fresh_db, usuario):
+        ids = [crear(fresh_db, usuario, f"Tarea {i}") for i in range(5)]
+        items, eliminadas, _, reset = sincronizar(fresh_db, usuario, limit=2)
+        assert sorted(items) == ids
+        assert eliminadas == []
+        assert not reset
+
+    def test_solo_cambios_posteriores_al_cursor(self, fresh_db, usuario):
+        """Altas, modificaciones y bajas después del cursor; nada más"""
+        ids = [crear(fresh_db, usuario, f"Tarea {i}") for i in range(5)]
+        _, _, cursor, _ = sincronizar(fresh_db, usuario)
+
+        nueva = crear(fresh_db, usuario, "Nueva")
+        crud.update_tarea(fresh_db, ids[1], usuario.id, schemas.TareaUpdate(titulo="Editada"))
+        crud.delete_tarea(fresh_db, ids[2], usuario.id)
+
+        items, eliminadas, cursor, _ = sincronizar(fresh_db, usuario, cursor)
+        assert items == {nueva: "Nueva", ids[1]: "Editada"}
+        assert eliminadas == [ids[2]]
+        assert sincronizar(fresh_db, usuario, cursor)[:2] == ({}, [])
+
+    def test_una_fila_por_tarea(self, fresh_db, usuario):
+        """Cada cambio reemplaza el anterior, así que el registro no crece con las ediciones"""
+        tarea_id = crear(fresh_db, usuario, "Tarea")
+        for i in range(5):
+            crud.update_tarea(fresh_db, tarea_id, usuario.id, schemas.TareaUpdate(prioridad=i % 3 + 1))
+        assert fresh_db.execute(text("SELECT count(*) FROM tareas_cambios")).scalar() == 1
+
+    def test_consulta_acotada_por_indice(self, fresh_db, usuario, sentencias):
+        """La consulta usa el índice (usuario_id, seq) en lugar de recorrer las tareas"""
+        crear(fresh_db, usuario, "Tarea")
+        with sentencias(fresh_db.get_bind()) as ejecutadas:
+            crud.get_cambios(fresh_db, usuario.id)
+        statement, parameters, _ = [s for s in ejecutadas if "tareas_cambios" in s.sql][-1]
+        plan = " | ".join(
+            fila[-1] for fila in fresh_db.connection().exec_driver_sql(
+                f"EXPLAIN QUERY PLAN {statement}", parameters
+            )
+        )
+        assert "ix_tareas_cambios_usuario_seq" in plan
+        assert "TEMP B-TREE" not in plan
+
+    def test_compactacion_invalida_cursores_antiguos(self, fresh_db, usuario):
+        """Un cursor anterior a las lápidas compactadas obliga a empezar de cero"""
+        ids = [crear(fresh_db, usuario, f"Tarea {i}") for i in range(3)]
+        _, _, cursor_antiguo, _ = sincronizar(fresh_db, usuario)
+        crud.delete_tarea(fresh_db, ids[0], usuario.id)
+        _, _, cursor_reciente, _ = sincronizar(fresh_db, usuario, cursor_antiguo)
+        fresh_db.execute(update(models.TareaCambio.__table__).values(cambiado_en=datetime(2000, 1, 1)))
+        fresh_db.commit()
+
+        assert crud.compactar_cambios(fresh_db, dias=30) == 1
+
+        items, eliminadas, _, reset = sincronizar(fresh_db, usuario, cursor_antiguo)
+        assert reset
+        assert sorted(items) == ids[1:]
+        assert eliminadas == []
+        assert not sincronizar(fresh_db, usuario, cursor_reciente)[3]
+
+    def test_cursor_de_otro_shard_reinicia(self, fresh_db, usuario):
+        crear(fresh_db, usuario, "Tarea")
+        cursor = crud.get_cambios(fresh_db, usuario.id, origen="a").next_cursor
+        respuesta = crud.get_cambios(fresh_db, usuario.id, cursor, origen="b")
+        assert respuesta.reset
+        assert len(respuesta.items) == 1
+
+    def test_cursor_invalido(self, fresh_db, usuario):
+        with pytest.raises(HTTPException) as exc_info:
+            crud.get_cambios(fresh_db, usuario.id, "no-es-un-cursor")
+        assert exc_info.value.status_code == 422
+
+
+@pytest.mark.api
+@pytest.mark.unit
+class TestCambiosApi:
+    """Pruebas de GET /tareas/changes"""
+
+    def test_requires_authentication(self, client, clean_db):
+        assert client.get("/tareas/changes").status_code == 401
+
+    def test_changes(self, client, auth_headers, crear_tareas):
+        """La siguiente sincronización parte del cursor de la respuesta anterior"""
+        ids = crear_tareas(["Uno", "Dos"])
+        response = client.get("/tareas/changes", headers=auth_headers)
+        assert response.status_code == 200
+        data = response.json()
+        assert sorted(t["id"] for t in data["items"]) == ids
+
+        client.delete(f"/tareas/{ids[0]}", headers=auth_headers)
+        response = client.get(f"/tareas/changes?since={data['next_cursor']}", headers=auth_headers)
+        assert response.status_code == 200
+        assert (response.json()["items"], response.json()["eliminadas"]) == ([], [ids[0]])
+
+        response = client.get("/tareas/changes?since=no-es-un-cursor", headers=auth_headers)
+        assert response.status_code == 422
@@ -0,0 +1,110 @@
+"""
+Pruebas para la comprobación de disponibilidad de email y username
+"""
+import pytest
+from sqlalchemy.exc import OperationalError
+from app import schemas, crud
+from app.bloom import FiltroBloom, usuarios_registrados
+
+
+@pytest.fixture
+def filtro(fresh_db):
+    """Filtro global construido sobre la base de datos de la prueba"""
+    usuarios_registrados.reconstruir(fresh_db)
+    yield usuarios_registrados
+    usuarios_registrados.reset()
+
+
+def registrar(db, email, username):
+    crud.create_usuario(db, schemas.UsuarioCrear(email=email, username=username, password="SecurePassX9!"))
+
+
+@pytest.mark.unit
+class TestFiltroBloom:
+    """Pruebas del filtro de Bloom"""
+
+    def test_no_false_negatives(self):
+        """Todo valor añadido se reporta como posiblemente presente"""
+        filtro = FiltroBloom(1000, 0.01)
+        valores = [f"usuario{i}@example.com" for i in range(1000)]
+        for valor in valores:
+            filtro.agregar(valor)
+        assert all(valor in filtro for valor in valores)
+
+    def test_false_positive_rate(self):
+        """La tasa de falsos positivos queda cerca de la configurada"""
+        filtro = FiltroBloom(1000, 0.01)
+        for i in range(1000):
+            filtro.agregar(f"usuario{i}@example.com")
+        falsos = sum(f"otro{i}@example.com" in filtro for i in range(10000))
+        assert falsos / 10000 < 0.03
+
+
+@pytest.mark.database
+@pytest.mark.unit
+class TestDisponibilidad:
+    """Pruebas de la disponibilidad respaldada por el filtro"""
+
+    def test_free_values_skip_database(self, fresh_db, filtro, sentencias):
+        """Los valores libres se responden sin consultar la base de datos"""
+        registrar(fresh_db, "ocupado@example.com", "ocupado")
+        with sentencias(fresh_db.get_bind()) as ejecutadas:
+            resultado = crud.comprobar_disponibilidad(fresh_db, "libre@example.com", "libre")
+        assert resultado == schemas.Disponibilidad(email=True, username=True)
+        assert ejecutadas == []
+
+    def test_registered_values_confirmed_with_one_query(self, fresh_db, filtro, sentencias):
+        """Un posible registrado se confirma con una consulta, sin distinguir mayúsculas"""
+        registrar(fresh_db, "ocupado@example.com", "ocupado")
+        with sentencias(fresh_db.get_bind()) as ejecutadas:
+            resultado = crud.comprobar_disponibilidad(fresh_db, "OCUPADO@example.com", "Ocupado")
+        assert resultado == schemas.Disponibilidad(email=False, username=False)
+        assert len(ejecutadas) == 1
+
+    def test_only_requested_fields(self, fresh_db, filtro):
+        """Los campos no consultados quedan en None"""
+        registrar(fresh_db, "ocupado@example.com", "ocupado")
+        resultado = crud.comprobar_disponibilidad(fresh_db, username="ocupado")
+        assert resultado == schemas.Disponibilidad(email=None, username=False)
+
+    def test_rebuild_picks_up_existing_users(self, fresh_db, filtro):
+        """Al reconstruir, el filtro incluye usuarios creados por otros procesos"""
+        registrar(fresh_db, "externo@example.com", "externo")
+        usuarios_registrados.reset()
+        assert crud.comprobar_disponibilidad(fresh_db, "externo@example.com").email is False
+        usuarios_registrados.reconstruir(fresh_db)
+        assert usuarios_registrados.puede_existir("email", "externo@example.com")
+        assert crud.comprobar_disponibilidad(fresh_db, "externo@example.com").email is False
+
+    def test_failed_rebuild_keeps_filter(self, fresh_db, filtro, monkeypatch):
+        """Si la reconstrucción falla, el filtro anterior sigue activo y los registros no se acumulan"""
+        def fallar(*args, **kwargs):
+            raise OperationalError("SELECT", {}, Exception("base de datos no disponible"))
+
+        monkeypatch.setattr(fresh_db, "query", fallar)
+        with pytest.raises(OperationalError):
+            usuarios_registrados.reconstruir(fresh_db)
+        monkeypatch.undo()
+        assert usuarios_registrados._durante_reconstruccion is None
+        registrar(fresh_db, "tras_fallo@example.com", "tras_fallo")
+        assert usuarios_registrados._durante_reconstruccion is None
+        assert usuarios_registrados.puede_existir("username", "tras_fallo")
+
+
+@pytest.mark.api
+@pytest.mark.unit
+class TestDisponibilidadApi:
+    """Pruebas de GET /register/availability"""
+
+    def test_availability_without_token(self, client, clean_db, test_user_data):
+        """Responde sin autenticación y sin distinguir mayúsculas"""
+        client.post("/register", json=test_user_data)
+        response = client.get(
+            f"/register/availability?email={test_user_data['email'].upper()}&username=libre"
+        )
+        assert response.status_code == 200
+        assert response.json() == {"email": False, "username": True}
+
+    def test_availability_requires_a_field(self, client, clean_db):
+        """Sin email ni username responde 422"""
+        assert client.get("/register/availability").status_code == 422
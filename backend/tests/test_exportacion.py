@@ -0,0 +1,109 @@
+"""
+Pruebas para la exportación de tareas en NDJSON y CSV
+"""
+import csv
+import io
+import json
+import pytest
+from datetime import datetime
+from sqlalchemy.orm import sessionmaker
+from app import models, crud
+from app.exportacion import CAMPOS, exportar_tareas
+
+
+@pytest.fixture
+def usuario_id(fresh_db, usuario):
+    """Id del usuario de prueba, con tareas propias y una archivada, y otro usuario con una tarea"""
+    otro = models.Usuario(email="otro@example.com", username="otro", hashed_password="x")
+    fresh_db.add(otro)
+    fresh_db.commit()
+    crud.create_tareas_bulk(fresh_db, [
+        {"titulo": f"Tarea {i}", "descripcion": "con, coma y \"comillas\"" if i == 0 else None,
+         "completado": i % 2 == 0, "fecha_vencimiento": "2030-01-01T09:30:00Z" if i == 1 else None}
+        for i in range(25)
+    ], usuario.id)
+    crud.create_tareas_bulk(fresh_db, [{"titulo": "Ajena"}], otro.id)
+    fresh_db.add(models.TareaArchivada(
+        id=1000, titulo="Archivada", usuario_id=usuario.id, completado=True, created_at=datetime(2020, 1, 1)
+    ))
+    fresh_db.commit()
+    return usuario.id
+
+
+@pytest.fixture
+def abrir_sesion(fresh_db):
+    """Abre sesiones nuevas sobre la base de datos de prueba y cuenta las abiertas"""
+    fabrica = sessionmaker(bind=fresh_db.get_bind())
+    abiertas = []
+
+    def abrir():
+        db = fabrica()
+        abiertas.append(db)
+        return db
+
+    abrir.abiertas = abiertas
+    return abrir
+
+
+@pytest.mark.database
+@pytest.mark.unit
+class TestExportacion:
+    """Pruebas de GET /tareas/export"""
+
+    def test_ndjson(self, usuario_id, abrir_sesion):
+        lineas = "".join(exportar_tareas(abrir_sesion, usuario_id, "ndjson")).splitlines()
+        tareas = [json.loads(linea) for linea in lineas]
+        assert [t["titulo"] for t in tareas] == [f"Tarea {i}" for i in range(25)]
+        assert list(tareas[0]) == list(CAMPOS)
+        assert tareas[0]["completado"] is True
+        assert tareas[1]["fecha_vencimiento"] == "2030-01-01T09:30:00+00:00"
+        assert tareas[2]["fecha_vencimiento"] is None
+
+    def test_csv(self, usuario_id, abrir_sesion):
+        filas = list(csv.DictReader(io.StringIO("".join(exportar_tareas(abrir_sesion, usuario_id, "csv")))))
+        assert len(filas) == 25
+        assert filas[0]["descripcion"] == "con, coma y \"comillas\""
+        assert (filas[0]["completado"], filas[1]["completado"]) == ("true", "false")
+        assert filas[1]["descripcion"] == ""
+
+    def test_incluir_archivadas(self, usuario_id, abrir_sesion):
+        lineas = "".join(exportar_tareas(abrir_sesion, usuario_id, incluir_archivadas=True)).splitlines()
+        assert len(lineas) == 26
+        assert json.loads(lineas[-1])["titulo"] == "Archivada"
+
+    def test_por_trozos_con_cursor_del_servidor(self, fresh_db, usuario_id, abrir_sesion, sentencias):
+        """Cada partición del cursor es un trozo; la consulta se ejecuta una sola vez"""
+        with sentencias(fresh_db.get_bind()) as ejecutadas:
+            trozos = list(exportar_tareas(abrir_sesion, usuario_id, "ndjson", lote=10))
+        assert [trozo.count("\n") for trozo in trozos] == [10, 10, 5]
+        assert [s.opciones.get("yield_per") for s in ejecutadas] == [10]
+
+    def test_cierra_la_sesion(self, usuario_id, abrir_sesion):
+        """La sesión propia se cierra al terminar o si el cliente abandona la descarga"""
+        generador = exportar_tareas(abrir_sesion, usuario_id, lote=5)
+        next(generador)
+        generador.close()
+        list(exportar_tareas(abrir_sesion, usuario_id))
+        assert all(not db.in_transaction() for db in abrir_sesion.abiertas)
+        assert len(abrir_sesion.abiertas) == 2
+
+
+@pytest.mark.api
+@pytest.mark.unit
+class TestExportacionApi:
+    """Pruebas de GET /tareas/export"""
+
+    def test_requires_authentication(self, client, clean_db):
+        assert client.get("/tareas/export").status_code == 401
+
+    def test_export(self, client, auth_headers, crear_tareas):
+        """Exporta las tareas del usuario con el tipo de contenido del formato"""
+        crear_tareas(["Comprar pan", "Llamar al banco"])
+        response = client.get("/tareas/export?format=ndjson", headers=auth_headers)
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        exportadas = [json.loads(linea) for linea in response.text.splitlines()]
+        assert [t["titulo"] for t in exportadas] == ["Comprar pan", "Llamar al banco"]
+
+    def test_export_invalid_format(self, client, auth_headers):
+        assert client.get("/tareas/export?format=xml", headers=auth_headers).status_code == 422
@@ -0,0 +1,209 @@
+"""
+Pruebas para la importación de tareas desde NDJSON y CSV
+"""
+import asyncio
+import json
+import pytest
+from sqlalchemy import select
+from sqlalchemy.orm import sessionmaker
+from fastapi import HTTPException
+from app import models, schemas, crud
+from app.exportacion import exportar_tareas
+from app.importacion import importar_tareas, lineas
+from app import main
+
+
+@pytest.fixture
+def usuario_id(usuario):
+    """Id del usuario propietario de las tareas de prueba"""
+    return usuario.id
+
+
+async def _trozos(cuerpo: bytes, tamano: int):
+    for inicio in range(0, len(cuerpo), tamano):
+        yield cuerpo[inicio:inicio + tamano]
+
+
+def importar(db, usuario_id, cuerpo, formato="ndjson", tamano=7, **kwargs):
+    """Importa el cuerpo partido en trozos pequeños y anota el tamaño de cada lote guardado"""
+    lotes = []
+
+    async def guardar(tareas):
+        lotes.append(len(tareas))
+        crud.create_tareas(db, tareas, usuario_id)
+
+    respuesta = asyncio.run(importar_tareas(_trozos(cuerpo, tamano), formato, guardar, **kwargs))
+    return respuesta, lotes
+
+
+def titulos(db, usuario_id):
+    return db.execute(
+        select(models.Tarea.titulo).where(models.Tarea.usuario_id == usuario_id).order_by(models.Tarea.id)
+    ).scalars().all()
+
+
+@pytest.mark.unit
+class TestLineas:
+    """Pruebas de la división incremental del cuerpo en líneas"""
+
+    def recoger(self, cuerpo, tamano, max_linea=100):
+        async def todas():
+            return [linea async for linea in lineas(_trozos(cuerpo, tamano), max_linea)]
+        return asyncio.run(todas())
+
+    def test_utf8_partido_entre_trozos(self):
+        cuerpo = "﻿añadir café\nsegunda".encode("utf-8")
+        for tamano in (1, 2, 3, 5):
+            assert self.recoger(cuerpo, tamano) == [(1, "añadir café\n"), (2, "segunda")]
+
+    def test_linea_demasiado_larga(self):
+        cuerpo = b"corta\n" + b"x" * 1000 + b"\nfinal\n"
+        assert self.recoger(cuerpo, 16, max_linea=100) == [(1, "corta\n"), (2, None), (3, "final\n")]
+
+
+@pytest.mark.database
+@pytest.mark.unit
+class TestImportacion:
+    """Pruebas de POST /tareas/import"""
+
+    def test_ndjson_por_lotes(self, fresh_db, usuario_id):
+        cuerpo = "".join(json.dumps({"titulo": f"Tarea {i}", "prioridad": i % 3 + 1}) + "\n" for i in range(25))
+        respuesta, lotes = importar(fresh_db, usuario_id, cuerpo.encode(), lote=10)
+        assert (respuesta.importadas, respuesta.rechazadas) == (25, 0)
+        assert lotes == [10, 10, 5]
+        assert titulos(fresh_db, usuario_id) == [f"Tarea {i}" for i in range(25)]
+        assert crud.get_tareas_stats(fresh_db, usuario_id).total == 25
+
+    def test_errores_por_linea(self, fresh_db, usuario_id):
+        cuerpo = b'{"titulo": "Buena"}\n\n{"titulo": ""}\nno es json\n[1, 2]\n{"titulo": "Otra buena"}'
+        respuesta, _ = importar(fresh_db, usuario_id, cuerpo)
+        assert (respuesta.importadas, respuesta.rechazadas) == (2, 3)
+        assert [(e.linea, e.errores[0]["type"]) for e in respuesta.errores] == [
+            (3, "string_too_short"), (4, "json_invalido"), (5, "model_type")
+        ]
+        assert titulos(fresh_db, usuario_id) == ["Buena", "Otra buena"]
+
+    def test_csv(self, fresh_db, usuario_id):
+        cuerpo = (
+            'titulo,descripcion,completado,prioridad,columna_extra\n'
+            'Comprar pan,,false,2,x\n'
+            '"Informe, final","línea uno\nlínea dos ""citada""",true,3,\n'
+            'Sin prioridad,,true,,\n'
+            'Prioridad mala,,false,9,\n'
+            'Faltan,columnas\n'
+        ).encode()
+        respuesta, _ = importar(fresh_db, usuario_id, cuerpo, formato="csv", tamano=5)
+        assert (respuesta.importadas, respuesta.rechazadas) == (3, 2)
+        assert [(e.linea, e.errores[0]["type"]) for e in respuesta.errores] == [(6, "less_than_equal"), (7, "columnas")]
+        tareas = fresh_db.execute(
+            select(models.Tarea).where(models.Tarea.usuario_id == usuario_id).order_by(models.Tarea.id)
+        ).scalars().all()
+        assert tareas[1].titulo == "Informe, final"
+        assert tareas[1].descripcion == 'línea uno\nlínea dos "citada"'
+        assert (tareas[1].completado, tareas[1].prioridad) == (True, 3)
+        assert (tareas[2].descripcion, tareas[2].prioridad) == (None, 1)
+
+    def test_ida_y_vuelta_con_la_exportacion(self, fresh_db, usuario_id):
+        """Lo exportado en cualquiera de los formatos se puede volver a importar"""
+        crud.create_tareas_bulk(fresh_db, [
+            {"titulo": f"Original {i}", "descripcion": "a,b" if i else None, "completado": bool(i % 2),
+             "fecha_vencimiento": "2030-01-01T09:30:00Z"}
+            for i in range(5)
+        ], usuario_id)
+        abrir = sessionmaker(bind=fresh_db.get_bind())
+        for formato in ("ndjson", "csv"):
+            cuerpo = "".join(exportar_tareas(abrir, usuario_id, formato)).encode()
+            destino = models.Usuario(email=f"{formato}@example.com", username=formato, hashed_password="x")
+            fresh_db.add(destino)
+            fresh_db.commit()
+            respuesta, _ = importar(fresh_db, destino.id, cuerpo, formato=formato, tamano=64)
+            assert (respuesta.importadas, respuesta.rechazadas) == (5, 0)
+            copia = list(exportar_tareas(abrir, destino.id, "ndjson"))
+            campos = ("titulo", "descripcion", "completado", "prioridad", "fecha_vencimiento")
+            originales = [json.loads(l) for l in "".join(exportar_tareas(abrir, usuario_id, "ndjson")).splitlines()]
+            copias = [json.loads(l) for l in "".join(copia).splitlines()]
+            assert [{c: t[c] for c in campos} for t in copias] == [{c: t[c] for c in campos} for t in originales]
+
+    def test_errores_acotados(self, fresh_db, usuario_id):
+        cuerpo = b"{}\n" * 20
+        respuesta, lotes = importar(fresh_db, usuario_id, cuerpo, max_errores=5)
+        assert respuesta.rechazadas == 20
+        assert len(respuesta.errores) == 5
+        assert respuesta.errores_truncados
+        assert lotes == []
+
+    def test_lote_fallido_no_detiene_la_importacion(self, fresh_db, usuario_id):
+        """Un error que no es de la base de datos rechaza solo las líneas de su lote"""
+        lotes = []
+
+        async def guardar(tareas):
+            lotes.append(len(tareas))
+            if len(lotes) == 2:
+                raise HTTPException(status_code=503, detail="Tareas en movimiento")
+            crud.create_tareas(fresh_db, tareas, usuario_id)
+
+        cuerpo = "".join(json.dumps({"titulo": f"Tarea {i}"}) + "\n" for i in range(6)).encode()
+        respuesta = asyncio.run(importar_tareas(_trozos(cuerpo, 7), "ndjson", guardar, lote=2))
+        assert (respuesta.importadas, respuesta.rechazadas) == (4, 2)
+        assert [(e.linea, e.errores[0]["type"]) for e in respuesta.errores] == [(3, "no_guardado"), (4, "no_guardado")]
+        assert titulos(fresh_db, usuario_id) == ["Tarea 0", "Tarea 1", "Tarea 4", "Tarea 5"]
+
+    def test_prefijos_indexados_despues(self, fresh_db, usuario_id):
+        """Sin indexar al crear, las sugerencias aparecen al indexar el rango de ids"""
+        creadas = crud.create_tareas(
+            fresh_db, [schemas.TareaCreate(titulo=f"Comprar pan {i}") for i in range(3)], usuario_id, indexar=False
+        )
+        assert crud.get_sugerencias(fresh_db, usuario_id, "pan") == []
+        crud.update_tarea(fresh_db, creadas[1].id, usuario_id, schemas.TareaUpdate(titulo="Comprar pan integral"))
+        crud.indexar_prefijos(fresh_db, usuario_id, creadas[0].id, creadas[-1].id)
+        assert {s.titulo for s in crud.get_sugerencias(fresh_db, usuario_id, "pan")} == {
+            "Comprar pan 0", "Comprar pan integral", "Comprar pan 2"
+        }
+        assert [s.titulo for s in crud.get_sugerencias(fresh_db, usuario_id, "integral")] == ["Comprar pan integral"]
+
+    def test_indexado_en_segundo_plano_abre_su_sesion(self, fresh_db, usuario_id, monkeypatch):
+        """La tarea en segundo plano no usa la sesión de la solicitud y cierra la suya"""
+        creadas = crud.create_tareas(
+            fresh_db, [schemas.TareaCreate(titulo=f"Comprar pan {i}") for i in range(3)], usuario_id, indexar=False
+        )
+        rango = (creadas[0].id, creadas[-1].id)
+        fresh_db.close()
+        abiertas = []
+        fabrica = sessionmaker(bind=fresh_db.get_bind())
+
+        def sesion():
+            abiertas.append(fabrica())
+            return abiertas[-1]
+
+        monkeypatch.setattr(main, "SessionLocal", sesion)
+        main.indexar_sugerencias_importadas(usuario_id, [rango])
+        assert len(abiertas) == 1 and not abiertas[0].in_transaction()
+        assert len(crud.get_sugerencias(fresh_db, usuario_id, "pan")) == 3
+
+
+@pytest.mark.api
+@pytest.mark.unit
+class TestImportacionApi:
+    """Pruebas de POST /tareas/import"""
+
+    def test_requires_authentication(self, client, clean_db):
+        assert client.post("/tareas/import", content="").status_code == 401
+
+    def test_import(self, client, auth_headers):
+        """Importa las líneas válidas, informa las rechazadas e indexa las sugerencias después"""
+        cuerpo = '{"titulo": "Comprar pan"}\n{"titulo": ""}\n{"titulo": "Llamar al banco", "prioridad": 3}\n'
+        response = client.post(
+            "/tareas/import?format=ndjson", content=cuerpo,
+            headers={**auth_headers, "Content-Type": "application/x-ndjson"}
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert (data["importadas"], data["rechazadas"]) == (2, 1)
+        assert data["errores"][0]["linea"] == 2
+
+        # Los prefijos de las tareas importadas se indexan después de responder
+        response = client.get("/tareas/suggest?q=ban", headers=auth_headers)
+        assert [s["titulo"] for s in response.json()] == ["Llamar al banco"]
+
+    def test_import_invalid_format(self, client, auth_headers):
+        assert client.post("/tareas/import?format=xml", content="", headers=auth_headers).status_code == 422
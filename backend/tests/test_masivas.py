@@ -0,0 +1,147 @@
+"""
+Pruebas para la actualización y el borrado de tareas por filtros
+"""
+import pytest
+from datetime import datetime, timedelta, timezone
+from fastapi import HTTPException
+from pydantic import ValidationError
+from sqlalchemy import select
+from app import models, schemas, crud, recordatorios
+from app.recordatorios import ProgramadorRecordatorios
+
+
+@pytest.fixture
+def usuario(usuario, fresh_db):
+    """El usuario de prueba, con otro usuario que tiene una tarea completada"""
+    otro = models.Usuario(email="otro@example.com", username="otro", hashed_password="x")
+    fresh_db.add(otro)
+    fresh_db.commit()
+    crud.create_tareas_bulk(fresh_db, [{"titulo": "Ajena", "completado": True}], otro.id)
+    return usuario
+
+
+@pytest.fixture
+def tareas(fresh_db, usuario):
+    """Tareas con distintos estados, prioridades y títulos"""
+    items = [
+        {"titulo": "Comprar leche", "prioridad": 1},
+        {"titulo": "Comprar pan", "prioridad": 2, "completado": True},
+        {"titulo": "Informe trimestral", "prioridad": 1, "completado": True},
+        {"titulo": "Llamar al banco", "prioridad": 3},
+    ]
+    respuesta = crud.create_tareas_bulk(fresh_db, items, usuario.id)
+    return {r.tarea.titulo: r.tarea.id for r in respuesta.resultados}
+
+
+def estado(db, usuario):
+    filas = db.execute(
+        select(models.Tarea.titulo, models.Tarea.completado, models.Tarea.prioridad)
+        .where(models.Tarea.usuario_id == usuario.id)
+    ).all()
+    return {titulo: (completado, prioridad) for titulo, completado, prioridad in filas}
+
+
+@pytest.mark.database
+@pytest.mark.unit
+class TestActualizarTareas:
+    """Pruebas de PATCH /tareas"""
+
+    def test_marcar_todas_como_hechas(self, fresh_db, usuario, tareas):
+        cambios = schemas.TareaCambioMasivo(completado=True)
+        assert crud.update_tareas(fresh_db, usuario.id, cambios, completado=False) == 2
+        assert all(completado for completado, _ in estado(fresh_db, usuario).values())
+        stats = crud.get_tareas_stats(fresh_db, usuario.id)
+        assert (stats.completadas, stats.pendientes) == (4, 0)
+
+    def test_subir_prioridad_de_la_busqueda(self, fresh_db, usuario, tareas):
+        cambios = schemas.TareaCambioMasivo(prioridad=3)
+        assert crud.update_tareas(fresh_db, usuario.id, cambios, buscar="comprar") == 2
+        assert estado(fresh_db, usuario)["Comprar leche"] == (False, 3)
+        assert estado(fresh_db, usuario)["Informe trimestral"] == (True, 1)
+        # El índice de sugerencias sigue la nueva prioridad
+        assert crud.get_sugerencias(fresh_db, usuario.id, "c")[0].prioridad == 3
+
+    def test_una_sola_sentencia(self, fresh_db, usuario, tareas, sentencias):
+        usuario_id = usuario.id
+        with sentencias(fresh_db.get_bind()) as ejecutadas:
+            crud.update_tareas(fresh_db, usuario_id, schemas.TareaCambioMasivo(prioridad=2), todas=True)
+        assert len(ejecutadas) == 1
+        assert ejecutadas[0].sql.startswith("UPDATE tareas ")
+
+    def test_exige_filtro_o_todas(self, fresh_db, usuario, tareas):
+        with pytest.raises(HTTPException) as exc_info:
+            crud.update_tareas(fresh_db, usuario.id, schemas.TareaCambioMasivo(completado=True))
+        assert exc_info.value.status_code == 422
+        assert crud.update_tareas(fresh_db, usuario.id, schemas.TareaCambioMasivo(completado=True), todas=True) == 4
+        assert estado(fresh_db, usuario).keys() == set(tareas)
+
+    def test_cambios_validos(self, fresh_db, usuario):
+        with pytest.raises(HTTPException) as exc_info:
+            crud.update_tareas(fresh_db, usuario.id, schemas.TareaCambioMasivo(), todas=True)
+        assert exc_info.value.status_code == 422
+        with pytest.raises(ValidationError):
+            schemas.TareaCambioMasivo(titulo="Igual para todas")
+        with pytest.raises(ValidationError):
+            schemas.TareaCambioMasivo(completado=None)
+
+    def test_reprograma_recordatorios(self, fresh_db, usuario, monkeypatch):
+        ahora = datetime.now(timezone.utc).replace(tzinfo=None)
+        programador = ProgramadorRecordatorios(lambda r: None, cargar=lambda funcion: funcion(fresh_db))
+        monkeypatch.setattr(recordatorios, "programador", programador)
+        programador.iniciar(ahora)
+        crud.create_tareas_bulk(fresh_db, [
+            {"titulo": f"Entrega {i}", "fecha_vencimiento": ahora + timedelta(minutes=10 + i)} for i in range(3)
+        ], usuario.id)
+        assert programador.pendientes == 3
+        assert crud.update_tareas(fresh_db, usuario.id, schemas.TareaCambioMasivo(completado=True), todas=True) == 3
+        assert programador.pendientes == 0
+
+
+@pytest.mark.database
+@pytest.mark.unit
+class TestEliminarTareas:
+    """Pruebas de DELETE /tareas"""
+
+    def test_eliminar_completadas(self, fresh_db, usuario, tareas):
+        assert crud.delete_tareas(fresh_db, usuario.id, completado=True) == 2
+        assert set(estado(fresh_db, usuario)) == {"Comprar leche", "Llamar al banco"}
+        assert crud.get_tareas_stats(fresh_db, usuario.id).total == 2
+        # Las tareas de otros usuarios no se tocan
+        assert fresh_db.execute(select(models.Tarea.titulo).where(models.Tarea.titulo == "Ajena")).scalar()
+
+    def test_filtros_combinados(self, fresh_db, usuario, tareas):
+        assert crud.delete_tareas(fresh_db, usuario.id, completado=True, buscar="comprar") == 1
+        assert "Comprar pan" not in estado(fresh_db, usuario)
+
+    def test_exige_filtro_o_todas(self, fresh_db, usuario, tareas):
+        with pytest.raises(HTTPException) as exc_info:
+            crud.delete_tareas(fresh_db, usuario.id)
+        assert exc_info.value.status_code == 422
+        assert crud.delete_tareas(fresh_db, usuario.id, todas=True) == 4
+        assert estado(fresh_db, usuario) == {}
+
+
+@pytest.mark.api
+@pytest.mark.unit
+class TestTareasMasivasApi:
+    """Pruebas de PATCH /tareas y DELETE /tareas a través de la API"""
+
+    @pytest.mark.parametrize("metodo", ["patch", "delete"])
+    def test_requires_authentication(self, client, clean_db, metodo):
+        assert client.request(metodo, "/tareas?todas=true").status_code == 401
+
+    def test_patch_and_delete_by_filter(self, client, auth_headers, crear_tareas):
+        """Cambio y borrado por filtros; sin filtro ni todas=true responde 422"""
+        crear_tareas(["Uno", "Dos", "Tres"])
+        response = client.patch("/tareas?todas=true", json={"completado": True, "prioridad": 3}, headers=auth_headers)
+        assert response.status_code == 200
+        assert response.json() == {"afectadas": 3}
+
+        response = client.patch("/tareas?todas=true", json={"titulo": "No"}, headers=auth_headers)
+        assert response.status_code == 422
+
+        response = client.delete("/tareas", headers=auth_headers)
+        assert response.status_code == 422
+        response = client.delete("/tareas?prioridad=3", headers=auth_headers)
+        assert response.status_code == 200
+        assert response.json() == {"afectadas": 3}
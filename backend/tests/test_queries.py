@@ -0,0 +1,55 @@
+"""
+Pruebas para las sentencias prearmadas y la caché de compilación
+"""
+import pytest
+from datetime import datetime, timedelta, timezone
+from app import models, schemas, crud, queries
+
+
+@pytest.mark.database
+@pytest.mark.unit
+class TestSentenciasPrearmadas:
+    """Pruebas de la reutilización de sentencias y de sus resultados"""
+
+    def test_same_shape_reuses_statement(self):
+        """Una misma forma de listado devuelve siempre la misma sentencia"""
+        forma = queries.FormaListado(dialecto="sqlite", completado=True, ordenar_por="prioridad")
+        assert queries.listado_tareas(forma) is queries.listado_tareas(forma)
+        assert queries.listado_tareas(forma) is not queries.listado_tareas(forma._replace(orden="asc"))
+        assert queries.tarea_de_usuario(("id", "titulo")) is queries.tarea_de_usuario(("id", "titulo"))
+
+    def test_repeated_listing_hits_compile_cache(self, fresh_db, usuario):
+        """Repetir el listado con otros valores no vuelve a compilar la sentencia"""
+        usuario_id = usuario.id
+        for i in range(3):
+            crud.create_tarea(fresh_db, schemas.TareaCreate(titulo=f"Tarea {i}", prioridad=i + 1), usuario_id)
+        crud.get_tareas(fresh_db, usuario_id, prioridad=1, buscar="tarea")
+
+        queries.estadisticas_compilacion.reset()
+        items, total, _ = crud.get_tareas(fresh_db, usuario_id, prioridad=2, buscar="tarea")
+        assert [t.titulo for t in items] == ["Tarea 1"]
+        assert total == 1
+        resumen = queries.estadisticas_compilacion.resumen()
+        assert resumen["misses"] == 0
+        assert resumen["hits"] >= 1
+        assert resumen["hit_rate"] == 1.0
+
+    def test_hot_lookups(self, fresh_db, usuario):
+        """Las consultas por clave devuelven la fila correcta o None"""
+        usuario_id = usuario.id
+        tarea = crud.create_tarea(fresh_db, schemas.TareaCreate(titulo="Buscar por id"), usuario_id)
+        assert crud.get_usuario_by_email(fresh_db, usuario.email).id == usuario_id
+        assert crud.get_usuario_by_email(fresh_db, "nadie@example.com") is None
+        assert crud.get_tarea(fresh_db, tarea.id, usuario_id).titulo == "Buscar por id"
+        assert crud.get_tarea(fresh_db, tarea.id, usuario_id + 1) is None
+
+        ahora = datetime.now(timezone.utc)
+        fresh_db.add_all([
+            models.RefreshToken(token="vigente", usuario_id=usuario_id, expires_at=ahora + timedelta(days=1)),
+            models.RefreshToken(token="vencido", usuario_id=usuario_id, expires_at=ahora - timedelta(days=1)),
+        ])
+        fresh_db.commit()
+        assert crud.get_refresh_token(fresh_db, "vigente").usuario_id == usuario_id
+        assert crud.get_refresh_token(fresh_db, "vencido") is None
+        crud.revoke_refresh_token(fresh_db, "vigente")
+        assert crud.get_refresh_token(fresh_db, "vigente") is None
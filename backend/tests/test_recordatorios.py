@@ -0,0 +1,189 @@
+"""
+Pruebas para el programador de recordatorios de vencimiento
+"""
+import json
+import threading
+import pytest
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from sqlalchemy import select
+from app import models, schemas, crud, recordatorios
+from app.recordatorios import ProgramadorRecordatorios, Recordatorio, SinkWebhook
+
+AHORA = datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+
+
+@pytest.fixture
+def enviados():
+    return []
+
+
+@pytest.fixture
+def programador(fresh_db, enviados, monkeypatch):
+    """Programador con ventana de una hora sobre fresh_db, instalado para crud"""
+    programador = ProgramadorRecordatorios(
+        lambda recordatorio: enviados.append(recordatorio.tarea_id),
+        ventana=timedelta(hours=1),
+        cargar=lambda funcion: funcion(fresh_db)
+    )
+    monkeypatch.setattr(recordatorios, "programador", programador)
+    return programador
+
+
+def crear(db, usuario, vence_en, completado=False):
+    tarea = schemas.TareaCreate(
+        titulo="Entrega", fecha_vencimiento=AHORA + vence_en, completado=completado
+    )
+    return crud.create_tarea(db, tarea, usuario.id).id
+
+
+@pytest.mark.database
+@pytest.mark.unit
+class TestProgramador:
+    """Pruebas de la carga de ventanas y el disparo de recordatorios"""
+
+    def test_dispara_en_orden_solo_lo_que_vence(self, fresh_db, usuario, programador, enviados):
+        a = crear(fresh_db, usuario, timedelta(minutes=20))
+        b = crear(fresh_db, usuario, timedelta(minutes=10))
+        crear(fresh_db, usuario, timedelta(minutes=5), completado=True)
+        crear(fresh_db, usuario, timedelta(minutes=-5))
+        programador.iniciar(AHORA)
+        assert programador.pendientes == 2
+
+        assert programador.tick(AHORA + timedelta(minutes=1)) == 0
+        assert programador.tick(AHORA + timedelta(minutes=25)) == 2
+        assert enviados == [b, a]
+        assert programador.tick(AHORA + timedelta(minutes=26)) == 0
+
+    def test_tick_sin_consultas(self, fresh_db, usuario, programador, sentencias):
+        """Dentro de la ventana un tick no consulta la base de datos"""
+        for minutos in range(1, 20):
+            crear(fresh_db, usuario, timedelta(minutes=minutos))
+        programador.iniciar(AHORA)
+        with sentencias(fresh_db.get_bind()) as ejecutadas:
+            assert programador.tick(AHORA + timedelta(minutes=5, seconds=30)) == 5
+        assert ejecutadas == []
+
+    def test_carga_la_ventana_siguiente(self, fresh_db, usuario, programador, enviados):
+        lejana = crear(fresh_db, usuario, timedelta(minutes=90))
+        programador.iniciar(AHORA)
+        assert programador.pendientes == 0
+        programador.tick(AHORA + timedelta(minutes=40))
+        assert programador.pendientes == 1
+        programador.tick(AHORA + timedelta(minutes=91))
+        assert enviados == [lejana]
+
+    def test_antelacion(self, fresh_db, usuario, enviados):
+        programador = ProgramadorRecordatorios(
+            lambda recordatorio: enviados.append(recordatorio.tarea_id),
+            antelacion=timedelta(minutes=15),
+            cargar=lambda funcion: funcion(fresh_db)
+        )
+        tarea_id = crear(fresh_db, usuario, timedelta(minutes=30))
+        programador.iniciar(AHORA)
+        programador.tick(AHORA + timedelta(minutes=16))
+        assert enviados == [tarea_id]
+
+    def test_error_del_sink_no_detiene_el_resto(self, fresh_db, usuario):
+        enviados = []
+
+        def sink(recordatorio):
+            if not enviados:
+                enviados.append(None)
+                raise RuntimeError("sin conexión")
+            enviados.append(recordatorio.tarea_id)
+
+        programador = ProgramadorRecordatorios(sink, cargar=lambda funcion: funcion(fresh_db))
+        crear(fresh_db, usuario, timedelta(minutes=1))
+        segunda = crear(fresh_db, usuario, timedelta(minutes=2))
+        programador.iniciar(AHORA)
+        assert programador.tick(AHORA + timedelta(minutes=3)) == 2
+        assert enviados == [None, segunda]
+
+    def test_ventana_usa_indice_parcial(self, fresh_db, usuario, programador):
+        tarea = models.Tarea
+        stmt = select(tarea.id).where(
+            tarea.completado == False,  # noqa: E712
+            tarea.fecha_vencimiento >= AHORA,
+            tarea.fecha_vencimiento < AHORA + timedelta(hours=1)
+        )
+        compilada = stmt.compile(fresh_db.get_bind(), compile_kwargs={"literal_binds": True})
+        plan = " | ".join(
+            fila[-1] for fila in fresh_db.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {compilada}")
+        )
+        assert "ix_tareas_vencimiento_pendientes" in plan
+
+
+@pytest.mark.database
+@pytest.mark.unit
+class TestCambiosConCrud:
+    """Las escrituras de crud actualizan el programador tras el commit"""
+
+    def test_alta_cambio_y_baja(self, fresh_db, usuario, programador, enviados):
+        programador.iniciar(AHORA)
+        tarea_id = crear(fresh_db, usuario, timedelta(minutes=10))
+        assert programador.pendientes == 1
+
+        crud.update_tarea(
+            fresh_db, tarea_id, usuario.id,
+            schemas.TareaUpdate(fecha_vencimiento=AHORA + timedelta(minutes=30))
+        )
+        assert programador.tick(AHORA + timedelta(minutes=15)) == 0
+
+        crud.update_tarea(fresh_db, tarea_id, usuario.id, schemas.TareaUpdate(completado=True))
+        assert programador.pendientes == 0
+
+        otra = crear(fresh_db, usuario, timedelta(minutes=10))
+        crud.delete_tarea(fresh_db, otra, usuario.id)
+        assert programador.tick(AHORA + timedelta(minutes=59)) == 0
+        assert enviados == []
+
+    def test_rollback_no_programa(self, fresh_db, usuario, programador):
+        programador.iniciar(AHORA)
+        tarea = models.Tarea(
+            titulo="Entrega", usuario_id=usuario.id, fecha_vencimiento=AHORA + timedelta(minutes=10)
+        )
+        fresh_db.add(tarea)
+        fresh_db.flush()
+        recordatorios.anotar(fresh_db, tarea)
+        fresh_db.rollback()
+        assert programador.pendientes == 0
+
+    def test_no_repite_el_aviso(self, fresh_db, usuario, programador, enviados):
+        """Editar el título de una tarea ya avisada no vuelve a avisar"""
+        programador.iniciar(AHORA)
+        tarea_id = crear(fresh_db, usuario, timedelta(minutes=10))
+        programador.tick(AHORA + timedelta(minutes=11))
+        crud.update_tarea(fresh_db, tarea_id, usuario.id, schemas.TareaUpdate(titulo="Entrega final"))
+        programador.tick(AHORA + timedelta(minutes=12))
+        assert enviados == [tarea_id]
+
+
+@pytest.mark.unit
+def test_sink_webhook():
+    """El webhook recibe el recordatorio como JSON"""
+    recibidos = []
+
+    class Manejador(BaseHTTPRequestHandler):
+        def do_POST(self):
+            recibidos.append(json.loads(self.rfile.read(int(self.headers["Content-Length"]))))
+            self.send_response(204)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    servidor = HTTPServer(("127.0.0.1", 0), Manejador)
+    hilo = threading.Thread(target=servidor.handle_request)
+    hilo.start()
+    try:
+        SinkWebhook(f"http://127.0.0.1:{servidor.server_port}/recordatorios")(
+            Recordatorio(7, 1, "Entrega", datetime(2030, 1, 1, 9, 30))
+        )
+    finally:
+        hilo.join(timeout=5)
+        servidor.server_close()
+    assert recibidos == [{
+        "tarea_id": 7, "usuario_id": 1, "titulo": "Entrega",
+        "fecha_vencimiento": "2030-01-01T09:30:00+00:00"
+    }]
@@ -0,0 +1,132 @@
+"""
+Pruebas para la comprobación de unicidad en el registro de usuarios
+"""
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine, text
+from app import schemas, crud
+from migrate_db import comprobar_usuarios, crear_indices
+from tests.test_archivo import ESQUEMA_ORIGINAL
+
+
+def nuevo_usuario(email="registro@example.com", username="registro"):
+    return schemas.UsuarioCrear(email=email, username=username, password="SecurePassX9!")
+
+
+@pytest.fixture
+def hashes(monkeypatch):
+    """Cuenta las llamadas al hash de contraseñas durante la prueba"""
+    llamadas = []
+    original = crud.get_password_hash
+
+    def contar(password):
+        llamadas.append(password)
+        return original(password)
+
+    monkeypatch.setattr(crud, "get_password_hash", contar)
+    return llamadas
+
+
+@pytest.mark.database
+@pytest.mark.unit
+class TestRegistroUnicidad:
+    """Pruebas del registro con una sola consulta de unicidad"""
+
+    def test_single_lookup_before_insert(self, fresh_db, hashes, sentencias):
+        """El registro hace una sola consulta de existencia y un solo hash"""
+        with sentencias(fresh_db.get_bind()) as ejecutadas:
+            crud.create_usuario(fresh_db, nuevo_usuario())
+        assert len([s for s in ejecutadas if s.sql.lstrip().upper().startswith("SELECT")]) == 1
+        assert any(s.sql.startswith("INSERT INTO usuarios") for s in ejecutadas)
+        assert len(hashes) == 1
+
+    @pytest.mark.parametrize("email,username,detalle", [
+        ("REGISTRO@example.com", "otro", "El email ya está registrado"),
+        ("otro@example.com", "Registro", "El nombre de usuario ya está en uso"),
+        ("registro@example.com", "registro", "El email ya está registrado"),
+    ])
+    def test_duplicates_rejected_without_hashing(self, fresh_db, hashes, email, username, detalle):
+        """Los duplicados, sin distinguir mayúsculas, se rechazan antes del hash"""
+        crud.create_usuario(fresh_db, nuevo_usuario())
+        hashes.clear()
+        with pytest.raises(HTTPException) as exc_info:
+            crud.create_usuario(fresh_db, nuevo_usuario(email, username))
+        assert exc_info.value.status_code == 400
+        assert exc_info.value.detail == detalle
+        assert hashes == []
+
+    def test_unique_index_violation_is_mapped(self, fresh_db, monkeypatch):
+        """Si otro registro gana la carrera, el índice único da el mensaje preciso"""
+        crud.create_usuario(fresh_db, nuevo_usuario())
+        # Simula que la comprobación no vio al usuario creado en paralelo
+        monkeypatch.setattr(crud.queries, "USUARIO_EXISTENTE", crud.queries.USUARIO_EXISTENTE.where(False))
+        with pytest.raises(HTTPException) as exc_info:
+            crud.create_usuario(fresh_db, nuevo_usuario("otro@example.com", "REGISTRO"))
+        assert exc_info.value.status_code == 400
+        assert exc_info.value.detail == "El nombre de usuario ya está en uso"
+
+    def test_lookup_uses_lowercase_indexes(self, fresh_db, sentencias):
+        """La consulta de existencia se resuelve con los índices por lower()"""
+        with sentencias(fresh_db.get_bind()) as ejecutadas:
+            crud.create_usuario(fresh_db, nuevo_usuario())
+
+        statement, parameters, _ = [s for s in ejecutadas if "lower(usuarios.email)" in s.sql][-1]
+        rows = fresh_db.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+        plan = " | ".join(row[-1] for row in rows)
+        assert "ix_usuarios_email_lower" in plan
+        assert "ix_usuarios_username_lower" in plan
+
+
+@pytest.mark.database
+@pytest.mark.unit
+class TestUsuariosDuplicados:
+    """Pruebas de la migración de una base de datos con usuarios que solo difieren en mayúsculas"""
+
+    @pytest.fixture
+    def url(self, tmp_path):
+        url = f"sqlite:///{tmp_path / 'antigua.db'}"
+        engine = create_engine(url)
+        with engine.begin() as conn:
+            for sentencia in ESQUEMA_ORIGINAL:
+                conn.execute(text(sentencia))
+            for usuario_id, email, username in [
+                (1, "ana@example.com", "ana"),
+                (2, "Ana@Example.com", "ana2"),
+                (3, "luis@example.com", "luis"),
+            ]:
+                conn.execute(text(
+                    "INSERT INTO usuarios (id, email, username, hashed_password, is_active) "
+                    "VALUES (:id, :email, :username, 'x', 1)"
+                ), {"id": usuario_id, "email": email, "username": username})
+        engine.dispose()
+        return url
+
+    def indices(self, url):
+        engine = create_engine(url)
+        try:
+            # El inspector de SQLite no devuelve los índices por expresión
+            with engine.connect() as conn:
+                return set(conn.execute(text(
+                    "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'usuarios'"
+                )).scalars())
+        finally:
+            engine.dispose()
+
+    def test_informa_y_omite_el_indice(self, url, capsys):
+        """Los duplicados se listan y el índice afectado se omite sin fallar"""
+        assert comprobar_usuarios(url) == 2
+        salida = capsys.readouterr().out
+        assert "id=1 email=ana@example.com" in salida and "id=2 email=Ana@Example.com" in salida
+        crear_indices(url)
+        assert "ix_usuarios_email_lower" not in self.indices(url)
+        assert "ix_usuarios_username_lower" in self.indices(url)
+
+    def test_indice_creado_al_resolverlos(self, url):
+        """Resueltos los duplicados, `indices` crea el índice que faltaba"""
+        engine = create_engine(url)
+        with engine.begin() as conn:
+            conn.execute(text("UPDATE usuarios SET email = 'ana.b@example.com' WHERE id = 2"))
+        engine.dispose()
+        assert comprobar_usuarios(url) == 0
+        crear_indices(url)
+        assert {"ix_usuarios_email_lower", "ix_usuarios_username_lower"} <= self.indices(url)
@@ -0,0 +1,126 @@
+"""
+Pruebas para el enrutamiento de lecturas hacia réplicas
+"""
+import itertools
+import time
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app import models
+from app.database import Base, SessionLocal
+from app.replicas import ReplicaRouter, router as replica_router
+
+
+@pytest.fixture
+def primary_and_replica(tmp_path):
+    """Base de datos principal y réplica en dos archivos SQLite distintos"""
+    primary = create_engine(f"sqlite:///{tmp_path / 'principal.db'}", connect_args={"check_same_thread": False})
+    replica = create_engine(f"sqlite:///{tmp_path / 'replica.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=primary)
+    Base.metadata.create_all(bind=replica)
+
+    # Un usuario que ya existe en ambas (replicado) y otro recién escrito solo en la principal
+    for bind in (primary, replica):
+        with sessionmaker(bind=bind)() as db:
+            db.add(models.Usuario(id=1, email="viejo@example.com", username="viejo", hashed_password="x"))
+            db.commit()
+    with sessionmaker(bind=primary)() as db:
+        db.add(models.Usuario(id=2, email="nuevo@example.com", username="nuevo", hashed_password="x"))
+        db.commit()
+
+    yield primary, replica
+    primary.dispose()
+    replica.dispose()
+
+
+def emails(db):
+    return {u.email for u in db.query(models.Usuario).all()}
+
+
+@pytest.mark.database
+@pytest.mark.unit
+class TestReplicaRouter:
+    """Pruebas para la elección de la base de datos de lectura"""
+
+    def test_reads_go_to_replica(self, primary_and_replica):
+        """Sin escrituras recientes las lecturas se sirven desde la réplica"""
+        primary, replica = primary_and_replica
+        router = ReplicaRouter(sessionmaker(bind=primary), [replica], sticky_seconds=5)
+        with router.read_session(1) as db:
+            assert db.get_bind() is replica
+            assert emails(db) == {"viejo@example.com"}
+
+    def test_recent_writer_reads_from_primary(self, primary_and_replica):
+        """Tras escribir, el usuario lee de la principal y ve su propio cambio"""
+        primary, replica = primary_and_replica
+        router = ReplicaRouter(sessionmaker(bind=primary), [replica], sticky_seconds=5)
+        router.mark_write(2)
+        with router.read_session(2) as db:
+            assert db.get_bind() is primary
+            assert "nuevo@example.com" in emails(db)
+        # Otros usuarios siguen leyendo de la réplica
+        with router.read_session(1) as db:
+            assert db.get_bind() is replica
+
+    def test_stickiness_expires(self, primary_and_replica):
+        """Pasada la ventana read-your-writes se vuelve a usar la réplica"""
+        primary, replica = primary_and_replica
+        router = ReplicaRouter(sessionmaker(bind=primary), [replica], sticky_seconds=0.05)
+        router.mark_write(2)
+        assert router.is_sticky(2) is True
+        time.sleep(0.1)
+        assert router.is_sticky(2) is False
+        with router.read_session(2) as db:
+            assert db.get_bind() is replica
+
+    def test_round_robin_between_replicas(self, primary_and_replica, tmp_path):
+        """Las lecturas se reparten entre las réplicas configuradas"""
+        primary, replica = primary_and_replica
+        replica_2 = create_engine(f"sqlite:///{tmp_path / 'replica2.db'}")
+        router = ReplicaRouter(sessionmaker(bind=primary), [replica, replica_2], sticky_seconds=5)
+        binds = [router.read_session().get_bind() for _ in range(4)]
+        assert binds == [replica, replica_2, replica, replica_2]
+        replica_2.dispose()
+
+    def test_without_replicas_uses_primary(self, primary_and_replica):
+        """Sin réplicas configuradas todas las lecturas van a la principal"""
+        primary, _ = primary_and_replica
+        router = ReplicaRouter(sessionmaker(bind=primary), [], sticky_seconds=5)
+        router.mark_write(1)
+        with router.read_session(1) as db:
+            assert db.get_bind() is primary
+
+    def test_primary_sessions_flag_commits(self):
+        """Las sesiones de la principal marcan cuándo confirmaron cambios"""
+        db = SessionLocal()
+        try:
+            assert not db.info.get("wrote")
+            db.commit()
+            assert db.info.get("wrote") is True
+        finally:
+            db.close()
+
+
+@pytest.mark.api
+class TestReadYourWritesAfterSignup:
+    """Registro e inicio de sesión con una réplica que todavía no tiene la cuenta"""
+
+    @pytest.fixture
+    def lagging_replica(self, tmp_path, monkeypatch):
+        replica = create_engine(f"sqlite:///{tmp_path / 'replica.db'}", connect_args={"check_same_thread": False})
+        Base.metadata.create_all(bind=replica)
+        monkeypatch.setattr(replica_router, "replica_engines", [replica])
+        monkeypatch.setattr(replica_router, "_cycle", itertools.cycle([replica]))
+        monkeypatch.setattr(replica_router, "_last_writes", {})
+        yield replica
+        replica.dispose()
+
+    def test_signup_then_me(self, client, lagging_replica, test_user_data):
+        """Las lecturas del usuario recién registrado van a la principal"""
+        assert client.post("/register", json=test_user_data).status_code == 201
+        token = client.post("/token", data={
+            "username": test_user_data["email"], "password": test_user_data["password"]
+        }).json()["access_token"]
+        response = client.get("/me", headers={"Authorization": f"Bearer {token}"})
+        assert response.status_code == 200
+        assert response.json()["email"] == test_user_data["email"]
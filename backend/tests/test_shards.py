@@ -0,0 +1,233 @@
+"""
+Pruebas para el reparto de tareas de usuarios entre shards
+"""
+import pytest
+from datetime import datetime
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+from app import models, schemas, crud, shards
+from app.database import Base
+from app.shards import (
+    PRINCIPAL, AnilloHash, ShardRouter, UsuarioEnMovimiento, create_shard_engine, mover_usuario,
+    pendientes_de_rebalanceo
+)
+
+
+@pytest.fixture
+def router(tmp_path):
+    """Router con un directorio y dos shards en archivos SQLite temporales"""
+    engines = {
+        nombre: create_engine(
+            f"sqlite:///{tmp_path / f'{nombre}.db'}",
+            connect_args={"check_same_thread": False}
+        )
+        for nombre in ("directorio", "a", "b")
+    }
+    directorio = engines.pop("directorio")
+    Base.metadata.create_all(bind=directorio)
+    router = ShardRouter(
+        sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=directorio),
+        engines,
+        cache_seconds=0,
+        bloque_ids=10
+    )
+    router.crear_tablas()
+    router.instalar_asignador_ids()
+    yield router
+    router.desinstalar_asignador_ids()
+    router.dispose()
+    directorio.dispose()
+
+
+def crear_usuario(router, nombre):
+    db = router.directorio()
+    usuario = models.Usuario(email=f"{nombre}@example.com", username=nombre, hashed_password="x")
+    db.add(usuario)
+    db.commit()
+    db.close()
+    return usuario.id
+
+
+def usuario_en_shard(router, shard):
+    """Crea usuarios hasta obtener uno que el anillo envía al shard pedido"""
+    for i in range(100):
+        usuario_id = crear_usuario(router, f"{shard}{i}")
+        if router.anillo.shard_para(usuario_id) == shard:
+            return usuario_id
+    raise AssertionError(f"Ningún usuario cae en el shard {shard}")
+
+
+def crear_tareas(router, usuario_id, cantidad):
+    db = router.session(usuario_id)
+    try:
+        return [
+            crud.create_tarea(db, schemas.TareaCreate(titulo=f"Revisar informe {i}"), usuario_id).id
+            for i in range(cantidad)
+        ]
+    finally:
+        db.close()
+
+
+def contar(session, modelo, usuario_id):
+    try:
+        return session.execute(
+            select(func.count()).select_from(modelo).where(modelo.usuario_id == usuario_id)
+        ).scalar()
+    finally:
+        session.close()
+
+
+@pytest.mark.database
+@pytest.mark.unit
+class TestAnilloHash:
+    """Pruebas para el anillo de hash consistente"""
+
+    def test_determinista_y_repartido(self):
+        """El mismo usuario siempre va al mismo shard y todos los shards reciben usuarios"""
+        anillo = AnilloHash(["a", "b", "c"])
+        destinos = [anillo.shard_para(usuario_id) for usuario_id in range(3000)]
+        assert destinos == [AnilloHash(["c", "b", "a"]).shard_para(u) for u in range(3000)]
+        for nombre in ("a", "b", "c"):
+            assert 600 < destinos.count(nombre) < 1400
+
+    def test_agregar_shard_mueve_una_fraccion(self):
+        """Con un cuarto shard solo cambia el destino de cerca de 1/4 de los usuarios"""
+        antes = AnilloHash(["a", "b", "c"])
+        despues = AnilloHash(["a", "b", "c", "d"])
+        cambiados = [u for u in range(4000) if antes.shard_para(u) != despues.shard_para(u)]
+        assert 0.15 < len(cambiados) / 4000 < 0.35
+        assert all(despues.shard_para(u) == "d" for u in cambiados)
+
+
+@pytest.mark.database
+@pytest.mark.unit
+class TestShardRouter:
+    """Pruebas para la asignación de usuarios y la creación de tareas en shards"""
+
+    def test_usuario_nuevo_queda_asignado(self, router):
+        """La primera consulta guarda en el directorio el shard del anillo"""
+        usuario_id = crear_usuario(router, "nuevo")
+        shard = router.shard_de(usuario_id)
+        assert shard == router.anillo.shard_para(usuario_id)
+        db = router.directorio()
+        assert db.get(models.UsuarioShard, usuario_id).shard == shard
+        db.close()
+
+    def test_usuario_con_tareas_previas_sigue_en_principal(self, router):
+        """Las tareas anteriores al reparto no se pierden de vista"""
+        usuario_id = crear_usuario(router, "antiguo")
+        db = router.directorio()
+        db.add(models.Tarea(titulo="Previa", usuario_id=usuario_id))
+        db.commit()
+        db.close()
+        assert router.shard_de(usuario_id) == PRINCIPAL
+
+    def test_tareas_en_archivos_distintos_con_ids_unicos(self, router):
+        """Cada usuario escribe en su shard y los ids no se repiten entre shards"""
+        usuario_a = usuario_en_shard(router, "a")
+        usuario_b = usuario_en_shard(router, "b")
+        ids = crear_tareas(router, usuario_a, 15) + crear_tareas(router, usuario_b, 15)
+
+        assert len(set(ids)) == 30
+        assert contar(router.session_de_shard("a"), models.Tarea, usuario_a) == 15
+        assert contar(router.session_de_shard("a"), models.Tarea, usuario_b) == 0
+        assert contar(router.session_de_shard("b"), models.Tarea, usuario_b) == 15
+        assert contar(router.session_de_shard(PRINCIPAL), models.Tarea, usuario_a) == 0
+
+    def test_shard_desconocido(self, router):
+        with pytest.raises(ValueError):
+            router.session_de_shard("z")
+
+
+@pytest.mark.database
+@pytest.mark.unit
+class TestMoverUsuario:
+    """Pruebas para mover las tareas de un usuario entre shards"""
+
+    def test_mueve_tareas_prefijos_y_contadores(self, router):
+        """Las tareas conservan su id y el destino tiene sus contadores y prefijos"""
+        usuario_id = usuario_en_shard(router, "a")
+        ids = crear_tareas(router, usuario_id, 5)
+
+        assert mover_usuario(router, usuario_id, "b", espera_seconds=0) == 5
+
+        assert router.shard_de(usuario_id) == "b"
+        assert contar(router.session_de_shard("a"), models.Tarea, usuario_id) == 0
+        assert contar(router.session_de_shard("a"), models.TareaStats, usuario_id) == 0
+        db = router.session(usuario_id)
+        try:
+            assert sorted(t.id for t in db.query(models.Tarea)) == sorted(ids)
+            assert db.get(models.TareaStats, usuario_id).total == 5
+            assert db.query(models.TareaPrefijo).filter(
+                models.TareaPrefijo.tarea_id.in_(ids)
+            ).count() > 0
+        finally:
+            db.close()
+
+    def test_rebalanceo_incluye_usuarios_en_principal(self, router):
+        """Los usuarios con tareas en el directorio aparecen como pendientes"""
+        usuario_id = crear_usuario(router, "antiguo")
+        db = router.directorio()
+        db.add(models.Tarea(titulo="Previa", usuario_id=usuario_id))
+        db.commit()
+        db.close()
+
+        pendientes = pendientes_de_rebalanceo(router)
+        assert pendientes == [(usuario_id, PRINCIPAL, router.anillo.shard_para(usuario_id))]
+
+        mover_usuario(router, usuario_id, pendientes[0][2], espera_seconds=0)
+        assert pendientes_de_rebalanceo(router) == []
+        assert contar(router.session_de_shard(PRINCIPAL), models.Tarea, usuario_id) == 0
+
+    def test_mueve_tareas_archivadas(self, router):
+        """Las tareas archivadas acompañan al usuario"""
+        usuario_id = usuario_en_shard(router, "a")
+        db = router.session_de_shard("a")
+        db.add(models.TareaArchivada(
+            id=router.asignador.siguiente(), titulo="Vieja", usuario_id=usuario_id,
+            created_at=datetime(2020, 1, 1)
+        ))
+        db.commit()
+        db.close()
+
+        assert mover_usuario(router, usuario_id, "b", espera_seconds=0) == 1
+        assert contar(router.session_de_shard("a"), models.TareaArchivada, usuario_id) == 0
+        assert contar(router.session_de_shard("b"), models.TareaArchivada, usuario_id) == 1
+
+    def test_escrituras_bloqueadas_durante_el_movimiento(self, router, monkeypatch):
+        """Desde la marca hasta la asignación al destino el usuario no puede escribir en el origen"""
+        usuario_id = usuario_en_shard(router, "a")
+        crear_tareas(router, usuario_id, 3)
+        esperas = []
+
+        def esperar(segundos):
+            try:
+                router.comprobar_escritura(usuario_id)
+                esperas.append((router.shard_de(usuario_id), "escritura admitida"))
+            except UsuarioEnMovimiento:
+                esperas.append((router.shard_de(usuario_id), "escritura bloqueada"))
+
+        monkeypatch.setattr(shards.time, "sleep", esperar)
+        assert mover_usuario(router, usuario_id, "b", espera_seconds=5) == 3
+        # Primera espera: todavía en el origen y bloqueado; segunda: ya en el destino
+        assert esperas == [("a", "escritura bloqueada"), ("b", "escritura admitida")]
+        router.comprobar_escritura(usuario_id)
+
+    def test_fallo_en_la_copia_desbloquea(self, router, monkeypatch):
+        """Si la copia falla el usuario sigue en el origen y vuelve a admitir escrituras"""
+        usuario_id = usuario_en_shard(router, "a")
+        crear_tareas(router, usuario_id, 2)
+
+        def fallar(*args, **kwargs):
+            raise RuntimeError("disco lleno")
+
+        monkeypatch.setattr(shards, "_copiar_faltantes", fallar)
+        with pytest.raises(RuntimeError):
+            mover_usuario(router, usuario_id, "b", espera_seconds=0)
+        router.comprobar_escritura(usuario_id)
+        assert router.shard_de(usuario_id) == "a"
+        assert contar(router.session_de_shard("a"), models.Tarea, usuario_id) == 2
+
+    def test_solo_shards_sqlite(self):
+        with pytest.raises(ValueError):
+            create_shard_engine("postgresql://localhost/tareas_a")
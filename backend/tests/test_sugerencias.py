@@ -0,0 +1,116 @@
+"""
+Pruebas para el autocompletado de títulos de tareas
+"""
+import pytest
+from app import models, schemas, crud
+from migrate_db import reconstruir_sugerencias
+from tests.test_tareas_queries import query_plan
+
+
+def crear(db, usuario_id, titulo, prioridad=1):
+    return crud.create_tarea(db, schemas.TareaCreate(titulo=titulo, prioridad=prioridad), usuario_id)
+
+
+def titulos(db, usuario_id, q, limit=10):
+    return [s.titulo for s in crud.get_sugerencias(db, usuario_id, q, limit)]
+
+
+@pytest.mark.database
+@pytest.mark.unit
+class TestSugerencias:
+    """Pruebas del índice de prefijos y del orden de las sugerencias"""
+
+    def test_prefixes_of_each_word(self):
+        """Se indexan los prefijos que empiezan en cada palabra, sin acentos"""
+        prefijos = crud.prefijos_titulo("Revisar  Canción")
+        assert {"r", "rev", "revisar c", "revisar cancion", "can", "cancion"} <= prefijos
+        assert "evisar" not in prefijos
+
+    def test_ranked_by_priority_then_recency(self, fresh_db, usuario):
+        """Las sugerencias salen por prioridad y, a igual prioridad, las más nuevas primero"""
+        crear(fresh_db, usuario.id, "Comprar pan", prioridad=1)
+        crear(fresh_db, usuario.id, "Comprar leche", prioridad=3)
+        crear(fresh_db, usuario.id, "Llamar a Compras", prioridad=1)
+        crear(fresh_db, usuario.id, "Informe", prioridad=3)
+        assert titulos(fresh_db, usuario.id, "COMP") == ["Comprar leche", "Llamar a Compras", "Comprar pan"]
+        assert titulos(fresh_db, usuario.id, "comp", limit=2) == ["Comprar leche", "Llamar a Compras"]
+        assert titulos(fresh_db, usuario.id, "comprar p") == ["Comprar pan"]
+        assert titulos(fresh_db, usuario.id, "  ") == []
+
+    def test_index_follows_writes(self, fresh_db, usuario):
+        """Renombrar, cambiar la prioridad o eliminar actualiza las sugerencias"""
+        pan = crear(fresh_db, usuario.id, "Comprar pan")
+        leche = crear(fresh_db, usuario.id, "Comprar leche")
+        crud.update_tarea(fresh_db, pan.id, usuario.id, schemas.TareaUpdate(prioridad=3))
+        assert titulos(fresh_db, usuario.id, "comprar") == ["Comprar pan", "Comprar leche"]
+        crud.update_tarea(fresh_db, pan.id, usuario.id, schemas.TareaUpdate(titulo="Hornear pan"))
+        assert titulos(fresh_db, usuario.id, "comprar") == ["Comprar leche"]
+        assert titulos(fresh_db, usuario.id, "horn") == ["Hornear pan"]
+        crud.delete_tarea(fresh_db, leche.id, usuario.id)
+        assert titulos(fresh_db, usuario.id, "comprar") == []
+
+    def test_long_query_beyond_indexed_prefix(self, fresh_db, usuario):
+        """Los textos más largos que el prefijo indexado se filtran por el título completo"""
+        crear(fresh_db, usuario.id, "Preparar presentación trimestral")
+        crear(fresh_db, usuario.id, "Preparar presentación anual")
+        assert titulos(fresh_db, usuario.id, "preparar presentacion an") == ["Preparar presentación anual"]
+
+    def test_long_query_filtered_in_sql(self, fresh_db, usuario, sentencias):
+        """El resto del texto buscado se filtra en la consulta, con LIMIT, sin distinguir acentos ni mayúsculas"""
+        for i in range(30):
+            crear(fresh_db, usuario.id, f"Preparar presentación trimestral {i}")
+        crear(fresh_db, usuario.id, "PREPARAR PRESENTACIÓN Año nuevo")
+        usuario_id = usuario.id
+        with sentencias(fresh_db.get_bind()) as ejecutadas:
+            assert titulos(fresh_db, usuario_id, "preparar presentacion ano", limit=2) == [
+                "PREPARAR PRESENTACIÓN Año nuevo"
+            ]
+        assert len(ejecutadas) == 1
+        assert "EXISTS" in ejecutadas[0].sql and "LIMIT" in ejecutadas[0].sql
+
+    def test_create_does_not_delete_prefixes(self, fresh_db, usuario, sentencias):
+        """Crear una tarea solo inserta sus prefijos"""
+        with sentencias(fresh_db.get_bind()) as ejecutadas:
+            crear(fresh_db, usuario.id, "Comprar pan")
+        assert not any(s.sql.startswith("DELETE FROM tarea_prefijos") for s in ejecutadas)
+        assert titulos(fresh_db, usuario.id, "pan") == ["Comprar pan"]
+
+    def test_other_users_not_suggested(self, fresh_db, usuario):
+        """Solo se sugieren tareas del propio usuario"""
+        otro = models.Usuario(email="otro@example.com", username="otro", hashed_password="x")
+        fresh_db.add(otro)
+        fresh_db.commit()
+        crear(fresh_db, otro.id, "Comprar regalo")
+        assert titulos(fresh_db, usuario.id, "comprar") == []
+
+    def test_reads_from_prefix_index(self, fresh_db, usuario):
+        """La consulta lee el índice de prefijos en orden, sin ordenar en memoria"""
+        crear(fresh_db, usuario.id, "Comprar pan")
+        plan = query_plan(fresh_db, lambda: crud.get_sugerencias(fresh_db, usuario.id, "com"))
+        assert "ix_tarea_prefijos_ranking" in plan
+        assert "TEMP B-TREE" not in plan
+
+    def test_rebuild(self, fresh_db, usuario, tmp_path):
+        """El comando de reconstrucción indexa tareas creadas sin prefijos"""
+        fresh_db.add(models.Tarea(titulo="Sin indexar", usuario_id=usuario.id))
+        fresh_db.commit()
+        assert titulos(fresh_db, usuario.id, "sin") == []
+        reconstruir_sugerencias(f"sqlite:///{tmp_path / 'fresh.db'}")
+        assert titulos(fresh_db, usuario.id, "sin") == ["Sin indexar"]
+
+
+@pytest.mark.api
+@pytest.mark.unit
+class TestSugerenciasApi:
+    """Pruebas de GET /tareas/suggest"""
+
+    def test_requires_authentication(self, client, clean_db):
+        assert client.get("/tareas/suggest?q=a").status_code == 401
+
+    def test_suggest(self, client, auth_headers, crear_tareas):
+        """Sugiere por prefijo sin distinguir mayúsculas ni acentos"""
+        crear_tareas(["Comprar café", "Revisar informe"])
+        response = client.get("/tareas/suggest?q=CAF", headers=auth_headers)
+        assert response.status_code == 200
+        assert [s["titulo"] for s in response.json()] == ["Comprar café"]
+        assert client.get("/tareas/suggest?q=caf&limit=0", headers=auth_headers).status_code == 422
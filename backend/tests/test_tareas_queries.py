@@ -0,0 +1,287 @@
+"""
+Pruebas para las consultas de listado de tareas
+"""
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import event
+from app import models, schemas, crud
+
+
+@pytest.fixture
+def tareas(fresh_db, usuario):
+    """Conjunto de tareas con prioridades y estados variados"""
+    fresh_db.add_all([
+        models.Tarea(
+            titulo=f"Tarea {i:02d}",
+            descripcion=f"Descripción {i}",
+            completado=i % 2 == 0,
+            prioridad=i % 3 + 1,
+            usuario_id=usuario.id
+        )
+        for i in range(30)
+    ])
+    fresh_db.commit()
+    return fresh_db.query(models.Tarea).all()
+
+
+def query_plan(db, run):
+    """Ejecuta la función y devuelve el plan de la última consulta con ORDER BY"""
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if "ORDER BY" in statement:
+            captured.append((statement, parameters))
+
+    engine = db.get_bind()
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        run()
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+    statement, parameters = captured[-1]
+    rows = db.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+    return " | ".join(row[-1] for row in rows)
+
+
+@pytest.mark.database
+@pytest.mark.unit
+class TestListadoIndices:
+    """Pruebas de ordenamiento e índices del listado de tareas"""
+
+    @pytest.mark.parametrize("ordenar_por", ["created_at", "prioridad", "titulo"])
+    def test_sort_uses_composite_index(self, fresh_db, usuario, tareas, ordenar_por):
+        """Cada columna permitida se ordena con un índice, sin ordenar en memoria"""
+        plan = query_plan(fresh_db, lambda: crud.get_tareas(
+            fresh_db, usuario.id, ordenar_por=ordenar_por
+        ))
+        assert "ix_tareas_usuario_" in plan
+        assert "TEMP B-TREE" not in plan
+
+    def test_filters_use_composite_index(self, fresh_db, usuario, tareas):
+        """Filtrar por completado y prioridad usa el índice de estado"""
+        plan = query_plan(fresh_db, lambda: crud.get_tareas(
+            fresh_db, usuario.id, completado=False, prioridad=2
+        ))
+        assert "ix_tareas_usuario_estado" in plan
+        assert "TEMP B-TREE" not in plan
+
+    def test_invalid_sort_column_rejected(self, fresh_db, usuario):
+        """Las columnas sin índice de apoyo no se pueden usar para ordenar"""
+        for ordenar_por in ["descripcion", "updated_at", "hashed_password"]:
+            with pytest.raises(HTTPException) as exc_info:
+                crud.get_tareas(fresh_db, usuario.id, ordenar_por=ordenar_por)
+            assert exc_info.value.status_code == 422
+
+    def test_sort_is_stable_with_ties(self, fresh_db, usuario, tareas):
+        """Las tareas con el mismo valor de orden se desempatan por id"""
+        items, total, _ = crud.get_tareas(fresh_db, usuario.id, limit=30, ordenar_por="prioridad", orden="asc")
+        assert total == 30
+        keys = [(t.prioridad, t.id) for t in items]
+        assert keys == sorted(keys)
+
+
+@pytest.mark.database
+@pytest.mark.unit
+class TestPaginacionCursor:
+    """Pruebas de la paginación por cursor (keyset) del listado de tareas"""
+
+    @pytest.mark.parametrize("ordenar_por", ["created_at", "prioridad", "titulo"])
+    @pytest.mark.parametrize("orden", ["asc", "desc"])
+    def test_cursor_walk_matches_offset(self, fresh_db, usuario, tareas, ordenar_por, orden):
+        """Recorrer con cursores devuelve las mismas tareas que el listado completo"""
+        esperado, _, _ = crud.get_tareas(fresh_db, usuario.id, limit=100, ordenar_por=ordenar_por, orden=orden)
+        vistos, cursor = [], None
+        while True:
+            items, total, cursor = crud.get_tareas(
+                fresh_db, usuario.id, limit=7, ordenar_por=ordenar_por, orden=orden, cursor=cursor
+            )
+            assert total == 30
+            vistos.extend(t.id for t in items)
+            if cursor is None:
+                break
+        assert vistos == [t.id for t in esperado]
+
+    def test_cursor_respects_filters(self, fresh_db, usuario, tareas):
+        """El cursor se combina con los filtros del listado"""
+        items, total, cursor = crud.get_tareas(fresh_db, usuario.id, limit=5, completado=True)
+        siguientes, _, _ = crud.get_tareas(fresh_db, usuario.id, limit=20, completado=True, cursor=cursor)
+        assert total == 15
+        assert len(items) + len(siguientes) == 15
+        assert all(t.completado for t in items + siguientes)
+
+    def test_invalid_cursor_rejected(self, fresh_db, usuario, tareas):
+        """Un cursor corrupto o de otro ordenamiento se rechaza con 422"""
+        _, _, cursor = crud.get_tareas(fresh_db, usuario.id, limit=5, ordenar_por="prioridad")
+        for kwargs in [
+            {"cursor": "no-es-un-cursor"},
+            {"cursor": cursor, "ordenar_por": "titulo"},
+            {"cursor": cursor, "ordenar_por": "prioridad", "orden": "asc"},
+        ]:
+            with pytest.raises(HTTPException) as exc_info:
+                crud.get_tareas(fresh_db, usuario.id, **kwargs)
+            assert exc_info.value.status_code == 422
+
+    @pytest.mark.parametrize("ordenar_por", ["created_at", "prioridad", "titulo"])
+    def test_cursor_page_uses_index_range(self, fresh_db, usuario, tareas, ordenar_por):
+        """La página por cursor busca en el índice en lugar de saltar filas"""
+        _, _, cursor = crud.get_tareas(fresh_db, usuario.id, limit=5, ordenar_por=ordenar_por)
+        plan = query_plan(fresh_db, lambda: crud.get_tareas(
+            fresh_db, usuario.id, limit=5, ordenar_por=ordenar_por, cursor=cursor
+        ))
+        assert "ix_tareas_usuario_" in plan
+        assert "TEMP B-TREE" not in plan
+        # El valor del cursor acota la búsqueda en el índice (rango, no salto de filas)
+        assert f"{ordenar_por}<?" in plan
+
+
+@pytest.mark.database
+@pytest.mark.unit
+class TestTotalListado:
+    """Pruebas del total devuelto junto con la página de tareas"""
+
+    def count_statements(self, sentencias, db, run):
+        with sentencias(db.get_bind()) as ejecutadas:
+            result = run()
+        return result, [s.sql for s in ejecutadas if s.sql.lstrip().upper().startswith("SELECT")]
+
+    def test_page_and_total_in_one_query(self, fresh_db, usuario, tareas, sentencias):
+        """La página y el total exacto se obtienen en una sola consulta"""
+        usuario_id = usuario.id
+        (items, total, _), statements = self.count_statements(
+            sentencias, fresh_db, lambda: crud.get_tareas(fresh_db, usuario_id, limit=5, completado=False)
+        )
+        assert len(items) == 5
+        assert total == 15
+        assert len(statements) == 1
+
+    def test_total_for_page_past_the_end(self, fresh_db, usuario, tareas):
+        """Una página vacía por offset sigue informando el total"""
+        items, total, _ = crud.get_tareas(fresh_db, usuario.id, skip=100, limit=5)
+        assert items == []
+        assert total == 30
+
+    def test_total_with_cursor(self, fresh_db, usuario, tareas):
+        """Con cursor el total sigue contando todas las tareas filtradas"""
+        _, _, cursor = crud.get_tareas(fresh_db, usuario.id, limit=5, prioridad=1)
+        _, total, _ = crud.get_tareas(fresh_db, usuario.id, limit=5, prioridad=1, cursor=cursor)
+        assert total == crud.get_tareas_count(fresh_db, usuario.id, prioridad=1) == 10
+
+    def test_without_total_skips_counting(self, fresh_db, usuario, tareas, sentencias):
+        """include_total=False no ejecuta ningún conteo"""
+        usuario_id = usuario.id
+        (items, total, _), statements = self.count_statements(
+            sentencias, fresh_db, lambda: crud.get_tareas(fresh_db, usuario_id, limit=5, include_total=False)
+        )
+        assert len(items) == 5
+        assert total is None
+        assert len(statements) == 1
+        assert "count(" not in statements[0].lower()
+
+    def test_approximate_total_reuses_recent_count(self, fresh_db, usuario, tareas, sentencias):
+        """Sin contador que lo responda, el total aproximado reutiliza un conteo reciente"""
+        usuario_id = usuario.id
+        assert crud.get_tareas_count(fresh_db, usuario_id, completado=True, prioridad=1) == 5
+        (_, total, _), statements = self.count_statements(
+            sentencias, fresh_db, lambda: crud.get_tareas(
+                fresh_db, usuario_id, limit=5, completado=True, prioridad=1, aproximado=True
+            )
+        )
+        assert total == 5
+        assert len(statements) == 1
+
+
+@pytest.mark.database
+@pytest.mark.unit
+class TestCamposParciales:
+    """Pruebas del parámetro fields en el listado y la consulta de tareas"""
+
+    def select_statement(self, sentencias, db, run):
+        with sentencias(db.get_bind()) as ejecutadas:
+            result = run()
+        return result, [s.sql for s in ejecutadas if "FROM tareas" in s.sql][-1]
+
+    def test_parse_fields(self):
+        """id se incluye siempre y los campos repetidos se ignoran"""
+        assert crud.parse_campos(None) is None
+        assert crud.parse_campos("titulo, completado,titulo") == ["id", "titulo", "completado"]
+        with pytest.raises(HTTPException) as exc_info:
+            crud.parse_campos("titulo,hashed_password")
+        assert exc_info.value.status_code == 422
+
+    def test_list_selects_only_requested_columns(self, fresh_db, usuario, tareas, sentencias):
+        """Las columnas no pedidas no se consultan"""
+        usuario_id = usuario.id
+        campos = crud.parse_campos("titulo,completado,prioridad")
+        (items, total, _), statement = self.select_statement(
+            sentencias, fresh_db, lambda: crud.get_tareas(fresh_db, usuario_id, limit=5, campos=campos)
+        )
+        columnas = statement.split("FROM tareas")[0]
+        assert "tareas.titulo" in columnas
+        assert "tareas.descripcion" not in columnas
+        assert "tareas.updated_at" not in columnas
+        assert len(items) == 5 and total == 30
+
+    def test_single_task_selects_only_requested_columns(self, fresh_db, usuario, tareas, sentencias):
+        """La consulta de una tarea también carga solo los campos pedidos"""
+        usuario_id, tarea_id = usuario.id, tareas[0].id
+        tarea, statement = self.select_statement(
+            sentencias, fresh_db, lambda: crud.get_tarea(fresh_db, tarea_id, usuario_id, ["id", "completado"])
+        )
+        assert "tareas.titulo" not in statement.split("FROM tareas")[0]
+        assert tarea.completado is True
+
+    def test_partial_response_omits_unrequested_fields(self, fresh_db, usuario, tareas):
+        """La respuesta parcial solo serializa los campos pedidos"""
+        campos = crud.parse_campos("titulo,prioridad")
+        items, _, _ = crud.get_tareas(fresh_db, usuario.id, limit=1, ordenar_por="titulo", orden="asc", campos=campos)
+        respuesta = schemas.TareaParcial.desde(items[0], campos).model_dump()
+        assert respuesta == {"id": items[0].id, "titulo": "Tarea 00", "prioridad": 1}
+
+
+@pytest.mark.database
+@pytest.mark.unit
+class TestEscrituraConPropiedad:
+    """Pruebas de la actualización y el borrado en una sola sentencia"""
+
+    def statements(self, sentencias, db, run):
+        with sentencias(db.get_bind()) as ejecutadas:
+            run()
+        captured = [" ".join(s.sql.split()) for s in ejecutadas]
+        return [s for s in captured if "tareas" in s.split("WHERE")[0]]
+
+    def test_update_is_single_statement(self, fresh_db, usuario, tareas, sentencias):
+        """La actualización comprueba la propiedad en el mismo UPDATE"""
+        usuario_id, tarea_id = usuario.id, tareas[0].id
+        statements = self.statements(sentencias, fresh_db, lambda: crud.update_tarea(
+            fresh_db, tarea_id, usuario_id, schemas.TareaUpdate(completado=False)
+        ))
+        assert len(statements) == 1
+        assert statements[0].startswith("UPDATE tareas SET")
+        assert "tareas.usuario_id = ?" in statements[0] and "RETURNING" in statements[0]
+        tarea = crud.get_tarea(fresh_db, tarea_id, usuario_id)
+        assert tarea.completado is False and tarea.updated_at is not None
+
+    def test_delete_is_single_statement(self, fresh_db, usuario, tareas, sentencias):
+        """El borrado comprueba la propiedad en el mismo DELETE"""
+        usuario_id, tarea_id = usuario.id, tareas[0].id
+        statements = self.statements(sentencias, fresh_db, lambda: crud.delete_tarea(fresh_db, tarea_id, usuario_id))
+        assert statements == [s for s in statements if s.startswith("DELETE FROM tareas WHERE")]
+        assert len(statements) == 1
+        assert crud.get_tarea(fresh_db, tarea_id, usuario_id) is None
+
+    def test_other_user_gets_404(self, fresh_db, usuario, tareas):
+        """Otro usuario no puede actualizar ni eliminar la tarea"""
+        usuario_id, tarea_id = usuario.id, tareas[0].id
+        otro = models.Usuario(email="ajeno@example.com", username="ajeno", hashed_password="x")
+        fresh_db.add(otro)
+        fresh_db.commit()
+        for run in (
+            lambda: crud.update_tarea(fresh_db, tarea_id, otro.id, schemas.TareaUpdate(titulo="Ajena")),
+            lambda: crud.delete_tarea(fresh_db, tarea_id, otro.id),
+            lambda: crud.update_tarea(fresh_db, 999999, usuario_id, schemas.TareaUpdate(titulo="No existe")),
+        ):
+            with pytest.raises(HTTPException) as exc_info:
+                run()
+            assert exc_info.value.status_code == 404
+        fresh_db.expire_all()
+        assert crud.get_tarea(fresh_db, tarea_id, usuario_id).titulo != "Ajena"
@@ -0,0 +1,112 @@
+"""
+Pruebas para los contadores de tareas por usuario (tareas_stats)
+"""
+import pytest
+from sqlalchemy import text
+from app import models, schemas, crud
+from migrate_db import reconstruir_estadisticas
+
+
+def stats(db, usuario_id):
+    db.expire_all()
+    return crud.get_tareas_stats(db, usuario_id)
+
+
+@pytest.mark.database
+@pytest.mark.unit
+class TestTareasStats:
+    """Pruebas del mantenimiento y la lectura de los contadores"""
+
+    def test_user_without_tasks(self, fresh_db, usuario):
+        """Un usuario sin tareas tiene todos los contadores en cero"""
+        resultado = stats(fresh_db, usuario.id)
+        assert resultado.total == 0
+        assert resultado.por_prioridad == {1: 0, 2: 0, 3: 0}
+
+    def test_counters_follow_writes(self, fresh_db, usuario):
+        """Crear, actualizar y eliminar tareas ajusta los contadores"""
+        tareas = [
+            crud.create_tarea(fresh_db, schemas.TareaCreate(titulo=f"Tarea {i}", prioridad=i % 3 + 1), usuario.id)
+            for i in range(6)
+        ]
+        resultado = stats(fresh_db, usuario.id)
+        assert (resultado.total, resultado.completadas, resultado.pendientes) == (6, 0, 6)
+        assert resultado.por_prioridad == {1: 2, 2: 2, 3: 2}
+
+        crud.update_tarea(fresh_db, tareas[0].id, usuario.id, schemas.TareaUpdate(completado=True, prioridad=3))
+        crud.update_tarea(fresh_db, tareas[1].id, usuario.id, schemas.TareaUpdate(titulo="Solo título"))
+        resultado = stats(fresh_db, usuario.id)
+        assert (resultado.total, resultado.completadas, resultado.pendientes) == (6, 1, 5)
+        assert resultado.por_prioridad == {1: 1, 2: 2, 3: 3}
+
+        crud.delete_tarea(fresh_db, tareas[0].id, usuario.id)
+        resultado = stats(fresh_db, usuario.id)
+        assert (resultado.total, resultado.completadas) == (5, 0)
+        assert resultado.por_prioridad == {1: 1, 2: 2, 3: 2}
+
+    def test_rolled_back_write_leaves_counters(self, fresh_db, usuario):
+        """Los contadores se ajustan en la misma transacción que la escritura"""
+        fresh_db.add(models.Tarea(titulo="Sin confirmar", usuario_id=usuario.id))
+        fresh_db.flush()
+        fresh_db.rollback()
+        assert stats(fresh_db, usuario.id).total == 0
+
+    def test_approximate_total_from_counters(self, fresh_db, usuario):
+        """El total aproximado del listado se toma de los contadores"""
+        for i in range(4):
+            crud.create_tarea(fresh_db, schemas.TareaCreate(titulo=f"Tarea {i}", prioridad=2), usuario.id)
+        usuario_id = usuario.id
+        assert crud.get_tareas_count(fresh_db, usuario_id, prioridad=2, aproximado=True) == 4
+        assert crud.get_tareas_count(fresh_db, usuario_id, completado=True, aproximado=True) == 0
+        _, total, _ = crud.get_tareas(fresh_db, usuario_id, limit=2, aproximado=True)
+        assert total == 4
+
+    def test_rebuild_repairs_drift(self, fresh_db, usuario, tmp_path):
+        """El comando de reconstrucción corrige contadores desviados"""
+        for i in range(3):
+            crud.create_tarea(fresh_db, schemas.TareaCreate(titulo=f"Tarea {i}", completado=i == 0), usuario.id)
+        fresh_db.execute(text("UPDATE tareas_stats SET total = 99, completadas = 42"))
+        fresh_db.commit()
+
+        reconstruir_estadisticas(f"sqlite:///{tmp_path / 'fresh.db'}")
+        resultado = stats(fresh_db, usuario.id)
+        assert (resultado.total, resultado.completadas) == (3, 1)
+        assert resultado.por_prioridad == {1: 3, 2: 0, 3: 0}
+
+    def test_create_all_on_existing_database(self, fresh_db, usuario):
+        """Al añadir tareas_stats a una base de datos con tareas, los contadores parten de ellas"""
+        for nombre in ("tareas_stats_insert", "tareas_stats_delete", "tareas_stats_update"):
+            fresh_db.execute(text(f"DROP TRIGGER {nombre}"))
+        fresh_db.execute(text("DROP TABLE tareas_stats"))
+        fresh_db.commit()
+        tareas = [
+            crud.create_tarea(fresh_db, schemas.TareaCreate(titulo=f"Tarea {i}", prioridad=i + 1), usuario.id)
+            for i in range(3)
+        ]
+
+        models.Base.metadata.create_all(bind=fresh_db.get_bind())
+        assert stats(fresh_db, usuario.id).total == 3
+
+        crud.delete_tarea(fresh_db, tareas[0].id, usuario.id)
+        crud.update_tarea(fresh_db, tareas[1].id, usuario.id, schemas.TareaUpdate(completado=True))
+        resultado = stats(fresh_db, usuario.id)
+        assert (resultado.total, resultado.completadas) == (2, 1)
+        assert resultado.por_prioridad == {1: 0, 2: 1, 3: 1}
+
+
+@pytest.mark.api
+@pytest.mark.unit
+class TestTareasStatsApi:
+    """Pruebas de GET /tareas/stats"""
+
+    def test_requires_authentication(self, client, clean_db):
+        assert client.get("/tareas/stats").status_code == 401
+
+    def test_stats(self, client, auth_headers, crear_tareas):
+        """Los contadores reflejan las tareas creadas y completadas"""
+        ids = crear_tareas(["Uno", "Dos", "Tres"])
+        client.put(f"/tareas/{ids[0]}", json={"completado": True}, headers=auth_headers)
+        response = client.get("/tareas/stats", headers=auth_headers)
+        assert response.status_code == 200
+        data = response.json()
+        assert (data["total"], data["completadas"]) == (3, 1)
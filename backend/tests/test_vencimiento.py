@@ -0,0 +1,103 @@
+"""
+Pruebas para la fecha de vencimiento de las tareas
+"""
+import pytest
+from datetime import datetime, timedelta, timezone
+from app import schemas, crud
+
+AHORA = datetime.now(timezone.utc).replace(microsecond=0)
+
+
+def crear(db, usuario, titulo, vence_en=None, completado=False):
+    fecha = AHORA + vence_en if vence_en is not None else None
+    tarea = schemas.TareaCreate(titulo=titulo, fecha_vencimiento=fecha, completado=completado)
+    return crud.create_tarea(db, tarea, usuario.id).id
+
+
+@pytest.fixture
+def tareas(fresh_db, usuario):
+    """Tareas vencidas, próximas, lejanas, completadas y sin fecha"""
+    return {
+        "vencida": crear(fresh_db, usuario, "Vencida", timedelta(days=-2)),
+        "vencida_completada": crear(fresh_db, usuario, "Vencida hecha", timedelta(days=-1), completado=True),
+        "manana": crear(fresh_db, usuario, "Mañana", timedelta(days=1)),
+        "hoy": crear(fresh_db, usuario, "Hoy", timedelta(hours=3)),
+        "proxima_completada": crear(fresh_db, usuario, "Hecha", timedelta(days=2), completado=True),
+        "lejana": crear(fresh_db, usuario, "Lejana", timedelta(days=30)),
+        "sin_fecha": crear(fresh_db, usuario, "Sin fecha"),
+    }
+
+
+@pytest.mark.database
+@pytest.mark.unit
+class TestFechaVencimiento:
+    """Pruebas de lectura y escritura de fecha_vencimiento"""
+
+    def test_se_guarda_y_devuelve_en_utc(self, fresh_db, usuario):
+        """Una fecha con otra zona horaria se devuelve como el mismo instante en UTC"""
+        madrid = timezone(timedelta(hours=2))
+        tarea = crud.create_tarea(
+            fresh_db,
+            schemas.TareaCreate(titulo="Entrega", fecha_vencimiento=datetime(2030, 5, 1, 20, 0, tzinfo=madrid)),
+            usuario.id
+        )
+        fresh_db.expire_all()
+        respuesta = schemas.Tarea.model_validate(crud.get_tarea(fresh_db, tarea.id, usuario.id))
+        assert respuesta.fecha_vencimiento == datetime(2030, 5, 1, 18, 0, tzinfo=timezone.utc)
+        assert respuesta.fecha_vencimiento.utcoffset() == timedelta(0)
+
+    def test_actualizar_y_quitar(self, fresh_db, usuario):
+        tarea_id = crear(fresh_db, usuario, "Entrega")
+        nueva = datetime(2030, 1, 1, tzinfo=timezone.utc)
+        tarea = crud.update_tarea(fresh_db, tarea_id, usuario.id, schemas.TareaUpdate(fecha_vencimiento=nueva))
+        assert schemas.en_utc(tarea.fecha_vencimiento) == nueva
+        tarea = crud.update_tarea(fresh_db, tarea_id, usuario.id, schemas.TareaUpdate(fecha_vencimiento=None))
+        assert tarea.fecha_vencimiento is None
+
+    def test_campo_parcial(self, fresh_db, usuario, tareas):
+        campos = crud.parse_campos("fecha_vencimiento")
+        tarea = crud.get_tarea(fresh_db, tareas["lejana"], usuario.id, campos)
+        parcial = schemas.TareaParcial.desde(tarea, campos).model_dump()
+        assert parcial["fecha_vencimiento"] == AHORA + timedelta(days=30)
+
+
+@pytest.mark.database
+@pytest.mark.unit
+class TestTareasProximas:
+    """Pruebas de GET /tareas/proximas"""
+
+    def test_pendientes_en_la_ventana_por_vencimiento(self, fresh_db, usuario, tareas):
+        proximas = crud.get_tareas_proximas(fresh_db, usuario.id, timedelta(days=7), ahora=AHORA)
+        assert [t.id for t in proximas] == [tareas["hoy"], tareas["manana"]]
+
+    def test_limite(self, fresh_db, usuario, tareas):
+        proximas = crud.get_tareas_proximas(fresh_db, usuario.id, timedelta(days=60), limit=1, ahora=AHORA)
+        assert [t.id for t in proximas] == [tareas["hoy"]]
+
+    def test_recorrido_por_rango_del_indice(self, fresh_db, usuario, tareas, sentencias):
+        """La consulta recorre solo el rango de fechas del índice y no ordena aparte"""
+        with sentencias(fresh_db.get_bind()) as ejecutadas:
+            crud.get_tareas_proximas(fresh_db, usuario.id, timedelta(days=7))
+        statement, parameters, _ = [s for s in ejecutadas if "fecha_vencimiento >=" in s.sql][-1]
+        plan = " | ".join(
+            fila[-1] for fila in fresh_db.connection().exec_driver_sql(
+                f"EXPLAIN QUERY PLAN {statement}", parameters
+            )
+        )
+        assert "ix_tareas_usuario_vencimiento (usuario_id=? AND fecha_vencimiento>? AND fecha_vencimiento<?)" in plan
+        assert "TEMP B-TREE" not in plan
+
+
+@pytest.mark.database
+@pytest.mark.unit
+class TestFiltroVencidas:
+    """Pruebas del filtro vencidas del listado"""
+
+    def test_listado_solo_vencidas_pendientes(self, fresh_db, usuario, tareas):
+        items, total, _ = crud.get_tareas(fresh_db, usuario.id, vencidas=True)
+        assert [t.id for t in items] == [tareas["vencida"]]
+        assert total == 1
+
+    def test_total_aproximado(self, fresh_db, usuario, tareas):
+        """Los contadores no saben de vencimientos: el total se cuenta"""
+        assert crud.get_tareas_count(fresh_db, usuario.id, vencidas=True, aproximado=True) == 1
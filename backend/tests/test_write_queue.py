@@ -0,0 +1,179 @@
+"""
+Pruebas para la cola de escritura con commit agrupado
+"""
+import sqlite3
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from app import models, schemas, crud
+from app.database import Base, SessionLocal, apply_sqlite_transactions
+from app.write_queue import WriteQueue
+
+
+@pytest.fixture
+def queue_session_factory(tmp_path):
+    """Sessionmaker sobre un archivo SQLite temporal con las tablas creadas"""
+    ruta = tmp_path / 'cola.db'
+    engine = create_engine(f"sqlite:///{ruta}", connect_args={"check_same_thread": False})
+    apply_sqlite_transactions(engine)
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    factory.ruta = ruta
+    yield factory
+    engine.dispose()
+
+
+@pytest.fixture
+def usuario_id(queue_session_factory):
+    """Usuario propietario de las tareas creadas en las pruebas"""
+    db = queue_session_factory()
+    usuario = models.Usuario(email="cola@example.com", username="cola", hashed_password="x")
+    db.add(usuario)
+    db.commit()
+    usuario_id = usuario.id
+    db.close()
+    return usuario_id
+
+
+@pytest.mark.database
+@pytest.mark.unit
+class TestWriteQueue:
+    """Pruebas para el hilo escritor y la agrupación de commits"""
+
+    def test_concurrent_writes_share_commits(self, queue_session_factory, usuario_id):
+        """Ninguna escritura del lote es visible desde otra conexión antes del commit del lote"""
+        def contar(conn):
+            return conn.execute("SELECT COUNT(*) FROM tareas").fetchone()[0]
+
+        # Al confirmar cada transacción: filas que ve el escritor y filas que
+        # ya son visibles desde otra conexión
+        commits = []
+
+        def al_confirmar(conn):
+            otra = sqlite3.connect(queue_session_factory.ruta)
+            try:
+                commits.append((contar(conn.connection.driver_connection), contar(otra)))
+            finally:
+                otra.close()
+
+        engine = queue_session_factory.kw["bind"]
+        event.listen(engine, "commit", al_confirmar)
+
+        write_queue = WriteQueue(queue_session_factory, max_batch=50, max_delay_ms=50)
+        write_queue.start()
+        try:
+            def crear(i):
+                tarea = schemas.TareaCreate(titulo=f"Tarea {i}")
+                return write_queue.submit(crud._create_tarea, tarea, usuario_id).result(timeout=10)
+
+            with ThreadPoolExecutor(max_workers=20) as pool:
+                tareas = list(pool.map(crear, range(40)))
+        finally:
+            write_queue.stop()
+            event.remove(engine, "commit", al_confirmar)
+
+        assert len({t.id for t in tareas}) == 40
+        # Las columnas generadas por el servidor están cargadas en el resultado
+        assert all(t.created_at is not None for t in tareas)
+        assert len(commits) < 40
+        assert commits[-1][0] == 40
+        # Antes de cada commit solo se ven desde fuera las filas de los lotes
+        # anteriores, no las del lote que se está confirmando
+        assert [fuera for _, fuera in commits] == [0] + [escritor for escritor, _ in commits[:-1]]
+
+    def test_error_only_affects_its_caller(self, queue_session_factory, usuario_id):
+        """Un error dentro del lote se entrega solo a su llamador"""
+        write_queue = WriteQueue(queue_session_factory, max_batch=10, max_delay_ms=100)
+        write_queue.start()
+        try:
+            ok = write_queue.submit(crud._create_tarea, schemas.TareaCreate(titulo="Válida"), usuario_id)
+            missing = write_queue.submit(crud._update_tarea, 999999, usuario_id, {"titulo": "No existe"})
+            ok_2 = write_queue.submit(crud._create_tarea, schemas.TareaCreate(titulo="Otra"), usuario_id)
+            assert ok.result(timeout=10).titulo == "Válida"
+            assert ok_2.result(timeout=10).titulo == "Otra"
+            with pytest.raises(HTTPException) as exc_info:
+                missing.result(timeout=10)
+            assert exc_info.value.status_code == 404
+        finally:
+            write_queue.stop()
+
+        db = queue_session_factory()
+        assert db.query(models.Tarea).count() == 2
+        db.close()
+
+    def test_stop_flushes_pending_writes(self, queue_session_factory, usuario_id):
+        """Al detener la cola se aplican las operaciones pendientes"""
+        write_queue = WriteQueue(queue_session_factory, max_batch=100, max_delay_ms=1000)
+        write_queue.start()
+        futures = [
+            write_queue.submit(crud._create_tarea, schemas.TareaCreate(titulo=f"Pendiente {i}"), usuario_id)
+            for i in range(5)
+        ]
+        write_queue.stop()
+        assert all(f.done() for f in futures)
+        assert not write_queue.running
+
+        db = queue_session_factory()
+        assert db.query(models.Tarea).count() == 5
+        db.close()
+
+    def test_run_write_without_queue_commits_directly(self, db_session):
+        """Sin cola activa la operación se confirma sobre la sesión recibida"""
+        usuario = models.Usuario(email="directo@example.com", username="directo", hashed_password="x")
+        db_session.add(usuario)
+        db_session.commit()
+        tarea = crud.create_tarea(db_session, schemas.TareaCreate(titulo="Directa"), usuario.id)
+        tarea_id = tarea.id
+        # Un rollback posterior no deshace la tarea porque ya fue confirmada
+        db_session.rollback()
+        assert db_session.get(models.Tarea, tarea_id) is not None
+
+
+@pytest.fixture
+def statements(queue_session_factory, sentencias):
+    """Sentencias ejecutadas sobre el engine de la cola durante la prueba"""
+    with sentencias(queue_session_factory.kw["bind"]) as ejecutadas:
+        yield ejecutadas
+
+
+def sql(statements):
+    return [" ".join(s.sql.split()).upper() for s in statements]
+
+
+@pytest.mark.database
+@pytest.mark.unit
+class TestEscriturasSinRecarga:
+    """Las escrituras leen las columnas generadas sin un SELECT posterior"""
+
+    def test_insert_and_update_use_returning(self, queue_session_factory, usuario_id, statements):
+        """Crear y actualizar una tarea no vuelve a leer la fila tras el commit"""
+        db = SessionLocal(bind=queue_session_factory.kw["bind"])
+        try:
+            tarea = crud.create_tarea(db, schemas.TareaCreate(titulo="Con RETURNING"), usuario_id)
+            assert tarea.created_at is not None
+            actualizada = crud.update_tarea(db, tarea.id, usuario_id, schemas.TareaUpdate(completado=True))
+            assert actualizada.updated_at is not None
+            assert actualizada.completado is True
+        finally:
+            db.close()
+
+        assert any(s.startswith("INSERT INTO TAREAS ") and "RETURNING" in s for s in sql(statements))
+        assert any(s.startswith("UPDATE TAREAS ") and "RETURNING" in s for s in sql(statements))
+        assert not any(s.startswith("SELECT") for s in sql(statements))
+
+    def test_queue_returns_loaded_instances(self, queue_session_factory, usuario_id, statements):
+        """La cola entrega las instancias sin recargarlas después del commit"""
+        write_queue = WriteQueue(queue_session_factory, max_batch=10, max_delay_ms=10)
+        write_queue.start()
+        try:
+            tarea = write_queue.submit(
+                crud._create_tarea, schemas.TareaCreate(titulo="Desde la cola"), usuario_id
+            ).result(timeout=10)
+        finally:
+            write_queue.stop()
+
+        assert tarea.created_at is not None
+        assert tarea.titulo == "Desde la cola"
+        assert not any(s.startswith("SELECT") for s in sql(statements))